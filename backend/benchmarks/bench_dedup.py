@@ -0,0 +1,73 @@
+"""
+Benchmark the vectorized deduplicate_by_embedding against the previous
+pairwise implementation and check that both keep exactly the same chunks.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dedup [--sizes 20 200 2000] [--dim 768] [--threshold 0.9]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.embeddings import deduplicate_by_embedding, deduplicate_rows
+
+
+def legacy_deduplicate(chunks: list, threshold=0.9):
+    """The original greedy scan: one scalar cosine per (chunk, kept chunk) pair."""
+    filtered, embeddings = [], []
+    for chunk in chunks:
+        emb = np.array(chunk['embedding'], dtype=np.float32)
+        if not embeddings:
+            filtered.append(chunk)
+            embeddings.append(emb)
+            continue
+        similarities = [float(np.dot(emb, e) / (np.linalg.norm(emb) * np.linalg.norm(e))) for e in embeddings]
+        if max(similarities) < threshold:
+            filtered.append(chunk)
+            embeddings.append(emb)
+    return filtered
+
+def make_chunks(n: int, dim: int, dup_fraction=0.3, seed=0) -> list:
+    """Random unit vectors where `dup_fraction` of them are noisy copies of earlier ones."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    for i in range(1, n):
+        if rng.random() < dup_fraction:
+            vectors[i] = vectors[rng.integers(0, i)] + 0.01 * rng.standard_normal(dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [{'chunk_id': str(i), 'embedding': vectors[i].tolist()} for i in range(n)]
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--simhash-size", type=int, default=20000,
+                        help="corpus size for the exact vs simhash comparison (0 to skip)")
+    args = parser.parse_args()
+
+    print(f"{'n':>7} {'kept':>6} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}  same")
+    for n in args.sizes:
+        chunks = make_chunks(n, args.dim)
+        legacy, t_legacy = timed(legacy_deduplicate, chunks, args.threshold)
+        fast, t_fast = timed(deduplicate_by_embedding, chunks, threshold=args.threshold)
+        same = [c['chunk_id'] for c in legacy] == [c['chunk_id'] for c in fast]
+        print(f"{n:>7} {len(fast):>6} {t_legacy:>11.4f} {t_fast:>15.4f} {t_legacy / t_fast:>7.1f}x  {same}")
+
+    if args.simhash_size:
+        n = args.simhash_size
+        vectors = np.array([c['embedding'] for c in make_chunks(n, args.dim)], dtype=np.float32)
+        exact, t_exact = timed(deduplicate_rows, vectors, threshold=args.threshold, method="exact")
+        approx, t_approx = timed(deduplicate_rows, vectors, threshold=args.threshold, method="simhash")
+        extra = len(set(approx) - set(exact))
+        print(f"\ncorpus-wide n={n}: exact kept {len(exact)} in {t_exact:.2f}s, "
+              f"simhash kept {len(approx)} in {t_approx:.2f}s ({extra} missed duplicates)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Offline latency / throughput benchmark for the RAG pipeline.
+
+Replays a query set (plus generated paraphrases) through hybrid_retrieve and
+rag_pipeline, then load-tests POST /api/qa with N concurrent clients against
+the in-process FastAPI app. The query embedder, dense backend and LLM are
+replaced by deterministic local stand-ins with configurable latency, so runs
+need no network or API keys and are comparable across commits.
+
+Reports per-stage p50/p95/p99 (from the pipeline's own rag_stage_seconds
+timers), throughput per concurrency level and peak RSS, and writes everything
+to JSON. Pass --compare to diff against an earlier result file.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline [--queries benchmarks/queries.jsonl] [--paraphrases 2]
+        [--embed-latency-ms 40] [--dense-latency-ms 30] [--llm-latency-ms 800]
+        [--concurrency 1 4 16] [--out bench_pipeline.json] [--compare baseline.json]
+"""
+import os
+
+# Stand-ins must be selected before config is imported
+os.environ.setdefault("DENSE_BACKEND", "local")
+os.environ.setdefault("QUERY_EMBEDDER", "stub")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("QUERY_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from services import metrics, rag_pipeline, vectorstore
+from services.llm_pool import llm_client_pool
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "queries.jsonl")
+PERCENTILES = (50, 95, 99)
+
+PARAPHRASE_PREFIXES = ("", "please tell me ", "quick question: ", "hi, ", "could you let me know ")
+PARAPHRASE_SUFFIXES = ("", " thanks", " please", "??", " at changi")
+
+
+def load_queries(path: str) -> list:
+    """Read queries from a JSONL file ('query', 'user_query' or 'title' field per line)."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            query = record.get("query") or record.get("user_query") or record.get("title")
+            if query:
+                queries.append(query)
+    return queries
+
+def paraphrase(query: str, rng: random.Random) -> str:
+    """Cheap surface paraphrase (casing, filler prefix/suffix, punctuation) of a query."""
+    text = query.rstrip("?.! ")
+    text = rng.choice(PARAPHRASE_PREFIXES) + (text.lower() if rng.random() < 0.5 else text)
+    return text + rng.choice(PARAPHRASE_SUFFIXES)
+
+def build_query_set(queries: list, n_paraphrases: int, seed=0) -> list:
+    rng = random.Random(seed)
+    expanded = list(queries)
+    for query in queries:
+        expanded.extend(paraphrase(query, rng) for _ in range(n_paraphrases))
+    return expanded
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """Deterministic LLM stand-in: echoes a canned answer after `latency_s`, streamed word by word."""
+
+    def __init__(self, latency_s: float, words=60):
+        self.latency_s = latency_s
+        self.words = words
+
+    def _answer(self, messages) -> str:
+        question = messages[-1].content
+        filler = " ".join(["Jewel"] * self.words)
+        return f"{question} {filler} Learn more here: https://www.jewelchangiairport.com/"
+
+    def invoke(self, messages):
+        time.sleep(self.latency_s)
+        return _Message(self._answer(messages))
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency_s)
+        return _Message(self._answer(messages))
+
+    async def astream(self, messages):
+        words = self._answer(messages).split(" ")
+        for word in words:
+            await asyncio.sleep(self.latency_s / len(words))
+            yield _Message(word + " ")
+
+
+def install_stand_ins(store, embed_latency_s: float, dense_latency_s: float, llm_latency_s: float):
+    """Add fixed latency to the stub embedder and local dense backend, and pool StubLLM clients."""
+    def embed(query: str) -> list:
+        with metrics.timed("embed_query"):
+            time.sleep(embed_latency_s)
+            return vectorstore.stub_embed_query(query)
+    vectorstore._embed_query_uncached = embed
+
+    backend = vectorstore.get_dense_backend(store)
+    search_candidates = backend.search_candidates
+    def slow_search_candidates(query_emb, store, top_k=50):
+        time.sleep(dense_latency_s)
+        return search_candidates(query_emb, store, top_k=top_k)
+    backend.search_candidates = slow_search_candidates
+
+    llm_client_pool.clear()
+    llm_client_pool.factory = lambda api_key: StubLLM(llm_latency_s)
+
+
+class StageRecorder:
+    """Captures every rag_stage_seconds observation (the histogram only keeps buckets)."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._observe = metrics.STAGE_SECONDS.observe
+        metrics.STAGE_SECONDS.observe = self._record
+
+    def _record(self, value, **labels):
+        self.samples[labels["stage"]].append(value)
+        self._observe(value, **labels)
+
+    def reset(self):
+        self.samples = defaultdict(list)
+
+    def summary(self) -> dict:
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def summarize(values) -> dict:
+    ms = np.asarray(values, dtype=np.float64) * 1000
+    result = {"n": int(len(ms))}
+    if len(ms):
+        result.update({f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in PERCENTILES})
+        result["mean_ms"] = round(float(ms.mean()), 3)
+    return result
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_sequential(name: str, fn, queries: list, recorder: StageRecorder) -> dict:
+    recorder.reset()
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    result = {"latency": summarize(latencies), "stages": recorder.summary(),
+              "throughput_qps": round(len(queries) / elapsed, 2)}
+    print(f"\n[{name}] {len(queries)} queries, {result['throughput_qps']} q/s")
+    print_stages(result)
+    return result
+
+async def _load_level(app, queries: list, concurrency: int, n_keys: int) -> dict:
+    import httpx
+
+    queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    latencies, errors = [], 0
+
+    async def client(http, api_key):
+        nonlocal errors
+        while True:
+            try:
+                query = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            response = await http.post("/api/qa", json={"user_query": query, "api_key": api_key})
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status_code != 200
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, f"bench-key-{i % n_keys}") for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "requests": len(queries), "errors": errors,
+            "throughput_rps": round(len(queries) / elapsed, 2), "latency": summarize(latencies)}
+
+def run_load(queries: list, levels: list, n_keys: int, recorder: StageRecorder) -> list:
+    from main import app
+
+    results = []
+    print(f"\n[load] POST /api/qa, {len(queries)} requests per level, {n_keys} API key(s)")
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in levels:
+        rag_pipeline.answer_cache.clear()
+        # Pooled clients hold asyncio semaphores bound to the previous level's event loop
+        llm_client_pool.clear()
+        recorder.reset()
+        level = asyncio.run(_load_level(app, queries, concurrency, n_keys))
+        level["stages"] = recorder.summary()
+        latency = level["latency"]
+        print(f"{concurrency:>8} {level['throughput_rps']:>8} {latency['p50_ms']:>9} "
+              f"{latency['p95_ms']:>9} {latency['p99_ms']:>9} {level['errors']:>7}")
+        results.append(level)
+    return results
+
+def print_stages(result: dict):
+    print(f"  {'stage':<18} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, s in result["stages"].items():
+        print(f"  {stage:<18} {s['n']:>5} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+    latency = result["latency"]
+    print(f"  {'end-to-end':<18} {latency['n']:>5} {latency['p50_ms']:>9} {latency['p95_ms']:>9} {latency['p99_ms']:>9}")
+
+def compare(current: dict, baseline_path: str):
+    """Print p50/p95 deltas of end-to-end and per-stage latency against a previous run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n[compare] against {baseline_path} (positive = slower)")
+    for phase in ("retrieve", "pipeline"):
+        if phase not in baseline or phase not in current:
+            continue
+        rows = [("end-to-end", current[phase]["latency"], baseline[phase]["latency"])]
+        rows += [(stage, s, baseline[phase]["stages"].get(stage))
+                 for stage, s in current[phase]["stages"].items()]
+        for name, now, before in rows:
+            if not before or "p50_ms" not in before or "p50_ms" not in now:
+                continue
+            deltas = [f"p{p} {now[f'p{p}_ms'] - before[f'p{p}_ms']:+.2f}ms" for p in (50, 95)]
+            print(f"  {phase:<9} {name:<18} {'  '.join(deltas)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--paraphrases", type=int, default=2, help="generated paraphrases per query")
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--dense-latency-ms", type=float, default=30)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 16])
+    parser.add_argument("--api-keys", type=int, default=1,
+                        help="distinct API keys spread over the load-test clients (each key has its own LLM concurrency cap)")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="keep the semantic answer cache on (paraphrases then skip the LLM)")
+    parser.add_argument("--out", default="bench_pipeline.json")
+    parser.add_argument("--compare", help="earlier result JSON to diff against")
+    args = parser.parse_args()
+
+    queries = build_query_set(load_queries(args.queries), args.paraphrases)
+    rag_pipeline.ANSWER_CACHE_ENABLED = args.answer_cache
+
+    # Load the corpus and indexes before timing anything
+    store = rag_pipeline.get_chunk_store()
+    install_stand_ins(store, args.embed_latency_ms / 1000, args.dense_latency_ms / 1000, args.llm_latency_ms / 1000)
+    recorder = StageRecorder()
+    rss_after_load = peak_rss_mb()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {**vars(args), "n_queries": len(queries), "n_chunks": len(store)},
+    }
+    vectorstore.query_embedding_cache.clear()
+    results["retrieve"] = run_sequential(
+        "hybrid_retrieve", lambda q: rag_pipeline.hybrid_retrieve(q, store), queries, recorder)
+    vectorstore.query_embedding_cache.clear()
+    results["pipeline"] = run_sequential(
+        "rag_pipeline", lambda q: rag_pipeline.rag_pipeline(q, "bench-key"), queries, recorder)
+    if args.concurrency:
+        vectorstore.query_embedding_cache.clear()
+        results["load"] = run_load(queries, args.concurrency, args.api_keys, recorder)
+
+    results["peak_rss_mb"] = {"after_load": rss_after_load, "final": peak_rss_mb()}
+    results["caches"] = {
+        "query_embedding": vectorstore.query_embedding_cache.stats(),
+        "answer": rag_pipeline.answer_cache.stats(),
+    }
+    print(f"\npeak RSS: {results['peak_rss_mb']['final']} MB (after index load: {rss_after_load} MB)")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
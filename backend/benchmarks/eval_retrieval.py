@@ -0,0 +1,169 @@
+"""
+Retrieval quality vs. cost sweep over the chunk corpus.
+
+For every combination of retriever (dense / sparse / hybrid), RETRIEVE_TOP_K,
+RERANK_TOP_N, DUPLICATE_SIM_THRESHOLD and FINAL_MAX_TOKENS, runs a labelled
+query -> expected-URL set through retrieval and select_context_chunks and
+reports:
+
+    retr_recall   share of expected URLs among the retrieved candidates
+    recall        share of expected URLs that made it into the packed LLM context
+    mrr           mean reciprocal rank of the first expected URL in the context
+    ms            mean retrieval + context-selection latency per query
+    tokens        mean context tokens sent to the LLM
+
+The sparse rows skip reranking (RERANKER=none), so they measure BM25 alone.
+With the default bi-encoder reranker they would be rescored with dense
+embeddings, which makes them a hybrid configuration.
+
+Configurations are marked Pareto-optimal ("*") when no other configuration
+is at least as good on recall, MRR, latency and tokens and strictly better on
+one of them.
+
+Dense retrieval needs query embeddings in the same space as the corpus, i.e.
+QUERY_EMBEDDER=google (the stub embedder only makes sense for the sparse
+retriever). The local dense index is used so Pinecone is not needed.
+
+Usage (from backend/):
+    python -m benchmarks.eval_retrieval [--labels benchmarks/eval_queries.jsonl]
+        [--retrievers dense sparse hybrid] [--top-k 5 10 20] [--rerank-top-n 5 10 20]
+        [--dup-threshold 0.9] [--max-tokens 1000 2000 3000] [--out eval_retrieval.json]
+"""
+import os
+
+os.environ.setdefault("DENSE_BACKEND", "local")
+os.environ.setdefault("QUERY_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+
+from config import RERANKER
+from services import rag_pipeline
+from services.vectorstore import dense_search, embed_query
+
+DEFAULT_LABELS = os.path.join(os.path.dirname(__file__), "eval_queries.jsonl")
+RETRIEVERS = ("dense", "sparse", "hybrid")
+# The sparse-only configuration keeps BM25 order rather than a (dense) reranker's
+RERANKER_FOR = {"dense": RERANKER, "sparse": "none", "hybrid": RERANKER}
+
+
+def load_labels(path: str) -> list:
+    """Read {'query', 'expected_urls'} records from JSONL."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def retrieve(retriever: str, query: str, store, top_k: int) -> list:
+    """Fused candidates for one retriever (single-source lists still get the per-URL cap)."""
+    dense = dense_search(query, store, top_k=top_k) if retriever in ("dense", "hybrid") else []
+    sparse = rag_pipeline.sparse_search(query, store, top_k=top_k) if retriever in ("sparse", "hybrid") else []
+    return rag_pipeline.merge_retrieval_results(dense, sparse, store)
+
+def _recall(urls: list, expected: set) -> float:
+    return len(expected & set(urls)) / len(expected)
+
+def _reciprocal_rank(urls: list, expected: set) -> float:
+    for rank, url in enumerate(urls, start=1):
+        if url in expected:
+            return 1.0 / rank
+    return 0.0
+
+def evaluate(labels: list, store, retriever: str, top_k: int, top_n: int, dup_threshold: float,
+             max_tokens: int) -> dict:
+    retr_recall, recall, mrr, latency, tokens = [], [], [], [], []
+    for item in labels:
+        query, expected = item["query"], set(item["expected_urls"])
+        start = time.perf_counter()
+        candidates = retrieve(retriever, query, store, top_k)
+        packed = rag_pipeline.select_context_chunks(
+            query, candidates, store, top_n=top_n, dup_threshold=dup_threshold, max_tokens=max_tokens,
+            reranker=RERANKER_FOR[retriever])
+        latency.append(time.perf_counter() - start)
+
+        context_urls = [store.url[c.row] for c in packed.candidates]
+        retr_recall.append(_recall([store.url[c.row] for c in candidates], expected))
+        recall.append(_recall(context_urls, expected))
+        mrr.append(_reciprocal_rank(context_urls, expected))
+        tokens.append(packed.tokens_used)
+
+    return {
+        "retriever": retriever, "reranker": RERANKER_FOR[retriever], "top_k": top_k, "rerank_top_n": top_n,
+        "dup_threshold": dup_threshold, "max_tokens": max_tokens,
+        "retr_recall": round(float(np.mean(retr_recall)), 4),
+        "recall": round(float(np.mean(recall)), 4),
+        "mrr": round(float(np.mean(mrr)), 4),
+        "ms": round(float(np.mean(latency)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latency, 95)) * 1000, 3),
+        "tokens": round(float(np.mean(tokens)), 1),
+    }
+
+def mark_pareto(rows: list):
+    """Set row['pareto'] for rows not dominated on (recall, mrr: higher; ms, tokens: lower)."""
+    def better_or_equal(a, b):
+        return (a["recall"] >= b["recall"] and a["mrr"] >= b["mrr"]
+                and a["ms"] <= b["ms"] and a["tokens"] <= b["tokens"])
+
+    def strictly_better(a, b):
+        return (a["recall"] > b["recall"] or a["mrr"] > b["mrr"]
+                or a["ms"] < b["ms"] or a["tokens"] < b["tokens"])
+
+    for row in rows:
+        row["pareto"] = not any(
+            other is not row and better_or_equal(other, row) and strictly_better(other, row)
+            for other in rows
+        )
+
+def print_table(rows: list, pareto_only=False):
+    header = (f"{'':1} {'retriever':<9} {'top_k':>5} {'top_n':>5} {'dup':>5} {'budget':>6} "
+              f"{'retr_rec':>8} {'recall':>7} {'mrr':>6} {'ms':>8} {'tokens':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        if pareto_only and not r["pareto"]:
+            continue
+        print(f"{'*' if r['pareto'] else '':1} {r['retriever']:<9} {r['top_k']:>5} {r['rerank_top_n']:>5} "
+              f"{r['dup_threshold']:>5} {r['max_tokens']:>6} {r['retr_recall']:>8.3f} {r['recall']:>7.3f} "
+              f"{r['mrr']:>6.3f} {r['ms']:>8.2f} {r['tokens']:>7.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", default=DEFAULT_LABELS)
+    parser.add_argument("--retrievers", nargs="+", choices=RETRIEVERS, default=list(RETRIEVERS))
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--rerank-top-n", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--dup-threshold", type=float, nargs="+", default=[rag_pipeline.DUPLICATE_SIM_THRESHOLD])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[1000, 2000, 3000])
+    parser.add_argument("--pareto-only", action="store_true", help="only print Pareto-optimal rows")
+    parser.add_argument("--out", default="eval_retrieval.json")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    store = rag_pipeline.get_chunk_store()
+    # Warm the query-embedding cache and indexes so latency reflects steady state
+    for item in labels:
+        embed_query(item["query"])
+    evaluate(labels[:1], store, "hybrid", max(args.top_k), max(args.rerank_top_n),
+             args.dup_threshold[0], max(args.max_tokens))
+
+    rows = []
+    grid = itertools.product(args.retrievers, args.top_k, args.rerank_top_n, args.dup_threshold, args.max_tokens)
+    for retriever, top_k, top_n, dup_threshold, max_tokens in grid:
+        if top_n > top_k * 2:
+            continue  # reranking can't see more than the fused candidates
+        rows.append(evaluate(labels, store, retriever, top_k, top_n, dup_threshold, max_tokens))
+
+    mark_pareto(rows)
+    rows.sort(key=lambda r: (-r["recall"], -r["mrr"], r["ms"], r["tokens"]))
+    print(f"{len(labels)} labelled queries, {len(store)} chunks\n")
+    print_table(rows, pareto_only=args.pareto_only)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"labels": args.labels, "n_queries": len(labels), "rows": rows}, f, indent=2)
+    print(f"\nwrote {args.out}")
+
+if __name__ == "__main__":
+    main()
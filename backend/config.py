@@ -0,0 +1,111 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# === Data files ===
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+DENSE_EMBEDDING_FILES = [
+    os.path.join(DATA_DIR, "Google_changia_embs.jsonl"),
+    os.path.join(DATA_DIR, "Google_jewel_embs.jsonl"),
+]
+SPARSE_EMBEDDING_FILES = [
+    os.path.join(DATA_DIR, "Google_changia_sparse_embs.jsonl"),
+    os.path.join(DATA_DIR, "Google_jewel_sparse_embs.jsonl"),
+]
+
+RAW_CHUNK_FILES = [
+    os.path.join(DATA_DIR, "changia_embedding_ready_raw_chunks.jsonl"),
+    os.path.join(DATA_DIR, "jewel_embedding_ready_raw_chunks.jsonl"),
+]
+
+# === Compiled embedding store ===
+# Binary (memory-mapped) copy of the JSONL embeddings, built by `python -m services.data_loader`
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join(DATA_DIR, "embedding_store"))
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")  # float32 or float16
+
+# === Corpus snapshots (hot reload) ===
+# Versioned snapshot dirs published by `python -m services.corpus publish`; the CURRENT
+# file names the live one. Without snapshots the store/index dirs above are served.
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(DATA_DIR, "corpus"))
+CORPUS_KEEP_SNAPSHOTS = int(os.getenv("CORPUS_KEEP_SNAPSHOTS", "3"))
+CORPUS_WATCH_INTERVAL_S = float(os.getenv("CORPUS_WATCH_INTERVAL_S", "0"))  # poll CURRENT for changes; 0 = off
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")   # enables /api/admin/* (sent as X-Admin-Token); empty = disabled
+
+# === API keys ===
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+
+# === Dense retrieval ===
+DENSE_BACKEND = os.getenv("DENSE_BACKEND", "pinecone")     # pinecone | local
+QUERY_EMBEDDER = os.getenv("QUERY_EMBEDDER", "google")     # google | stub (offline, deterministic)
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "auto")   # auto | exact | ivf | hnsw
+LOCAL_INDEX_EXACT_MAX = int(os.getenv("LOCAL_INDEX_EXACT_MAX", "20000"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0")) or None       # 0 -> sqrt(n_chunks)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# === Query embedding cache ===
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_S = float(os.getenv("QUERY_CACHE_TTL_S", "86400"))
+QUERY_CACHE_STRIP_PUNCT = os.getenv("QUERY_CACHE_STRIP_PUNCT", "true").lower() == "true"
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")      # e.g. data/query_cache.npz; empty = memory only
+
+# === Semantic answer cache ===
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # min cosine similarity for a hit
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+
+# === Sparse (BM25) retrieval ===
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_DELTA = float(os.getenv("BM25_DELTA", "0.0"))    # > 0 switches to BM25+
+# Fitted index artifact, built by `python -m sparse_search` and rebuilt when RAW_CHUNK_FILES change
+SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", os.path.join(DATA_DIR, "sparse_index"))
+
+# === Per-stage timeouts for the async /api/qa path (seconds) ===
+EMBED_TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S", "5"))
+DENSE_TIMEOUT_S = float(os.getenv("DENSE_TIMEOUT_S", "5"))
+SPARSE_TIMEOUT_S = float(os.getenv("SPARSE_TIMEOUT_S", "2"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+# === LLM ===
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash-latest")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.3"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))                          # max cached clients (one per API key)
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.getenv("LLM_MAX_CONCURRENCY_PER_KEY", "4"))
+
+# === Reranking ===
+RERANKER = os.getenv("RERANKER", "bi")               # bi (reuses chunk embeddings) | cross | none
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))   # over budget -> plain truncation
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))  # (query, chunk_id) cross-encoder scores
+RERANK_FUSION_WEIGHT = float(os.getenv("RERANK_FUSION_WEIGHT", "0.5"))  # share of the fused retrieval score kept in the rerank order; 0 = reranker only
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# === Hybrid retrieval fusion ===
+RETRIEVE_TOP_K = int(os.getenv("RETRIEVE_TOP_K", "20"))         # candidates fetched from each retriever
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")               # rrf | weighted
+RRF_K = int(os.getenv("RRF_K", "60"))
+DENSE_WEIGHT = float(os.getenv("DENSE_WEIGHT", "1.0"))
+SPARSE_WEIGHT = float(os.getenv("SPARSE_WEIGHT", "1.0"))
+MAX_CHUNKS_PER_URL = int(os.getenv("MAX_CHUNKS_PER_URL", "2"))  # 0 = no cap
+
+# === Context packing ===
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))   # token budget for the LLM context block
+CONTEXT_MIN_PARTIAL_TOKENS = int(os.getenv("CONTEXT_MIN_PARTIAL_TOKENS", "40"))  # smallest sentence-truncated chunk worth adding
+TOKENIZER = os.getenv("TOKENIZER", "auto")          # gemini (local vertexai tokenizer) | heuristic | auto
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gemini-1.5-flash")
+
+# === Source attribution ===
+ATTRIBUTION_MAX_SOURCES = int(os.getenv("ATTRIBUTION_MAX_SOURCES", "2"))
+ATTRIBUTION_MIN_CONFIDENCE = float(os.getenv("ATTRIBUTION_MIN_CONFIDENCE", "0.15"))  # IDF-weighted share of answer terms found in the chunk
+
+# === Logging ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()   # DEBUG shows per-request pipeline details
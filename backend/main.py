@@ -1,7 +1,13 @@
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import qa, health
+from config import LOG_LEVEL, CORPUS_WATCH_INTERVAL_S
+from routes import qa, health, metrics, admin
+from services.corpus import corpus_manager
+from services.vectorstore import query_embedding_cache
 
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 app = FastAPI(
     title="Changi RAG Chatbot",
@@ -20,4 +26,18 @@ app.add_middleware(
 
 # Register your route(s)
 app.include_router(qa.router, prefix="/api")
-app.include_router(health.router, prefix="/api", tags=["Health"])
\ No newline at end of file
+app.include_router(health.router, prefix="/api", tags=["Health"])
+app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
+app.include_router(admin.router, prefix="/api", tags=["Admin"])
+
+@app.on_event("startup")
+def load_corpus():
+    # Load and warm the corpus before serving, so the first request doesn't pay for it
+    corpus_manager.current()
+    corpus_manager.start_watcher(CORPUS_WATCH_INTERVAL_S)
+
+@app.on_event("shutdown")
+def persist_caches():
+    corpus_manager.stop_watcher()
+    # Keep warm query embeddings across restarts (no-op unless QUERY_CACHE_PATH is set)
+    query_embedding_cache.save()
@@ -0,0 +1,32 @@
+import asyncio
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from config import ADMIN_TOKEN
+from services.corpus import corpus_manager
+
+router = APIRouter()
+
+def require_admin_token(x_admin_token: str | None = Header(None)):
+    """Admin routes are disabled unless ADMIN_TOKEN is set, and require it in X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin API is disabled (ADMIN_TOKEN not set).")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@router.get("/admin/corpus", summary="Live corpus version", dependencies=[Depends(require_admin_token)])
+def corpus_status():
+    return corpus_manager.current().info()
+
+@router.post("/admin/corpus/reload", summary="Swap in the current corpus snapshot",
+             dependencies=[Depends(require_admin_token)])
+async def reload_corpus(force: bool = False):
+    """
+    Load the snapshot named by CORPUS_DIR/CURRENT and make it live without a restart.
+    In-flight requests finish on the version they started with; on failure the old version keeps serving.
+    """
+    try:
+        return await asyncio.to_thread(corpus_manager.reload, force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Corpus reload failed: {str(e)}")
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.metrics import REGISTRY, render_metrics, stats_collector
+from services.vectorstore import query_embedding_cache
+from services.rag_pipeline import answer_cache
+from services.llm_pool import llm_client_pool
+from services.corpus import corpus_manager
+
+router = APIRouter()
+
+# Export the caches' own counters at scrape time
+REGISTRY.register_collector(stats_collector(
+    "rag_query_embedding_cache", "Query embedding cache", query_embedding_cache.stats,
+    counters=("hits", "misses", "inflight_waits", "evictions"), gauges=("size",)))
+REGISTRY.register_collector(stats_collector(
+    "rag_answer_cache", "Semantic answer cache", answer_cache.stats,
+    counters=("hits", "misses", "evictions", "invalidations", "saved_llm_seconds"), gauges=("size",)))
+REGISTRY.register_collector(stats_collector(
+    "rag_llm_pool", "LLM client pool", llm_client_pool.stats,
+    counters=("created", "reused"), gauges=("size",)))
+REGISTRY.register_collector(stats_collector(
+    "rag_corpus", "Corpus snapshots", corpus_manager.stats,
+    counters=("reloads", "failures"), gauges=("chunks",)))
+
+@router.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency histograms, candidate counts and cache counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,10 @@
+import json
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from services.rag_pipeline import rag_pipeline
+from services.rag_pipeline import rag_pipeline_async, rag_pipeline_stream, StageTimeoutError
+from services.metrics import REQUESTS, timed
 
 
 router = APIRouter()
@@ -12,23 +16,64 @@ class QARequest(BaseModel):
 
 # --- RAG Endpoint ---
 @router.post("/qa", summary="Query the RAG pipeline")
-def query_rag(request: QARequest):
+async def query_rag(request: QARequest):
     """
     Accepts a user query and an API key, then returns an answer and sources using the RAG pipeline.
+    `source_details` ranks the same sources with a title and an attribution confidence.
     """
     if not request.api_key.strip() or not request.user_query.strip():
         raise HTTPException(status_code=400, detail="Both 'user_query' and 'api_key' must be provided.")
 
     try:
-        result = rag_pipeline(user_query=request.user_query, api_key=request.api_key)
+        with timed("total"):
+            result = await rag_pipeline_async(user_query=request.user_query, api_key=request.api_key)
+        REQUESTS.inc(endpoint="qa", outcome="ok")
         return {
             "question": result["question"],
             "answer": result["answer"],
-            "sources": result["sources"]
+            "sources": result["sources"],
+            "source_details": result["source_details"]
         }
+    except StageTimeoutError as e:
+        REQUESTS.inc(endpoint="qa", outcome="timeout")
+        raise HTTPException(status_code=504, detail=f"RAG pipeline timed out: {str(e)}")
     except Exception as e:
+        REQUESTS.inc(endpoint="qa", outcome="error")
         raise HTTPException(status_code=500, detail=f"RAG pipeline failed: {str(e)}")
 
+# --- Streaming RAG Endpoint (Server-Sent Events) ---
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/qa/stream", summary="Query the RAG pipeline, streaming the answer as Server-Sent Events")
+async def query_rag_stream(request: QARequest):
+    """
+    Same input as /qa. Streams `token` events (answer fragments) as the LLM
+    generates them, then one `sources` event and a final `done` event.
+    Failures after the stream has started are reported as an `error` event.
+    """
+    if not request.api_key.strip() or not request.user_query.strip():
+        raise HTTPException(status_code=400, detail="Both 'user_query' and 'api_key' must be provided.")
+
+    async def event_stream():
+        try:
+            with timed("total_stream"):
+                async for event, data in rag_pipeline_stream(user_query=request.user_query, api_key=request.api_key):
+                    yield _sse(event, data)
+            REQUESTS.inc(endpoint="qa_stream", outcome="ok")
+        except StageTimeoutError as e:
+            REQUESTS.inc(endpoint="qa_stream", outcome="timeout")
+            yield _sse("error", {"status": 504, "detail": f"RAG pipeline timed out: {str(e)}"})
+        except Exception as e:
+            REQUESTS.inc(endpoint="qa_stream", outcome="error")
+            yield _sse("error", {"status": 500, "detail": f"RAG pipeline failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --- Healthcheck ---
 @router.get("/ping", summary="Healthcheck")
 def ping():
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache of past answers keyed on query-embedding similarity.
+
+    A lookup returns the stored {answer, sources, source_details} of the most similar past query
+    when its cosine similarity is >= `threshold`, so paraphrases skip the LLM.
+    Entries live in a fixed (max_size, dim) matrix; eviction is LRU plus a TTL.
+    Each entry carries the corpus version and the `namespace` (the model and
+    API key that produced it); a lookup only matches entries of its own version
+    and namespace. Entries of other versions are not wiped on sight, since
+    workers on both sides of a rolling corpus swap share the cache; they are
+    the first to be evicted when a slot is needed.
+    """
+
+    def __init__(self, threshold=0.95, max_size=512, ttl_seconds=3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._vectors = None                      # (max_size, dim), allocated on first store
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._expires_at = np.zeros(max_size, dtype=np.float64)
+        self._versions = np.full(max_size, None, dtype=object)
+        self._namespaces = np.full(max_size, None, dtype=object)
+        self._entries = [None] * max_size         # slot -> dict(answer, sources, source_details, llm_seconds)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_llm_seconds = 0.0
+
+    @staticmethod
+    def _normalize(query_emb) -> np.ndarray:
+        q = np.asarray(query_emb, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else q
+
+    def _drop_locked(self, slots):
+        self._valid[slots] = False
+        for slot in np.atleast_1d(slots):
+            self._entries[slot] = None
+
+    def _drop_expired_locked(self, now):
+        expired = np.flatnonzero(self._valid & (self._expires_at < now))
+        if len(expired):
+            self._drop_locked(expired)
+            self.evictions += len(expired)
+
+    def lookup(self, query_emb, corpus_version=None, namespace=None):
+        """Return the cached {'answer', 'sources', 'source_details', 'similarity'} for a similar query, or None."""
+        q = self._normalize(query_emb)
+        now = time.time()
+        with self._lock:
+            self._drop_expired_locked(now)
+            usable = self._valid & (self._versions == corpus_version) & (self._namespaces == namespace)
+            if self._vectors is None or not usable.any():
+                self.misses += 1
+                return None
+
+            sims = self._vectors @ q
+            sims[~usable] = -np.inf
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[slot]
+            self._last_used[slot] = now
+            self.hits += 1
+            self.saved_llm_seconds += entry["llm_seconds"]
+            return {
+                "answer": entry["answer"],
+                "sources": list(entry["sources"]),
+                "source_details": [dict(s) for s in entry["source_details"]],
+                "similarity": float(sims[slot]),
+            }
+
+    def store(self, query_emb, answer: str, sources: list, llm_seconds=0.0, corpus_version=None,
+              source_details=None, namespace=None):
+        """
+        Cache an answer. When full, evicts an entry of another corpus version if
+        there is one, else the least recently used entry.
+        """
+        q = self._normalize(query_emb)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(q)), dtype=np.float32)
+            self._drop_expired_locked(now)
+
+            free = np.flatnonzero(~self._valid)
+            other_version = np.flatnonzero(self._valid & (self._versions != corpus_version))
+            if len(free):
+                slot = int(free[0])
+            elif len(other_version):
+                slot = int(other_version[np.argmin(self._last_used[other_version])])
+                self.invalidations += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = q
+            self._valid[slot] = True
+            self._versions[slot] = corpus_version
+            self._namespaces[slot] = namespace
+            self._last_used[slot] = now
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._entries[slot] = {
+                "answer": answer,
+                "sources": list(sources),
+                "source_details": [dict(s) for s in source_details or ()],
+                "llm_seconds": llm_seconds,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._drop_locked(np.arange(self.max_size))
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = int(self._valid.sum())
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_llm_seconds": self.saved_llm_seconds,
+        }
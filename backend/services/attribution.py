@@ -0,0 +1,147 @@
+import re
+import threading
+import weakref
+
+import numpy as np
+
+from config import ATTRIBUTION_MAX_SOURCES, ATTRIBUTION_MIN_CONFIDENCE
+from sparse_search import tokenize
+
+URL_RE = re.compile(r"https?://[^\s)\]>\"'`]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most my
+myself no nor not now of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves learn visit info information please may available
+""".split())
+
+
+def attribution_terms(text: str) -> list:
+    """Lowercased content terms used for attribution (BM25 tokenization minus stopwords)."""
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+def build_term_sets(texts, vocabulary: dict = None) -> tuple:
+    """
+    Distinct content-term ids of each text, sorted and concatenated into one
+    array: text i's ids are term_ids[offsets[i]:offsets[i + 1]]. New terms are
+    added to `vocabulary` (term -> id).
+
+    Returns:
+        tuple: (vocabulary, term_ids int32 array, offsets int64 array).
+    """
+    vocabulary = {} if vocabulary is None else vocabulary
+    term_ids, offsets = [], [0]
+    for text in texts:
+        term_ids.extend(sorted({vocabulary.setdefault(t, len(vocabulary)) for t in attribution_terms(text)}))
+        offsets.append(len(term_ids))
+    return vocabulary, np.asarray(term_ids, dtype=np.int32), np.asarray(offsets, dtype=np.int64)
+
+def _normalize_url(url: str) -> str:
+    return url.strip().rstrip("/.,;:").lower()
+
+
+class SourceAttributor:
+    """
+    Ranks candidate sources by how much of an answer they support.
+
+    Each chunk's distinct content terms are stored once as a sorted array of
+    term ids, with corpus IDF per term, so attributing an answer only
+    tokenizes the answer. The term ids of the embedding store's rows are
+    memory-mapped from the store when it has them (see
+    data_loader.write_embedding_store); only rows beyond those are tokenized
+    here. A chunk's confidence is the IDF-weighted share of the answer's
+    known terms that appear in it; a URL quoted verbatim in the answer is
+    treated as an explicit citation (confidence 1.0).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        stored = store.attribution_terms
+        if stored is None:
+            self.vocabulary, self._stored_ids, self._stored_offsets = {}, np.empty(0, np.int32), np.zeros(1, np.int64)
+        else:
+            vocabulary, self._stored_ids, self._stored_offsets = stored
+            self.vocabulary = {term: term_id for term_id, term in enumerate(vocabulary)}
+        self._n_stored = len(self._stored_offsets) - 1
+        # Rows the store has no term sets for (sparse-only chunks, or an older store)
+        _, self._tail_ids, self._tail_offsets = build_term_sets(store.text[self._n_stored:len(store)], self.vocabulary)
+        self._n_rows = self._n_stored + len(self._tail_offsets) - 1
+
+        df = np.bincount(self._stored_ids, minlength=len(self.vocabulary)) \
+            + np.bincount(self._tail_ids, minlength=len(self.vocabulary))
+        n_docs = max(self._n_rows, 1)
+        self.idf = np.log1p(n_docs / np.maximum(df.astype(np.float32), 1.0))
+        # Rows interned after this was built (e.g. new Pinecone ids), filled on first use
+        self._late_terms = {}
+
+    def _terms(self, row: int) -> np.ndarray:
+        if row < self._n_stored:
+            return self._stored_ids[self._stored_offsets[row]:self._stored_offsets[row + 1]]
+        if row < self._n_rows:
+            row -= self._n_stored
+            return self._tail_ids[self._tail_offsets[row]:self._tail_offsets[row + 1]]
+        terms = self._late_terms.get(row)
+        if terms is None:
+            ids = {self.vocabulary[t] for t in attribution_terms(self.store.text[row]) if t in self.vocabulary}
+            terms = self._late_terms[row] = np.fromiter(sorted(ids), dtype=np.int32, count=len(ids))
+        return terms
+
+    def attribute(self, answer: str, candidates: list, max_sources: int = ATTRIBUTION_MAX_SOURCES,
+                  min_confidence: float = ATTRIBUTION_MIN_CONFIDENCE) -> list:
+        """
+        Args:
+            answer (str): Generated answer.
+            candidates (list): Candidate handles that made up the LLM context.
+            max_sources (int): Number of sources to return.
+            min_confidence (float): Drop sources scoring below this (explicit citations always pass).
+
+        Returns:
+            list: [{'url', 'title', 'chunk_id', 'confidence'}] best first, one entry per URL.
+        """
+        store = self.store
+        cited = {_normalize_url(u) for u in URL_RE.findall(answer)}
+        answer_ids = np.unique(np.fromiter(
+            (self.vocabulary[t] for t in attribution_terms(URL_RE.sub(" ", answer)) if t in self.vocabulary),
+            dtype=np.int32,
+        ))
+        weights = self.idf[answer_ids]
+        total = float(weights.sum())
+
+        best = {}
+        for c in candidates:
+            url = store.url[c.row]
+            if not url:
+                continue
+            confidence = 0.0
+            if total > 0:
+                present = np.isin(answer_ids, self._terms(c.row), assume_unique=True)
+                confidence = float(weights[present].sum()) / total
+            if _normalize_url(url) in cited:
+                confidence = 1.0
+            if url not in best or confidence > best[url]['confidence']:
+                best[url] = {
+                    'url': url,
+                    'title': store.title[c.row],
+                    'chunk_id': store.chunk_ids[c.row],
+                    'confidence': round(confidence, 4),
+                }
+
+        ranked = sorted(best.values(), key=lambda s: s['confidence'], reverse=True)
+        return [s for s in ranked if s['confidence'] >= min_confidence][:max_sources]
+
+
+# One attributor per ChunkStore (i.e. per corpus version), dropped with the store
+_attributors = weakref.WeakKeyDictionary()
+_attributors_lock = threading.Lock()
+
+def get_source_attributor(store) -> SourceAttributor:
+    attributor = _attributors.get(store)
+    if attributor is None:
+        built = SourceAttributor(store)
+        with _attributors_lock:
+            attributor = _attributors.setdefault(store, built)
+    return attributor
@@ -0,0 +1,181 @@
+import logging
+import threading
+
+import numpy as np
+
+from services.tokenizer import count_tokens, count_tokens_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Candidate:
+    """
+    Lightweight handle for one retrieved chunk: its ChunkStore row plus the
+    scores collected on the way through retrieve -> fuse -> rerank -> dedup -> trim.
+    `score` is whatever the latest stage ranked on.
+    """
+
+    __slots__ = ("row", "score", "dense_rank", "dense_score", "sparse_rank", "sparse_score",
+                 "fused_score", "rerank_score")
+
+    def __init__(self, row: int, score: float = 0.0):
+        self.row = row
+        self.score = score
+        self.dense_rank = self.dense_score = None
+        self.sparse_rank = self.sparse_score = None
+        self.fused_score = self.rerank_score = None
+
+    def __repr__(self):
+        return f"Candidate(row={self.row}, score={self.score:.4f})"
+
+
+def context_header(title: str, url: str) -> str:
+    """Line that introduces a chunk in the LLM context (see rag_pipeline.build_context)."""
+    return f"{title} | Source: {url}\n"
+
+
+def count_chunk_tokens(metadata: list) -> np.ndarray:
+    """(n_chunks, 2) int32 token counts of each chunk's text and of its context header."""
+    counts = np.empty((len(metadata), 2), dtype=np.int32)
+    counts[:, 0] = count_tokens_batch([m.get('text', '') for m in metadata])
+    counts[:, 1] = count_tokens_batch([context_header(m.get('title', ''), m.get('url', '')) for m in metadata])
+    return counts
+
+
+class TokenColumn:
+    """Per-row token counts: a (possibly memory-mapped) array for the stored rows plus a list for interned ones."""
+
+    __slots__ = ("_base", "_extra")
+
+    def __init__(self, base):
+        self._base = base
+        self._extra = []
+
+    def __len__(self):
+        return len(self._base) + len(self._extra)
+
+    def __getitem__(self, row: int) -> int:
+        if row < len(self._base):
+            return int(self._base[row])
+        return self._extra[row - len(self._base)]
+
+    def append(self, count: int):
+        self._extra.append(count)
+
+
+class ChunkStore:
+    """
+    Columnar, read-mostly view of every chunk the retrievers can return.
+
+    Rows [0, n_embedded) are the embedding store's rows in the same order, so a
+    local dense index row *is* a ChunkStore row and its vector is
+    `vectors[row]` (a view into the memory map). Chunks only known to the
+    sparse index or to Pinecone are interned after that; the ones that arrive
+    with an embedding keep it in a small side table.
+
+    Token counts for each chunk's text and its "title | Source: url" context
+    header are memory-mapped from the embedding store when it was built with
+    the same tokenizer (computed once here otherwise), so context packing
+    never re-tokenizes.
+    """
+
+    def __init__(self, embedding_store):
+        metadata = embedding_store.metadata
+        self.version = embedding_store.version
+        self.vectors = embedding_store.vectors
+        self.dim = self.vectors.shape[1]
+        self.n_embedded = len(embedding_store)
+        self.chunk_ids = list(embedding_store.chunk_ids)
+        self.row_of = dict(embedding_store.row_of)
+        self.text = [m.get('text', '') for m in metadata]
+        self.url = [m.get('url', '') for m in metadata]
+        self.title = [m.get('title', '') for m in metadata]
+        self.section = [m.get('section', '') for m in metadata]
+        counts = embedding_store.token_counts()
+        if counts is None or len(counts) != self.n_embedded:
+            counts = count_chunk_tokens(metadata)
+        self.token_counts = TokenColumn(counts[:, 0])
+        self.header_tokens = TokenColumn(counts[:, 1])
+        # Stored attribution term sets for rows [0, n_embedded), read by SourceAttributor
+        self.attribution_terms = embedding_store.attribution_terms()
+        if self.attribution_terms is not None and len(self.attribution_terms[2]) != self.n_embedded + 1:
+            self.attribution_terms = None
+        self._extra_vectors = {}
+        self._lock = threading.Lock()
+        # Sparse index doc id -> row, filled in by attach_sparse_index()
+        self.sparse_index = None
+        self.sparse_rows = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def intern(self, chunk_id: str, metadata: dict, embedding=None) -> int:
+        """Return the row for chunk_id, appending it (and its embedding, if any) when unseen."""
+        row = self.row_of.get(chunk_id)
+        if row is not None:
+            return row
+        with self._lock:
+            row = self.row_of.get(chunk_id)
+            if row is not None:
+                return row
+            row = len(self.chunk_ids)
+            self.text.append(metadata.get('text', ''))
+            self.url.append(metadata.get('url', ''))
+            self.title.append(metadata.get('title', ''))
+            self.section.append(metadata.get('section', ''))
+            self.token_counts.append(count_tokens(self.text[row]))
+            self.header_tokens.append(count_tokens(context_header(self.title[row], self.url[row])))
+            if embedding is not None and len(embedding) == self.dim:
+                self._extra_vectors[row] = np.asarray(embedding, dtype=np.float32)
+            # Publish the id last so readers never see a half-appended row
+            self.chunk_ids.append(chunk_id)
+            self.row_of[chunk_id] = row
+            return row
+
+    def attach_sparse_index(self, sparse_index):
+        """Map the sparse index's documents onto rows (interning any not yet known)."""
+        self.sparse_index = sparse_index
+        self.sparse_rows = np.array(
+            [self.intern(c['chunk_id'], c) for c in sparse_index.chunks], dtype=np.int64
+        )
+
+    def embedding(self, row: int):
+        """Embedding for row, or None if the chunk has none."""
+        if row < self.n_embedded:
+            return self.vectors[row]
+        return self._extra_vectors.get(row)
+
+    def embedding_matrix(self, rows: list):
+        """Return (rows_with_embeddings, (n, dim) float32 matrix) for the given rows."""
+        kept = [row for row in rows if row < self.n_embedded or row in self._extra_vectors]
+        if not kept:
+            return kept, np.empty((0, self.dim), dtype=np.float32)
+        matrix = np.empty((len(kept), self.dim), dtype=np.float32)
+        for i, row in enumerate(kept):
+            matrix[i] = self.vectors[row] if row < self.n_embedded else self._extra_vectors[row]
+        return kept, matrix
+
+    def metadata(self, row: int) -> dict:
+        return {
+            'chunk_id': self.chunk_ids[row],
+            'text': self.text[row],
+            'url': self.url[row],
+            'title': self.title[row],
+            'section': self.section[row],
+        }
+
+    def materialize(self, row: int) -> dict:
+        """Build the legacy chunk dict ({'chunk_id', 'metadata', 'embedding'}) for one row."""
+        embedding = self.embedding(row)
+        metadata = self.metadata(row)
+        if embedding is not None:
+            metadata['embedding'] = embedding
+        return {'chunk_id': self.chunk_ids[row], 'metadata': metadata, 'embedding': embedding}
+
+
+def build_chunk_store(embedding_store, sparse_index=None) -> ChunkStore:
+    store = ChunkStore(embedding_store)
+    if sparse_index is not None:
+        store.attach_sparse_index(sparse_index)
+    logger.info("Chunk store ready: %d chunks (%d with stored embeddings)", len(store), store.n_embedded)
+    return store
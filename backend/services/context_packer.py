@@ -0,0 +1,63 @@
+from config import CONTEXT_MAX_TOKENS, CONTEXT_MIN_PARTIAL_TOKENS
+from services.tokenizer import truncate_to_tokens
+
+# "\n\n" between context blocks
+SEPARATOR_TOKENS = 1
+
+
+class PackedContext:
+    """The candidates chosen for the LLM context, the text used for each, and the tokens spent."""
+
+    __slots__ = ("candidates", "texts", "tokens_used", "max_tokens", "truncated")
+
+    def __init__(self, max_tokens: int):
+        self.candidates = []
+        self.texts = []
+        self.tokens_used = 0
+        self.max_tokens = max_tokens
+        self.truncated = 0
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def add(self, candidate, text: str, tokens: int, truncated: bool = False):
+        self.candidates.append(candidate)
+        self.texts.append(text)
+        self.tokens_used += tokens
+        self.truncated += truncated
+
+
+def pack_context(candidates: list, store, max_tokens: int = CONTEXT_MAX_TOKENS,
+                 min_partial_tokens: int = CONTEXT_MIN_PARTIAL_TOKENS) -> PackedContext:
+    """
+    Greedily fill a token budget with candidates in rank order.
+
+    Uses the per-chunk token counts cached in the ChunkStore (body plus the
+    "title | Source: url" header). A chunk that doesn't fit is cut at a
+    sentence boundary if at least `min_partial_tokens` of body fit; otherwise
+    it is skipped and smaller lower-ranked chunks still get a chance.
+
+    Args:
+        candidates (list): Candidate handles, best first.
+        store (ChunkStore): Source of text and cached token counts.
+        max_tokens (int): Budget for the whole context block.
+        min_partial_tokens (int): Smallest truncated body worth including.
+
+    Returns:
+        PackedContext: Selected candidates/texts in rank order and tokens used.
+    """
+    packed = PackedContext(max_tokens)
+    for c in candidates:
+        overhead = store.header_tokens[c.row] + (SEPARATOR_TOKENS if packed.candidates else 0)
+        remaining = max_tokens - packed.tokens_used - overhead
+        if remaining < min(min_partial_tokens, store.token_counts[c.row]):
+            continue
+
+        if store.token_counts[c.row] <= remaining:
+            packed.add(c, store.text[c.row], overhead + store.token_counts[c.row])
+            continue
+
+        text, tokens = truncate_to_tokens(store.text[c.row], remaining)
+        if tokens >= min_partial_tokens:
+            packed.add(c, text, overhead + tokens, truncated=True)
+    return packed
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from config import CORPUS_DIR, CORPUS_KEEP_SNAPSHOTS, CORPUS_WATCH_INTERVAL_S, EMBEDDING_STORE_DIR, RAW_CHUNK_FILES
+from services.attribution import get_source_attributor
+from services.chunk_store import build_chunk_store
+from services.data_loader import (
+    EmbeddingStore,
+    hash_files,
+    load_embedding_store,
+    write_atomic,
+    STORE_VECTORS_FILE,
+    STORE_IDS_FILE,
+    STORE_METADATA_FILE,
+    STORE_MANIFEST_FILE,
+    STORE_SIDECAR_FILES,
+)
+from services.vectorstore import get_dense_backend
+from sparse_search import SparseSearchIndex, build_sparse_index, load_or_build_sparse_index
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"          # names the live snapshot directory inside CORPUS_DIR
+SNAPSHOT_STORE_DIR = "embedding_store"
+SNAPSHOT_SPARSE_DIR = "sparse_index"
+LEGACY_SOURCE = "legacy"          # serving EMBEDDING_STORE_DIR / SPARSE_INDEX_DIR directly
+STORE_FILES = (STORE_VECTORS_FILE, STORE_IDS_FILE, STORE_METADATA_FILE, STORE_MANIFEST_FILE)
+
+
+class Corpus:
+    """
+    One immutable corpus version: embedding store, sparse index and the
+    ChunkStore over both (which carries the sparse index; the dense backend and
+    source attributor are cached per ChunkStore). A request grabs one Corpus and
+    uses it throughout, so a swap never mixes versions within a request.
+    """
+
+    def __init__(self, source: str, version: str, embedding_store, sparse_index):
+        self.source = source
+        self.version = version
+        self.embedding_store = embedding_store
+        self.sparse_index = sparse_index
+        self.store = build_chunk_store(embedding_store, sparse_index)
+        self.loaded_at = time.time()
+
+    def warm(self):
+        """Build the per-version dense index and attributor before taking traffic."""
+        get_dense_backend(self.store)
+        get_source_attributor(self.store)
+
+    def info(self) -> dict:
+        return {
+            "source": self.source,
+            "version": self.version,
+            "chunks": len(self.store),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def read_current_snapshot(corpus_dir: str = CORPUS_DIR):
+    """Name of the live snapshot, or None when no snapshot has been published."""
+    try:
+        with open(os.path.join(corpus_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_corpus(source: str, corpus_dir: str = CORPUS_DIR) -> Corpus:
+    """Load a published snapshot, or the legacy store/index dirs when source is LEGACY_SOURCE."""
+    if source == LEGACY_SOURCE:
+        embedding_store = load_embedding_store()
+        return Corpus(source, embedding_store.version, embedding_store, load_or_build_sparse_index())
+
+    path = os.path.join(corpus_dir, source)
+    embedding_store = EmbeddingStore(os.path.join(path, SNAPSHOT_STORE_DIR))
+    sparse_index = SparseSearchIndex.load(os.path.join(path, SNAPSHOT_SPARSE_DIR))
+    # The snapshot name is unique per publish, so it also invalidates cached answers
+    return Corpus(source, source, embedding_store, sparse_index)
+
+
+class CorpusManager:
+    """
+    Holds the live Corpus and swaps it atomically.
+
+    reload() builds and warms the new version on the side, then replaces a
+    single reference; requests already holding the old Corpus finish on it
+    and it is freed once the last one drops it. A failed load keeps the old
+    version. With several uvicorn workers each process has its own manager,
+    so use the file watcher (or call the admin endpoint per worker).
+    """
+
+    def __init__(self, corpus_dir: str = CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        self._corpus = None
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.failures = 0
+
+    def current(self) -> Corpus:
+        corpus = self._corpus
+        if corpus is None:
+            self.reload()
+            corpus = self._corpus
+        return corpus
+
+    def reload(self, force: bool = False) -> dict:
+        """
+        Load the snapshot named by CURRENT (legacy dirs if none) and swap it in.
+        Unless force is set, nothing is loaded when that snapshot is already live.
+        """
+        with self._load_lock:
+            source = read_current_snapshot(self.corpus_dir) or LEGACY_SOURCE
+            old = self._corpus
+            if old is not None and old.source == source and not force:
+                return {"changed": False, **old.info()}
+
+            start = time.perf_counter()
+            try:
+                corpus = load_corpus(source, self.corpus_dir)
+                corpus.warm()
+            except Exception:
+                self.failures += 1
+                if old is not None:
+                    logger.exception("Loading corpus %s failed, still serving %s", source, old.version)
+                raise
+            self._corpus = corpus
+            self.reloads += 1
+            logger.info("Corpus %s is live (%d chunks, loaded in %.2fs%s)", corpus.version, len(corpus.store),
+                        time.perf_counter() - start, f", replaced {old.version}" if old else "")
+            return {"changed": True, **corpus.info()}
+
+    def start_watcher(self, interval_s: float = CORPUS_WATCH_INTERVAL_S):
+        """Poll CURRENT every interval_s seconds and reload when it changes (no-op if interval_s <= 0)."""
+        if interval_s <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            failed = None
+            while not self._stop.wait(interval_s):
+                corpus = self._corpus
+                source = read_current_snapshot(self.corpus_dir) or LEGACY_SOURCE
+                # A snapshot that failed to load is retried only once CURRENT changes again
+                if corpus is not None and source not in (corpus.source, failed):
+                    try:
+                        self.reload()
+                        failed = None
+                    except Exception:
+                        failed = source  # already logged
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=watch, name="corpus-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self) -> dict:
+        corpus = self._corpus
+        return {
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "chunks": len(corpus.store) if corpus else 0,
+            "version": corpus.version if corpus else None,
+        }
+
+
+def check_store_matches_chunks(store: EmbeddingStore, raw_chunk_files=RAW_CHUNK_FILES):
+    """
+    Raise ValueError unless `store` holds exactly the chunks (ids and text) of
+    the raw chunk files, so its rows line up with a sparse index built from them.
+    """
+    existing = [p for p in raw_chunk_files if os.path.exists(p)]
+    if not existing:
+        raise FileNotFoundError(f"None of the raw chunk files exist: {raw_chunk_files}")
+    if store.vectors.shape[0] != len(store.chunk_ids) or list(store.vectors.shape) != store.manifest.get("shape"):
+        raise ValueError(f"Embedding store in {store.store_dir} is inconsistent (was it rewritten while publishing?)")
+    # Stores written by scripts/5.embed.py are stamped with the raw chunk files' hash
+    if store.manifest.get("source_hash") == hash_files(existing):
+        return
+
+    chunks = {}
+    for path in existing:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    chunks.setdefault(record["chunk_id"], record.get("text"))
+    stored = {chunk_id: meta.get("text") for chunk_id, meta in zip(store.chunk_ids, store.metadata)}
+    if stored != chunks:
+        missing = len(chunks.keys() - stored.keys())
+        extra = len(stored.keys() - chunks.keys())
+        changed = sum(1 for chunk_id, text in chunks.items() if chunk_id in stored and stored[chunk_id] != text)
+        raise ValueError(
+            f"Embedding store in {store.store_dir} does not match {', '.join(map(os.path.basename, existing))} "
+            f"({missing} chunks missing, {extra} extra, {changed} with different text); "
+            f"re-embed with scripts/5.embed.py before publishing"
+        )
+
+def _link_or_copy(src, dst):
+    # Store files are only ever replaced by rename, never rewritten, so a hardlink is a stable copy
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def publish_snapshot(corpus_dir: str = CORPUS_DIR, keep: int = CORPUS_KEEP_SNAPSHOTS,
+                     store_dir: str = EMBEDDING_STORE_DIR, raw_chunk_files=RAW_CHUNK_FILES) -> str:
+    """
+    Snapshot the compiled embedding store, plus a sparse index fitted on the
+    raw chunk files, and make it current.
+
+    The store is taken as it is (hardlinked, or copied across filesystems), not
+    recompiled, and it must hold exactly the raw chunks so dense and sparse rows
+    agree. The snapshot is built in a temp directory, renamed into place, and
+    only then is CURRENT replaced, so readers see either the old or the new
+    version. Older snapshots beyond `keep` are deleted.
+
+    Returns:
+        str: The new snapshot's name.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    store_dir = os.path.realpath(store_dir)   # one store version even if it is recompiled meanwhile
+    name = time.strftime("v%Y%m%d-%H%M%S")
+    tmp_path = tempfile.mkdtemp(prefix=f".{name}.", suffix=".tmp", dir=corpus_dir)
+    try:
+        snapshot_store_dir = os.path.join(tmp_path, SNAPSHOT_STORE_DIR)
+        os.makedirs(snapshot_store_dir)
+        for filename in STORE_FILES + STORE_SIDECAR_FILES:
+            if filename in STORE_SIDECAR_FILES and not os.path.exists(os.path.join(store_dir, filename)):
+                continue
+            _link_or_copy(os.path.join(store_dir, filename), os.path.join(snapshot_store_dir, filename))
+        # Checked on the snapshot's own files, which can no longer change underneath us
+        store = EmbeddingStore(snapshot_store_dir)
+        check_store_matches_chunks(store, raw_chunk_files)
+        build_sparse_index(raw_chunk_files, index_dir=os.path.join(tmp_path, SNAPSHOT_SPARSE_DIR))
+        name = base = f"{name}-{store.version[:8]}"
+        suffix = 1
+        while os.path.exists(os.path.join(corpus_dir, name)):   # republished within the same second
+            suffix += 1
+            name = f"{base}-{suffix}"
+        os.chmod(tmp_path, 0o755)   # mkdtemp creates it private
+        os.replace(tmp_path, os.path.join(corpus_dir, name))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    def write_pointer(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name + "\n")
+
+    write_atomic(os.path.join(corpus_dir, CURRENT_FILE), write_pointer)
+    logger.info("Published corpus snapshot %s (%d chunks)", name, len(store))
+
+    snapshots = sorted(d for d in os.listdir(corpus_dir)
+                       if d.startswith("v") and os.path.isdir(os.path.join(corpus_dir, d)))
+    for old in snapshots[:-keep] if keep > 0 else []:
+        if old != name:
+            shutil.rmtree(os.path.join(corpus_dir, old), ignore_errors=True)
+            logger.info("Removed old corpus snapshot %s", old)
+    return name
+
+
+corpus_manager = CorpusManager()
+
+def get_corpus() -> Corpus:
+    return corpus_manager.current()
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m services.corpus [publish|status]
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if sys.argv[1:2] == ["publish"]:
+        print(publish_snapshot())
+    else:
+        print(read_current_snapshot() or f"no snapshots in {CORPUS_DIR}, serving the {LEGACY_SOURCE} store")
@@ -1,5 +1,37 @@
+import fcntl
+import hashlib
 import json
-from typing import List, Dict
+import logging
+import os
+import shutil
+import tempfile
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from config import (
+    DENSE_EMBEDDING_FILES,
+    SPARSE_EMBEDDING_FILES,
+    RAW_CHUNK_FILES,
+    EMBEDDING_STORE_DIR,
+    EMBEDDING_STORE_DTYPE,
+)
+from services.chunk_store import count_chunk_tokens
+from services.tokenizer import token_counter_name
+
+logger = logging.getLogger(__name__)
+
+# Files that make up a compiled embedding store
+STORE_VECTORS_FILE = "embeddings.npy"     # (n_chunks, dim) float32/float16 matrix
+STORE_IDS_FILE = "chunk_ids.json"         # row -> chunk_id
+STORE_METADATA_FILE = "metadata.jsonl"    # row-aligned chunk metadata (text, url, title, section)
+STORE_MANIFEST_FILE = "manifest.json"     # dtype, shape, tokenizer, source content hash and source sizes/mtimes
+STORE_TOKENS_FILE = "token_counts.npy"    # (n_chunks, 2) int32 text / context-header token counts
+STORE_TERMS_FILE = "attribution_terms.npy"           # each row's sorted content-term ids, concatenated
+STORE_TERM_OFFSETS_FILE = "attribution_offsets.npy"  # row r's ids are terms[offsets[r]:offsets[r + 1]]
+STORE_VOCAB_FILE = "attribution_vocab.json"          # term id -> term
+# Derived at build time so workers don't recompute them at startup; stores written before them still load
+STORE_SIDECAR_FILES = (STORE_TOKENS_FILE, STORE_TERMS_FILE, STORE_TERM_OFFSETS_FILE, STORE_VOCAB_FILE)
 
 
 def load_embedding_chunks(file_path: str) -> List[Dict]:
@@ -18,21 +50,366 @@ def load_all_embedding_chunks():
     Load all embedding chunk files (dense + sparse) explicitly.
     Returns a tuple (dense_chunks, sparse_chunks).
     """
-    dense_files = [
-        "data/Google_changia_embs.jsonl",
-        "data/Google_jewel_embs.jsonl"
-    ]
-    sparse_files = [
-        "data/Google_changia_sparse_embs.jsonl",
-        "data/Google_jewel_sparse_embs.jsonl"
-    ]
-
     dense_chunks = []
-    for f in dense_files:
+    for f in DENSE_EMBEDDING_FILES:
         dense_chunks.extend(load_embedding_chunks(f))
 
     sparse_chunks = []
-    for f in sparse_files:
+    for f in SPARSE_EMBEDDING_FILES:
         sparse_chunks.extend(load_embedding_chunks(f))
 
     return dense_chunks, sparse_chunks
+
+def hash_files(file_paths: List[str]) -> str:
+    """Return a sha256 over the contents of the given files (in order)."""
+    digest = hashlib.sha256()
+    for path in file_paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def source_stats(file_paths: List[str]) -> List[List]:
+    """[basename, size, mtime_ns] per file, stored in the manifest so unchanged sources need not be rehashed."""
+    stats = []
+    for path in file_paths:
+        st = os.stat(path)
+        stats.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return stats
+
+def _split_record(record: Dict):
+    """Split a JSONL chunk record into (chunk_id, metadata, embedding)."""
+    nested = record.get("metadata") or {}
+    embedding = record.get("embedding")
+    if embedding is None:
+        embedding = nested.get("embedding")
+
+    metadata = {k: v for k, v in nested.items() if k != "embedding"}
+    metadata.update({k: v for k, v in record.items() if k not in ("embedding", "metadata")})
+    return record.get("chunk_id") or metadata.get("chunk_id"), metadata, embedding
+
+def write_atomic(path: str, write_fn):
+    """
+    Call write_fn(tmp_path) on a fresh temp file next to `path`, then rename it
+    over `path`. The temp name is unique, so workers compiling the same store at
+    first boot never write into each other's files, and readers (or memory
+    maps) of the old file keep its inode.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write_fn(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def compile_embedding_store(file_paths: Optional[List[str]] = None,
+                            store_dir: str = EMBEDDING_STORE_DIR,
+                            dtype: str = EMBEDDING_STORE_DTYPE) -> Dict:
+    """
+    Compile JSONL embedding files into a binary embedding store.
+
+    The store is a contiguous (n_chunks, dim) matrix saved as .npy (so it can be
+    memory-mapped), a row-ordered chunk_id list and a row-aligned metadata sidecar.
+    When a chunk_id appears in several files, the first occurrence wins.
+
+    Args:
+        file_paths (list): JSONL files to compile. Defaults to the dense + sparse files in config.
+        store_dir (str): Output directory.
+        dtype (str): 'float32' or 'float16'.
+
+    Returns:
+        dict: The manifest written alongside the store.
+    """
+    if file_paths is None:
+        file_paths = DENSE_EMBEDDING_FILES + SPARSE_EMBEDDING_FILES
+
+    existing = [p for p in file_paths if os.path.exists(p)]
+    for missing in sorted(set(file_paths) - set(existing)):
+        logger.warning("Embedding file not found, skipping: %s", missing)
+    if not existing:
+        raise FileNotFoundError(f"None of the embedding files exist: {file_paths}")
+
+    chunk_ids, metadata, vectors = [], [], []
+    seen = set()
+    for path in existing:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                chunk_id, meta, embedding = _split_record(json.loads(line))
+                if not chunk_id or embedding is None or chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                chunk_ids.append(chunk_id)
+                metadata.append(meta)
+                vectors.append(np.asarray(embedding, dtype=dtype))
+
+    if not vectors:
+        raise ValueError(f"No chunks with a chunk_id and an embedding in {existing}")
+
+    manifest = {
+        "source_files": [os.path.basename(p) for p in existing],
+        "source_hash": hash_files(existing),
+        "source_stats": source_stats(existing),
+    }
+    matrix = np.vstack(vectors)
+
+    # Built next to store_dir and swapped in whole, so readers see the old or the new version
+    parent, name = os.path.split(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f".{name}.", suffix=".tmp", dir=parent)
+    try:
+        manifest = write_embedding_store(chunk_ids, metadata, matrix, build_dir, manifest)
+        os.chmod(build_dir, 0o755)   # mkdtemp creates it private
+        _swap_in_store(build_dir, store_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return manifest
+
+def _swap_in_store(build_dir: str, store_dir: str, keep: int = 2):
+    """
+    Make store_dir a symlink to a finished build directory with one rename.
+
+    Each build becomes a `.<name>.v-*` sibling. A store_dir that is still a
+    plain directory (from before stores were swapped) is moved aside first,
+    which is the only time readers can find it missing. The newest `keep`
+    versions are kept, since a reader that opened the previous one still reads
+    its metadata lazily; older ones are deleted. A lock file serializes swaps
+    between workers compiling at the same time.
+    """
+    parent, name = os.path.split(os.path.abspath(store_dir))
+    with open(os.path.join(parent, f".{name}.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        version_dir = tempfile.mkdtemp(prefix=f".{name}.v-", dir=parent)
+        os.replace(build_dir, version_dir)   # onto mkdtemp's empty directory
+
+        link_dir = tempfile.mkdtemp(prefix=f".{name}.", suffix=".tmp", dir=parent)
+        link_path = os.path.join(link_dir, name)
+        try:
+            os.symlink(os.path.basename(version_dir), link_path)
+            if os.path.isdir(store_dir) and not os.path.islink(store_dir):
+                os.replace(store_dir, tempfile.mkdtemp(prefix=f".{name}.v-", dir=parent))
+            os.replace(link_path, store_dir)
+        finally:
+            shutil.rmtree(link_dir, ignore_errors=True)
+
+        versions = sorted((os.path.join(parent, d) for d in os.listdir(parent) if d.startswith(f".{name}.v-")),
+                          key=os.path.getmtime, reverse=True)
+        for old in versions[keep:]:
+            if old != version_dir:
+                shutil.rmtree(old, ignore_errors=True)
+
+def write_embedding_store(chunk_ids: List[str], metadata: List[Dict], matrix: np.ndarray,
+                          store_dir: str = EMBEDDING_STORE_DIR, manifest: Optional[Dict] = None) -> Dict:
+    """
+    Write a row-aligned (chunk_ids, metadata, matrix) triple as an embedding store.
+
+    Each file is replaced atomically and the manifest goes last, so readers
+    never see a half-written store. `manifest` supplies extra fields
+    (source_files, source_hash, ...); dtype, shape and the tokenizer used for
+    the token-count sidecar are filled in here. Token counts and attribution
+    term sets are derived from the metadata here too (STORE_SIDECAR_FILES).
+
+    Returns:
+        dict: The manifest written alongside the store.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    def write_vectors(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, matrix)
+
+    def write_ids(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(chunk_ids, f, ensure_ascii=False)
+
+    def write_metadata(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for meta in metadata:
+                f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+
+    # Imported here: services.attribution -> sparse_search -> this module
+    from services.attribution import build_term_sets
+
+    token_counts = count_chunk_tokens(metadata)
+    vocabulary, term_ids, term_offsets = build_term_sets(meta.get("text", "") for meta in metadata)
+
+    def write_array(array):
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+        return write
+
+    def write_vocabulary(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(vocabulary), f, ensure_ascii=False)
+
+    manifest = {"dtype": str(matrix.dtype), "shape": list(matrix.shape), **(manifest or {}),
+                "tokenizer": token_counter_name()}
+
+    def write_manifest(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    write_atomic(os.path.join(store_dir, STORE_VECTORS_FILE), write_vectors)
+    write_atomic(os.path.join(store_dir, STORE_IDS_FILE), write_ids)
+    write_atomic(os.path.join(store_dir, STORE_METADATA_FILE), write_metadata)
+    write_atomic(os.path.join(store_dir, STORE_TOKENS_FILE), write_array(token_counts))
+    write_atomic(os.path.join(store_dir, STORE_TERMS_FILE), write_array(term_ids))
+    write_atomic(os.path.join(store_dir, STORE_TERM_OFFSETS_FILE), write_array(term_offsets))
+    write_atomic(os.path.join(store_dir, STORE_VOCAB_FILE), write_vocabulary)
+    # Manifest goes last: its presence marks the store as complete
+    write_atomic(os.path.join(store_dir, STORE_MANIFEST_FILE), write_manifest)
+
+    logger.info("Wrote %d embeddings (%d-dim, %s) to %s", matrix.shape[0], matrix.shape[1], matrix.dtype, store_dir)
+    return manifest
+
+
+class EmbeddingStore:
+    """
+    Read-only view over a compiled embedding store.
+
+    Vectors are opened with mmap_mode='r', so opening is O(1) and every uvicorn
+    worker shares the same page-cache pages instead of holding its own copy.
+    """
+
+    def __init__(self, store_dir: str = EMBEDDING_STORE_DIR):
+        # Resolved once, so files read later (metadata, sidecars) come from the
+        # same version even if a recompile swaps store_dir meanwhile
+        self.store_dir = os.path.realpath(store_dir)
+        with open(os.path.join(store_dir, STORE_MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(store_dir, STORE_VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(store_dir, STORE_IDS_FILE), "r", encoding="utf-8") as f:
+            self.chunk_ids = json.load(f)
+        self.row_of = {chunk_id: row for row, chunk_id in enumerate(self.chunk_ids)}
+        self._metadata = None
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.row_of
+
+    @property
+    def version(self) -> str:
+        """Content hash of the JSONL files this store was compiled from."""
+        return self.manifest["source_hash"]
+
+    @property
+    def metadata(self) -> List[Dict]:
+        """Row-aligned metadata, read from the sidecar on first access."""
+        if self._metadata is None:
+            with open(os.path.join(self.store_dir, STORE_METADATA_FILE), "r", encoding="utf-8") as f:
+                self._metadata = [json.loads(line) for line in f]
+        return self._metadata
+
+    def token_counts(self) -> Optional[np.ndarray]:
+        """
+        Memory-mapped (n_chunks, 2) text / context-header token counts, or None
+        when the store predates them or was built with a different tokenizer.
+        """
+        path = os.path.join(self.store_dir, STORE_TOKENS_FILE)
+        if self.manifest.get("tokenizer") != token_counter_name() or not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def attribution_terms(self) -> Optional[tuple]:
+        """
+        (vocabulary list, term ids, offsets) as written by build_term_sets, the
+        arrays memory-mapped; None when the store predates them.
+        """
+        paths = [os.path.join(self.store_dir, name) for name in (STORE_VOCAB_FILE, STORE_TERMS_FILE, STORE_TERM_OFFSETS_FILE)]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        with open(paths[0], "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        return vocabulary, np.load(paths[1], mmap_mode="r"), np.load(paths[2], mmap_mode="r")
+
+    def get(self, chunk_id: str, default=None):
+        """Return the embedding row (a read-only view) for chunk_id, or default."""
+        row = self.row_of.get(chunk_id)
+        if row is None:
+            return default
+        return self.vectors[row]
+
+    def chunks(self, rows=None) -> List[Dict]:
+        """
+        Materialize the store (or just `rows`) as chunk dicts in the JSONL shape
+        used by the pipeline. Embeddings are views into the memory map, not copies.
+        """
+        if rows is None:
+            rows = range(len(self.chunk_ids))
+        metadata = self.metadata
+        return [
+            {
+                "chunk_id": self.chunk_ids[row],
+                "metadata": {**metadata[row], "embedding": self.vectors[row]},
+                "embedding": self.vectors[row],
+            }
+            for row in rows
+        ]
+
+
+def _sources_unchanged(store: EmbeddingStore, file_paths: List[str]) -> bool:
+    """
+    True when file_paths hash to the store's version. Files whose size and
+    mtime match the manifest are not read at all; after a hash match the
+    manifest is restamped with the current stats so the next boot skips it.
+    """
+    stats = source_stats(file_paths)
+    if store.manifest.get("source_stats") == stats:
+        return True
+    if hash_files(file_paths) != store.version:
+        return False
+    manifest = {**store.manifest, "source_stats": stats}
+
+    def write_manifest(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    try:
+        write_atomic(os.path.join(store.store_dir, STORE_MANIFEST_FILE), write_manifest)
+        store.manifest = manifest
+    except OSError as e:
+        logger.debug("Could not restamp %s: %s", store.store_dir, e)
+    return True
+
+def load_embedding_store(store_dir: str = EMBEDDING_STORE_DIR, file_paths: Optional[List[str]] = None) -> EmbeddingStore:
+    """
+    Open the compiled embedding store, (re)compiling it from the JSONL files
+    when it is missing or their content hash no longer matches its manifest.
+    Sources whose size and mtime match the manifest are trusted without hashing.
+
+    Stores written by scripts/5.embed.py (manifest has an "embedder") are
+    checked against the raw chunk files instead. Rebuilding those needs the
+    embedding API, so a stale one is served with a warning.
+    """
+    if os.path.exists(os.path.join(store_dir, STORE_MANIFEST_FILE)):
+        store = EmbeddingStore(store_dir)
+        embedded_by_job = "embedder" in store.manifest
+        sources = RAW_CHUNK_FILES if embedded_by_job else (file_paths or DENSE_EMBEDDING_FILES + SPARSE_EMBEDDING_FILES)
+        existing = [p for p in sources if os.path.exists(p)]
+        # Deployments may ship only the compiled store; there is nothing to compare against then
+        if not existing or _sources_unchanged(store, existing):
+            return store
+        if embedded_by_job:
+            logger.warning("Embedding store in %s is older than the raw chunk files, rerun scripts/5.embed.py", store_dir)
+            return store
+        logger.info("Embedding store in %s is stale, recompiling", store_dir)
+    else:
+        logger.warning("No embedding store in %s, compiling from JSONL files", store_dir)
+    compile_embedding_store(file_paths, store_dir=store_dir)
+    return EmbeddingStore(store_dir)
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m services.data_loader [--float16]
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    compile_embedding_store(dtype="float16" if "--float16" in sys.argv[1:] else EMBEDDING_STORE_DTYPE)
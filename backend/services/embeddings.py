@@ -1,69 +1,185 @@
+import hashlib
+import logging
+import re
+
 import numpy as np
-from services.data_loader import load_all_embedding_chunks
 
-# Module-level cache for loaded embedding chunks
-_cached_embedding_chunks = None
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 768
 
 def get_embedding_chunks():
+    """The live corpus version's compiled (memory-mapped) EmbeddingStore."""
+    # Imported here: services.corpus depends on this module through vectorstore
+    from services.corpus import get_corpus
+    return get_corpus().embedding_store
+
+def get_chunk_embedding(chunk: dict):
     """
-    Lazily load and cache embedding chunks from the designated files.
-    Returns the cached list on subsequent calls.
+    Return a chunk's embedding from 'metadata' or the root key, or None.
+    Embeddings may be lists or numpy rows, so avoid truth-testing them.
     """
-    global _cached_embedding_chunks
-    if _cached_embedding_chunks is None:
-        _cached_embedding_chunks = load_all_embedding_chunks()
-    return _cached_embedding_chunks
+    embedding = chunk.get('metadata', {}).get('embedding')
+    if embedding is None:
+        embedding = chunk.get('embedding')
+    return embedding
+
+def stub_embed_query(query: str, dim: int = EMBEDDING_DIM) -> list:
+    """
+    Deterministic offline stand-in for the Google embedder (hashed bag of words).
+    Same query -> same vector, and queries sharing words land close together.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", query.lower()):
+        seed = int.from_bytes(hashlib.sha1(token.encode("utf-8")).digest()[:4], "little")
+        vec += np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).tolist()
 
 def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
     """Compute cosine similarity between two numpy arrays."""
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
-def deduplicate_by_embedding(chunks: list, threshold=0.9):
+def normalize_rows(vectors) -> np.ndarray:
+    """Return a float32 copy of `vectors` with unit-norm rows (zero rows stay zero)."""
+    matrix = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _greedy_dedup_exact(unit: np.ndarray, threshold: float, block_size: int) -> list:
+    """
+    Greedy first-wins dedup over unit-norm rows, processed in blocks.
+
+    Each block is compared against every row kept so far with one matrix
+    product; survivors are then resolved in order against the block's own
+    similarity matrix, so the result matches the row-by-row greedy scan.
+    """
+    n = len(unit)
+    kept_rows = []
+    kept = np.empty_like(unit)
+    n_kept = 0
+
+    for start in range(0, n, block_size):
+        block = unit[start:start + block_size]
+        if n_kept:
+            candidates = np.flatnonzero((block @ kept[:n_kept].T).max(axis=1) < threshold)
+        else:
+            candidates = np.arange(len(block))
+
+        within = block @ block.T
+        block_kept = []
+        for i in candidates:
+            if block_kept and within[i, block_kept].max() >= threshold:
+                continue
+            block_kept.append(i)
+
+        kept[n_kept:n_kept + len(block_kept)] = block[block_kept]
+        n_kept += len(block_kept)
+        kept_rows.extend(start + i for i in block_kept)
+
+    return kept_rows
+
+def _greedy_dedup_simhash(unit: np.ndarray, threshold: float, n_tables: int, n_bits: int, seed=0) -> list:
+    """
+    Approximate greedy dedup for large corpora using random-hyperplane LSH (SimHash).
+
+    A row is only compared with kept rows that share a bucket in at least one
+    of `n_tables` hash tables, so near-duplicates that land in different
+    buckets everywhere can slip through (recall < 1, but no false merges).
+    """
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((n_tables, unit.shape[1], n_bits)).astype(np.float32)
+    bit_weights = 1 << np.arange(n_bits)
+    # (n_rows, n_tables) bucket ids
+    signatures = np.stack([((unit @ planes[t]) > 0) @ bit_weights for t in range(n_tables)], axis=1)
+
+    tables = [dict() for _ in range(n_tables)]
+    kept_rows = []
+    for row in range(len(unit)):
+        neighbours = set()
+        for t in range(n_tables):
+            neighbours.update(tables[t].get(signatures[row, t], ()))
+        if neighbours and (unit[list(neighbours)] @ unit[row]).max() >= threshold:
+            continue
+        kept_rows.append(row)
+        for t in range(n_tables):
+            tables[t].setdefault(signatures[row, t], []).append(row)
+    return kept_rows
+
+def deduplicate_rows(vectors, threshold=0.9, method="exact", block_size=1024, n_tables=16, n_bits=12) -> list:
+    """
+    Greedy embedding dedup over a matrix: a row is kept unless its cosine similarity
+    to an earlier kept row is >= threshold.
+
+    Args:
+        vectors: (n, dim) array-like of embeddings.
+        threshold (float): Cosine similarity at or above which rows are duplicates.
+        method (str): 'exact' (blocked matrix products) or 'simhash' (LSH, approximate).
+        block_size (int): Rows per block for the exact method.
+        n_tables, n_bits: LSH parameters for the simhash method.
+
+    Returns:
+        list: Indices of kept rows, in input order.
+    """
+    if len(vectors) == 0:
+        return []
+    unit = normalize_rows(vectors)
+    if method == "exact":
+        return _greedy_dedup_exact(unit, threshold, block_size)
+    if method == "simhash":
+        return _greedy_dedup_simhash(unit, threshold, n_tables, n_bits)
+    raise ValueError(f"Unknown dedup method: {method}")
+
+def deduplicate_by_embedding(chunks: list, threshold=0.9, method="exact"):
     """
     Deduplicate chunks by comparing their precomputed embeddings.
 
     Args:
         chunks (list): List of chunk dicts, each with 'embedding' under 'metadata' or at root.
         threshold (float): Cosine similarity threshold above which chunks are considered duplicates.
+        method (str): 'exact' (same result as a greedy pairwise scan) or 'simhash' (approximate).
 
     Returns:
         list: Filtered list of deduplicated chunk dicts.
     """
-    filtered = []
-    embeddings = []
-    
-    print(f"Deduplicating {len(chunks)} chunks with threshold {threshold}")
+    logger.debug("Deduplicating %d chunks with threshold %s", len(chunks), threshold)
 
+    # Skip chunks without embedding to avoid runtime errors
+    with_emb, embeddings = [], []
     for chunk in chunks:
-        # Try to get embedding from 'metadata' or root key
-        embedding = chunk.get('metadata', {}).get('embedding') or chunk.get('embedding')
-        if embedding is None:
-            # Skip chunks without embedding to avoid runtime errors
-            continue
+        embedding = get_chunk_embedding(chunk)
+        if embedding is not None and len(embedding):
+            with_emb.append(chunk)
+            embeddings.append(embedding)
 
-        emb = np.array(embedding, dtype=np.float32)
-        if not embeddings:
-            filtered.append(chunk)
-            embeddings.append(emb)
-            continue
-
-        similarities = [cosine_similarity(emb, e) for e in embeddings]
-        if max(similarities) < threshold:
-            filtered.append(chunk)
-            embeddings.append(emb)
+    kept_rows = deduplicate_rows(embeddings, threshold=threshold, method=method)
+    return [with_emb[row] for row in kept_rows]
 
-    return filtered
+def deduplicate_candidates(candidates: list, store, threshold=0.9, method="exact") -> list:
+    """
+    Deduplicate ChunkStore candidate handles by their stored embeddings
+    (same semantics as deduplicate_by_embedding, without building chunk dicts).
+    """
+    rows, matrix = store.embedding_matrix([c.row for c in candidates])
+    with_emb = set(rows)
+    candidates = [c for c in candidates if c.row in with_emb]
+    kept_rows = deduplicate_rows(matrix, threshold=threshold, method=method)
+    return [candidates[i] for i in kept_rows]
 
-def load_and_deduplicate(threshold=0.9):
+def load_and_deduplicate(threshold=0.9, method="exact"):
     """
     Load all embedding chunks from designated files and deduplicate them lazily.
+    Works directly on the store's vector matrix; only kept chunks are materialized.
 
     Args:
         threshold (float): Cosine similarity threshold for deduplication.
+        method (str): 'exact' or 'simhash' (faster, approximate, for very large corpora).
 
     Returns:
         list: Deduplicated list of chunks.
     """
-    chunks = get_embedding_chunks()
-    deduped_chunks = deduplicate_by_embedding(chunks, threshold=threshold)
-    return deduped_chunks
+    store = get_embedding_chunks()
+    logger.info("Deduplicating %d stored chunks with threshold %s", len(store), threshold)
+    kept_rows = deduplicate_rows(store.vectors, threshold=threshold, method=method)
+    return store.chunks(kept_rows)
@@ -0,0 +1,104 @@
+import numpy as np
+
+# Result lists are passed as {source_name: [Candidate, ...]} in rank order,
+# where each Candidate's .score is that retriever's raw score (None if unknown).
+# Sources are "dense" and "sparse"; their rank/score land on the matching
+# Candidate slots (dense_rank, sparse_score, ...).
+
+
+def _raw_scores(results: list) -> np.ndarray:
+    """Retriever scores for a list, falling back to 1 / rank when a score is missing."""
+    return np.array([
+        c.score if c.score is not None else 1.0 / (rank + 1)
+        for rank, c in enumerate(results)
+    ], dtype=np.float64)
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+def reciprocal_rank_fusion(ranked_lists: dict, k: int = 60, weights: dict = None) -> dict:
+    """
+    Reciprocal rank fusion: fused(d) = sum_s w_s / (k + rank_s(d)), ranks from 1.
+
+    Returns:
+        dict: row -> fused score.
+    """
+    fused = {}
+    for source, results in ranked_lists.items():
+        weight = (weights or {}).get(source, 1.0)
+        for rank, c in enumerate(results, start=1):
+            fused[c.row] = fused.get(c.row, 0.0) + weight / (k + rank)
+    return fused
+
+def weighted_score_fusion(ranked_lists: dict, weights: dict = None) -> dict:
+    """
+    Weighted sum of per-source min-max normalized scores (a chunk missing from
+    a source contributes 0 for it).
+
+    Returns:
+        dict: row -> fused score.
+    """
+    fused = {}
+    for source, results in ranked_lists.items():
+        weight = (weights or {}).get(source, 1.0)
+        normalized = _min_max(_raw_scores(results))
+        for c, score in zip(results, normalized):
+            fused[c.row] = fused.get(c.row, 0.0) + weight * float(score)
+    return fused
+
+def fuse_results(ranked_lists: dict, url_of, method: str = "rrf", top_k: int = None, max_per_url: int = 2,
+                 rrf_k: int = 60, weights: dict = None) -> list:
+    """
+    Merge ranked candidate lists by ChunkStore row into one fused ranking.
+
+    The first list in which a row appears supplies its Candidate. Each fused
+    candidate gets fused_score (also copied to .score) plus <source>_rank /
+    <source>_score for every list it appeared in. At most `max_per_url`
+    candidates per URL are kept (0 or None = no cap).
+
+    Args:
+        ranked_lists (dict): {source_name: [Candidate, ...]} in rank order.
+        url_of (sequence): row -> URL (e.g. ChunkStore.url).
+        method (str): 'rrf' or 'weighted'.
+        top_k (int): Length of the fused list (None = everything).
+        max_per_url (int): Cap on candidates sharing a URL.
+        rrf_k (int): RRF damping constant.
+        weights (dict): Per-source weights.
+
+    Returns:
+        list: Fused Candidates, best first.
+    """
+    if method == "rrf":
+        fused = reciprocal_rank_fusion(ranked_lists, k=rrf_k, weights=weights)
+    elif method == "weighted":
+        fused = weighted_score_fusion(ranked_lists, weights=weights)
+    else:
+        raise ValueError(f"Unknown FUSION_METHOD: {method}")
+
+    candidates = {}
+    for source, results in ranked_lists.items():
+        raw = _raw_scores(results)
+        for rank, (c, score) in enumerate(zip(results, raw), start=1):
+            candidate = candidates.setdefault(c.row, c)
+            setattr(candidate, f'{source}_rank', rank)
+            setattr(candidate, f'{source}_score', float(score))
+
+    per_url = {}
+    ranked = []
+    for row in sorted(fused, key=fused.get, reverse=True):
+        url = url_of[row]
+        if max_per_url and url:
+            if per_url.get(url, 0) >= max_per_url:
+                continue
+            per_url[url] = per_url.get(url, 0) + 1
+        candidate = candidates[row]
+        candidate.fused_score = candidate.score = fused[row]
+        ranked.append(candidate)
+        if top_k and len(ranked) >= top_k:
+            break
+    return ranked
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from config import LLM_MODEL, LLM_TEMPERATURE, LLM_POOL_SIZE, LLM_MAX_CONCURRENCY_PER_KEY
+
+
+def create_llm_client(api_key: str):
+    """Build a Gemini chat client bound to one API key."""
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        google_api_key=api_key,
+        temperature=LLM_TEMPERATURE,
+        convert_system_message_to_human=True
+    )
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class SharedSlots:
+    """
+    Counting semaphore shared by threads and coroutines (on any event loop).
+
+    threading.Semaphore would block the event loop, and asyncio.Semaphore is
+    neither thread-safe nor visible to threads, so a pair of them would allow
+    the limit on each side. A release wakes one blocked thread and every
+    waiting coroutine; whoever takes the slot first gets it, the rest wait again.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._free = limit
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._waiters = []        # (loop, future) of waiting coroutines
+
+    def acquire(self):
+        with self._available:
+            while not self._free:
+                self._available.wait()
+            self._free -= 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._free:
+                    self._free -= 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._lock:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def release(self):
+        with self._lock:
+            if self._free >= self.limit:
+                raise ValueError("SharedSlots released too many times")
+            self._free += 1
+            self._available.notify()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class PooledLLMClient:
+    """
+    One LLM client (and its underlying HTTP/gRPC connections) for a single API key,
+    with a cap on how many calls may be in flight on it at once. Sync and async
+    calls draw from the same slots, so the cap holds across both.
+    """
+
+    def __init__(self, client, max_concurrency: int):
+        self.client = client
+        self._slots = SharedSlots(max_concurrency)
+
+    def invoke(self, messages):
+        with self._slots:
+            return self.client.invoke(messages)
+
+    async def ainvoke(self, messages):
+        async with self._slots:
+            return await self.client.ainvoke(messages)
+
+    async def astream(self, messages):
+        async with self._slots:
+            async for chunk in self.client.astream(messages):
+                yield chunk
+
+
+class LLMClientPool:
+    """
+    Bounded LRU of LLM clients keyed by API key.
+
+    Each request gets the client for its own key, so concurrent requests with
+    different keys never share mutable state, and repeat callers skip client
+    construction and TLS handshakes. Keys are only held as sha256 digests.
+    """
+
+    def __init__(self, factory=create_llm_client, max_clients=LLM_POOL_SIZE,
+                 max_concurrency=LLM_MAX_CONCURRENCY_PER_KEY):
+        self.factory = factory
+        self.max_clients = max_clients
+        self.max_concurrency = max_concurrency
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(api_key: str) -> str:
+        """Digest that identifies api_key's client (and its answers in the answer cache)."""
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def get(self, api_key: str) -> PooledLLMClient:
+        if not api_key:
+            raise ValueError("Missing api_key")
+        key = self.key(api_key)
+        with self._lock:
+            pooled = self._clients.get(key)
+            if pooled is not None:
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return pooled
+
+        # Build outside the lock; if two threads race, the first one stored wins
+        pooled = PooledLLMClient(self.factory(api_key), self.max_concurrency)
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                self.reused += 1
+                return existing
+            self._clients[key] = pooled
+            self.created += 1
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        return pooled
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._clients)
+        return {"size": size, "created": self.created, "reused": self.reused}
+
+
+llm_client_pool = LLMClientPool()
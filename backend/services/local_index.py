@@ -0,0 +1,140 @@
+import numpy as np
+
+# Indexes return (rows, scores): row positions into the vector matrix and their
+# cosine similarity to the query, best first.
+#
+# The matrix is the embedding store's memory map and is never copied whole:
+# every worker maps the same pages, and a float16 store is upcast to float32
+# one block at a time.
+
+BLOCK_ROWS = 16384
+
+
+def _top_k(scores: np.ndarray, top_k: int):
+    """Indices of the top_k highest scores (sorted), without a full argsort."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    return top[np.argsort(-scores[top])]
+
+def _row_blocks(vectors: np.ndarray, block_rows=BLOCK_ROWS):
+    """Yield (start, float32 block); blocks of a float32 matrix are views, not copies."""
+    for start in range(0, len(vectors), block_rows):
+        yield start, np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+
+def _inverse_norms(vectors: np.ndarray) -> np.ndarray:
+    inv_norms = np.empty(len(vectors), dtype=np.float32)
+    for start, block in _row_blocks(vectors):
+        norms = np.linalg.norm(block, axis=1)
+        norms[norms == 0] = 1.0
+        inv_norms[start:start + len(block)] = 1.0 / norms
+    return inv_norms
+
+def _normalize_query(query_emb) -> np.ndarray:
+    q = np.asarray(query_emb, dtype=np.float32)
+    norm = np.linalg.norm(q)
+    return q / norm if norm else q
+
+
+class ExactIndex:
+    """Brute-force cosine search: one matrix-vector product per query."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.inv_norms = _inverse_norms(vectors)
+
+    def search(self, query_emb, top_k=50):
+        q = _normalize_query(query_emb)
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start, block in _row_blocks(self.vectors):
+            scores[start:start + len(block)] = block @ q
+        scores *= self.inv_norms
+        rows = _top_k(scores, top_k)
+        return rows, scores[rows]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means centroid
+    and a query only scans the `nprobe` closest buckets.
+    """
+
+    def __init__(self, vectors: np.ndarray, nlist=None, nprobe=8, n_iter=10, seed=0, train_size=65536):
+        self.vectors = vectors
+        self.inv_norms = _inverse_norms(vectors)
+        n = len(vectors)
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+
+        # Spherical k-means for the coarse quantizer, trained on (a sample of) normalized rows
+        rng = np.random.default_rng(seed)
+        sample_rows = np.arange(n) if n <= train_size else np.sort(rng.choice(n, train_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32) * self.inv_norms[sample_rows, None]
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.centroids = centroids
+        # A row's norm doesn't change which centroid it is closest to
+        assignment = np.empty(n, dtype=np.int64)
+        for start, block in _row_blocks(vectors):
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(self.nlist)]
+
+    def search(self, query_emb, top_k=50):
+        q = _normalize_query(query_emb)
+        probe = _top_k(self.centroids @ q, self.nprobe)
+        rows = np.concatenate([self.lists[c] for c in probe])
+        scores = (np.asarray(self.vectors[rows], dtype=np.float32) @ q) * self.inv_norms[rows]
+        top = _top_k(scores, top_k)
+        return rows[top], scores[top]
+
+
+class HNSWIndex:
+    """Hierarchical navigable small-world graph index (requires `hnswlib`)."""
+
+    def __init__(self, vectors: np.ndarray, m=16, ef_construction=200, ef_search=64):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("LOCAL_INDEX_MODE=hnsw requires the 'hnswlib' package") from e
+
+        self.index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+        # hnswlib keeps its own float32 copy, so feed it blocks rather than a full upcast matrix
+        for start, block in _row_blocks(vectors):
+            self.index.add_items(block, np.arange(start, start + len(block)))
+        # Set once: queries run concurrently, and hnswlib already searches with max(ef, k)
+        self.index.set_ef(ef_search)
+        self.size = len(vectors)
+
+    def search(self, query_emb, top_k=50):
+        top_k = min(top_k, self.size)
+        labels, distances = self.index.knn_query(np.asarray(query_emb, dtype=np.float32), k=top_k)
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+
+def build_local_index(vectors: np.ndarray, mode="auto", exact_max=20000, **params):
+    """
+    Build a local dense index over `vectors`.
+
+    Args:
+        vectors (np.ndarray): (n, dim) embedding matrix.
+        mode (str): 'exact', 'ivf', 'hnsw', or 'auto' (exact up to `exact_max` vectors, IVF above).
+        exact_max (int): Corpus size at which 'auto' switches away from brute force.
+        **params: Passed to the index class (e.g. nlist/nprobe, m/ef_search).
+    """
+    if mode == "auto":
+        mode = "exact" if len(vectors) <= exact_max else "ivf"
+    if mode == "exact":
+        return ExactIndex(vectors)
+    if mode == "ivf":
+        return IVFIndex(vectors, **{k: v for k, v in params.items() if k in ("nlist", "nprobe")})
+    if mode == "hnsw":
+        return HNSWIndex(vectors, **{k: v for k, v in params.items() if k in ("m", "ef_construction", "ef_search")})
+    raise ValueError(f"Unknown LOCAL_INDEX_MODE: {mode}")
@@ -0,0 +1,166 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets (seconds) covering cache hits through slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 2500, 3000, 4000, 8000)
+
+
+def _format_labels(labelnames, values, extra=()) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally labelled (Prometheus 'counter')."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = f"{name}_total"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally labelled (Prometheus 'histogram')."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics plus "collectors": callables returning (name, kind, documentation,
+    {label_tuple: value}, labelnames) rows, read at scrape time (used to export
+    existing stats() dicts such as cache hit counters without double bookkeeping).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, kind, documentation, values, labelnames in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(values.items()):
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent in each RAG pipeline stage.", ["stage"]))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "rag_stage_errors", "RAG pipeline stages that raised or timed out.", ["stage"]))
+REQUESTS = REGISTRY.register(Counter(
+    "rag_requests", "RAG requests by endpoint and outcome.", ["endpoint", "outcome"]))
+CANDIDATES = REGISTRY.register(Histogram(
+    "rag_candidates", "Candidates left after each retrieval stage.", ["stage"], buckets=COUNT_BUCKETS))
+CONTEXT_TOKENS = REGISTRY.register(Histogram(
+    "rag_context_tokens", "Tokens packed into the LLM context.", buckets=TOKEN_BUCKETS))
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the wall time of the enclosed block under rag_stage_seconds{stage}."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def observe_candidates(stage: str, count: int):
+    CANDIDATES.observe(count, stage=stage)
+
+def stats_collector(prefix: str, documentation: str, stats_fn, counters=(), gauges=()):
+    """
+    Build a collector exporting selected keys of a stats() dict as
+    <prefix>_<key>_total counters and <prefix>_<key> gauges.
+    """
+    def collect():
+        stats = stats_fn()
+        rows = []
+        for key in counters:
+            rows.append((f"{prefix}_{key}_total", "counter", f"{documentation} ({key}).", {(): stats[key]}, ()))
+        for key in gauges:
+            rows.append((f"{prefix}_{key}", "gauge", f"{documentation} ({key}).", {(): stats[key]}, ()))
+        return rows
+    return collect
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,210 @@
+import logging
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from services.data_loader import write_atomic
+
+logger = logging.getLogger(__name__)
+
+_PUNCT_RE = re.compile(f"[{re.escape(string.punctuation)}]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str, strip_punctuation: bool = True) -> str:
+    """Lowercase, optionally strip punctuation, and collapse whitespace."""
+    query = query.lower()
+    if strip_punctuation:
+        query = _PUNCT_RE.sub(" ", query)
+    return _SPACE_RE.sub(" ", query).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings keyed on the normalized query.
+
+    - Concurrent misses for the same key share one in-flight computation.
+    - With `persist_path`, entries are saved to an .npz file (on a background
+      thread every `save_every` inserts, and on `save()` at shutdown) and reloaded
+      on startup, so warm entries survive restarts.
+    - `namespace` (e.g. the embedder name) is stored with the file; a file written
+      by a different embedder is ignored.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=86400, strip_punctuation=True,
+                 persist_path=None, namespace="default", save_every=50):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.strip_punctuation = strip_punctuation
+        self.persist_path = persist_path
+        self.namespace = namespace
+        self.save_every = save_every
+
+        self._entries = OrderedDict()   # key -> (expires_at, embedding)
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._save_lock = threading.Lock()   # one writer at a time
+        self._saver = None                   # background save thread
+
+        self.hits = 0
+        self.misses = 0
+        self.inflight_waits = 0
+        self.evictions = 0
+
+        if persist_path and os.path.exists(persist_path):
+            self.load()
+
+    def key(self, query: str) -> str:
+        return normalize_query(query, self.strip_punctuation)
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, embedding = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def _put_locked(self, key, embedding):
+        self._entries[key] = (time.time() + self.ttl_seconds, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._unsaved += 1
+
+    def get(self, query: str):
+        """Return the cached embedding for query, or None."""
+        with self._lock:
+            return self._get_locked(self.key(query))
+
+    def put(self, query: str, embedding):
+        with self._lock:
+            self._put_locked(self.key(query), embedding)
+
+    def get_or_compute(self, query: str, compute):
+        """
+        Return the cached embedding for query, calling compute(query) on a miss.
+        If another thread is already computing the same key, wait for its result.
+        """
+        key = self.key(query)
+        with self._lock:
+            embedding = self._get_locked(key)
+            if embedding is not None:
+                self.hits += 1
+                return embedding
+            future = self._inflight.get(key)
+            if future is not None:
+                self.inflight_waits += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            embedding = compute(query)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._put_locked(key, embedding)
+            should_save = bool(self.persist_path) and self._unsaved >= self.save_every
+        future.set_result(embedding)
+        if should_save:
+            self._save_in_background()
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "inflight_waits": self.inflight_waits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _save_in_background(self):
+        """Start a save off the request path, unless one is already running."""
+        with self._lock:
+            if self._saver is not None and self._saver.is_alive():
+                return
+            self._saver = threading.Thread(target=self.save, name="query-cache-save", daemon=True)
+            self._saver.start()
+
+    def save(self):
+        """Write unexpired entries to persist_path (atomically). Errors are logged, not raised."""
+        if not self.persist_path:
+            return
+        with self._save_lock:
+            now = time.time()
+            with self._lock:
+                items = [(k, exp, emb) for k, (exp, emb) in self._entries.items() if exp >= now]
+                self._unsaved = 0
+            if not items:
+                return
+            keys, expires, embeddings = zip(*items)
+
+            def write(tmp_path):
+                # A file object, so np.savez does not append ".npz" to the temp name
+                with open(tmp_path, "wb") as f:
+                    np.savez(
+                        f,
+                        namespace=np.array(self.namespace),
+                        keys=np.array(keys),
+                        expires_at=np.array(expires, dtype=np.float64),
+                        embeddings=np.asarray(embeddings, dtype=np.float32),
+                    )
+
+            try:
+                write_atomic(self.persist_path, write)
+            except Exception as e:
+                logger.warning("Could not save query cache %s: %s", self.persist_path, e)
+
+    def load(self):
+        """Load unexpired entries from persist_path, oldest first."""
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                if str(data["namespace"]) != self.namespace:
+                    logger.warning("Ignoring query cache %s: written by another embedder", self.persist_path)
+                    return
+                keys, expires, embeddings = data["keys"], data["expires_at"], data["embeddings"]
+        except Exception as e:
+            logger.warning("Could not load query cache %s: %s", self.persist_path, e)
+            return
+
+        now = time.time()
+        with self._lock:
+            for i in np.argsort(expires):
+                if expires[i] >= now:
+                    self._entries[str(keys[i])] = (float(expires[i]), embeddings[i].tolist())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logger.info("Loaded %d cached query embeddings from %s", len(self._entries), self.persist_path)
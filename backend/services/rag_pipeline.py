@@ -1,138 +1,144 @@
-from services.vectorstore import vector_search
-from services.embeddings import deduplicate_by_embedding
-from services.data_loader import load_all_embedding_chunks
-from sparse_search import SparseSearchIndex
-from langchain_google_genai import ChatGoogleGenerativeAI
+from services.vectorstore import dense_search, embed_query
+from services.answer_cache import SemanticAnswerCache
+from services.chunk_store import Candidate, context_header
+from services.context_packer import pack_context
+from services.attribution import get_source_attributor
+from services.corpus import get_corpus
+from services.embeddings import deduplicate_candidates
+from services.llm_pool import llm_client_pool
+from services.reranker import rerank_candidates
+from services.fusion import fuse_results
+from services.metrics import STAGE_ERRORS, STAGE_SECONDS, CONTEXT_TOKENS, timed, observe_candidates
 from langchain.schema import SystemMessage, HumanMessage
-import os
+import asyncio
+import logging
+import time
+
+from config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL_S,
+    EMBED_TIMEOUT_S,
+    DENSE_TIMEOUT_S,
+    SPARSE_TIMEOUT_S,
+    LLM_TIMEOUT_S,
+    LLM_MODEL,
+    LLM_TEMPERATURE,
+    CONTEXT_MAX_TOKENS,
+    RETRIEVE_TOP_K,
+    FUSION_METHOD,
+    RRF_K,
+    DENSE_WEIGHT,
+    SPARSE_WEIGHT,
+    MAX_CHUNKS_PER_URL,
+    RERANKER,
+)
+
+logger = logging.getLogger(__name__)
 
-RETRIEVE_TOP_K = 50
 RERANK_TOP_N = 20
-FINAL_MAX_TOKENS = 3000
+FINAL_MAX_TOKENS = CONTEXT_MAX_TOKENS
 DUPLICATE_SIM_THRESHOLD = 0.9
 
-# Load sparse index as before (sparse search uses raw chunks)
-sparse_index = SparseSearchIndex([
-    "data/changia_embedding_ready_raw_chunks.jsonl",
-    "data/jewel_embedding_ready_raw_chunks.jsonl"
-])
-
-# LLM initialization
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash-latest",
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.3,
-    convert_system_message_to_human=True
+class StageTimeoutError(Exception):
+    """A pipeline stage exceeded its time budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+# Paraphrase-tolerant cache of final answers (skips ask_llm on a hit)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_size=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_S,
 )
 
-# Module-level cached embedding lookup dictionaries
-_embedding_lookup = None
-
-def get_embedding_lookup():
-    global _embedding_lookup
-    if _embedding_lookup is None:
-        # Unpack dense and sparse embedding chunks from data loader
-        dense_chunks, sparse_chunks = load_all_embedding_chunks()
-        # Combine all chunks for a comprehensive lookup
-        all_chunks = dense_chunks + sparse_chunks
-        _embedding_lookup = {
-            c['chunk_id']: c.get('metadata', {}).get('embedding') or c.get('embedding')
-            for c in all_chunks
-            if (c.get('metadata', {}).get('embedding') or c.get('embedding')) is not None
-        }
-        print(f"[DEBUG] Loaded {_embedding_lookup.keys().__len__()} chunks into embedding lookup")
-    return _embedding_lookup
-
-def build_context(chunks: list) -> str:
+# The live corpus version (services.corpus) owns the ChunkStore: a columnar view
+# of every retrievable chunk with its sparse index attached. The pipeline passes
+# Candidate handles (row + scores) between stages and only reads text in build_context.
+def get_chunk_store():
+    return get_corpus().store
+
+def get_sparse_index():
+    return get_corpus().sparse_index
+
+def build_context(packed, store) -> str:
     context_parts = []
-    for c in chunks:
-        text = c['metadata']['text']
-        title = c['metadata'].get('title', '')
-        url = c['metadata'].get('url', '')
-        context_parts.append(f"{title} | Source: {url}\n{text}")
+    for c, text in zip(packed.candidates, packed.texts):
+        context_parts.append(context_header(store.title[c.row], store.url[c.row]) + text)
     return "\n\n".join(context_parts)
 
-def trim_to_token_limit(chunks, max_tokens=FINAL_MAX_TOKENS):
-    acc_tokens, selected = 0, []
-    for c in chunks:
-        token_count = len(c['metadata']['text'].split())
-        if acc_tokens + token_count > max_tokens:
-            break
-        selected.append(c)
-        acc_tokens += token_count
-    return selected
-
-def rerank(query: str, candidates: list, top_n=RERANK_TOP_N):
-    # Simple placeholder: just truncate
-    truncated = candidates[:top_n]
-    print(f"[DEBUG][rerank] {len(truncated)} candidates, embedding presence:")
-    for i, c in enumerate(truncated):
-        emb = c.get('metadata', {}).get('embedding') or c.get('embedding')
-        print(f"  candidate {i} embedding present? {'Yes' if emb else 'No'}")
-    return truncated
-
-def hybrid_retrieve(query: str, top_k=RETRIEVE_TOP_K):
-    dense_results = vector_search(query, top_k=top_k)
-    sparse_results = sparse_index.sparse_search(query, top_k=top_k)
-
-    print(f"[DEBUG][hybrid_retrieve] Dense results count: {len(dense_results)}")
-    dense_with_emb = sum(
-        1 for c in dense_results
-        if c.get('metadata', {}).get('embedding') or c.get('embedding')
-    )
-    print(f"[DEBUG][hybrid_retrieve] Dense chunks with embeddings: {dense_with_emb}")
+def rerank(query: str, candidates: list, store, top_n=RERANK_TOP_N, reranker=RERANKER):
+    """Rerank candidates with `reranker` (default: RERANKER) and keep the top_n."""
+    return rerank_candidates(query, candidates, store, top_n=top_n, name=reranker)
+
+def sparse_search(query: str, store, top_k=RETRIEVE_TOP_K) -> list:
+    """BM25 retrieval returning ChunkStore Candidate handles."""
+    with timed("sparse_search"):
+        docs, scores = store.sparse_index.search(query, top_k=top_k)
+        rows = store.sparse_rows[docs]
+        candidates = [Candidate(int(row), float(score)) for row, score in zip(rows, scores)]
+    observe_candidates("sparse", len(candidates))
+    return candidates
+
+def merge_retrieval_results(dense_results: list, sparse_results: list, store) -> list:
+    """
+    Fuse dense and sparse candidates by row (FUSION_METHOD: RRF or weighted scores),
+    keeping up to MAX_CHUNKS_PER_URL candidates per URL and each source's rank/score.
+    """
+    with timed("fusion"):
+        combined = fuse_results(
+            {"dense": dense_results, "sparse": sparse_results},
+            url_of=store.url,
+            method=FUSION_METHOD,
+            max_per_url=MAX_CHUNKS_PER_URL,
+            rrf_k=RRF_K,
+            weights={"dense": DENSE_WEIGHT, "sparse": SPARSE_WEIGHT},
+        )
+    observe_candidates("fused", len(combined))
+    logger.debug("Fused %d dense + %d sparse -> %d candidates", len(dense_results), len(sparse_results), len(combined))
+    return combined
 
-    print(f"[DEBUG][hybrid_retrieve] Sparse results count: {len(sparse_results)}")
-    sparse_with_emb = sum(
-        1 for c in sparse_results
-        if c.get('metadata', {}).get('embedding') or c.get('embedding')
+def hybrid_retrieve(query: str, store=None, top_k=RETRIEVE_TOP_K):
+    store = store or get_chunk_store()
+    dense_results = dense_search(query, store, top_k=top_k)
+    sparse_results = sparse_search(query, store, top_k=top_k)
+    return merge_retrieval_results(dense_results, sparse_results, store)
+
+async def _run_stage(stage: str, coro, timeout: float):
+    """Await coro, converting a timeout into StageTimeoutError(stage)."""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.inc(stage=stage)
+        raise StageTimeoutError(stage, timeout) from None
+
+async def hybrid_retrieve_async(query: str, store=None, top_k=RETRIEVE_TOP_K):
+    """
+    Run dense and sparse retrieval concurrently, each under its own timeout.
+    If one retriever fails or times out the other's results are still used.
+    """
+    store = store or get_chunk_store()
+    dense, sparse = await asyncio.gather(
+        _run_stage("dense_retrieval", asyncio.to_thread(dense_search, query, store, top_k), DENSE_TIMEOUT_S),
+        _run_stage("sparse_retrieval", asyncio.to_thread(sparse_search, query, store, top_k), SPARSE_TIMEOUT_S),
+        return_exceptions=True,
     )
-    print(f"[DEBUG][hybrid_retrieve] Sparse chunks with embeddings: {sparse_with_emb}")
-
-    # Convert sparse results to the expected chunk dict shape, without embeddings yet
-    sparse_candidates = [
-        {
-            'chunk_id': c.get('chunk_id', ''),
-            'metadata': {
-                'text': c.get('text', ''),
-                'chunk_id': c.get('chunk_id', ''),
-                'url': c.get('url', ''),
-                'section': c.get('section', ''),
-                'title': c.get('title', '')
-                # embeddings will be added next
-            }
-        }
-        for c in sparse_results
-    ]
-
-    # Enrich sparse candidates with embeddings from lookup
-    emb_lookup = get_embedding_lookup()
-    for c in sparse_candidates:
-        chunk_id = c['chunk_id']
-        embedding = emb_lookup.get(chunk_id)
-        if embedding:
-            c['metadata']['embedding'] = embedding
-            c['embedding'] = embedding  # also attach at root for safety
-
-    # Merge dense and enriched sparse candidates, deduplicate by URL on merge
-    seen_urls = set()
-    combined = []
-    for c in dense_results + sparse_candidates:
-        url = c['metadata'].get('url', '')
-        if url and url not in seen_urls:
-            combined.append(c)
-            seen_urls.add(url)
-
-    print(f"[DEBUG][hybrid_retrieve] Combined chunks count after dedup by URL: {len(combined)}")
-    combined_with_emb = sum(
-        1 for c in combined if c.get('metadata', {}).get('embedding') or c.get('embedding')
+    if isinstance(dense, BaseException) and isinstance(sparse, BaseException):
+        raise dense
+    for stage, result in (("dense", dense), ("sparse", sparse)):
+        if isinstance(result, BaseException):
+            logger.warning("%s retrieval failed, continuing without it: %r", stage, result)
+    return merge_retrieval_results(
+        [] if isinstance(dense, BaseException) else dense,
+        [] if isinstance(sparse, BaseException) else sparse,
+        store,
     )
-    print(f"[DEBUG][hybrid_retrieve] Combined chunks WITH embeddings: {combined_with_emb}")
-    print(f"[DEBUG][hybrid_retrieve] Combined chunks WITHOUT embeddings: {len(combined) - combined_with_emb}")
-
-    return combined
 
-def ask_llm(query: str, context: str) -> str:
+def build_messages(query: str, context: str) -> list:
     system_prompt = (
         "You are an expert assistant for Changi Airport and Jewel Changi Airport, "
         "tasked with providing the most accurate, concise, and helpful answers strictly based on the provided context. "
@@ -166,53 +172,211 @@ def ask_llm(query: str, context: str) -> str:
     )
 
 
-    messages = [
+    return [
         SystemMessage(content=system_prompt),
         HumanMessage(content=f"Question: {query}")
     ]
 
-    return llm.invoke(messages).content.strip()
+def ask_llm(query: str, context: str, api_key: str) -> str:
+    llm = llm_client_pool.get(api_key)
+    with timed("llm"):
+        return llm.invoke(build_messages(query, context)).content.strip()
+
+async def ask_llm_async(query: str, context: str, api_key: str) -> str:
+    llm = llm_client_pool.get(api_key)
+    with timed("llm"):
+        response = await llm.ainvoke(build_messages(query, context))
+    return response.content.strip()
+
+async def stream_llm(query: str, context: str, api_key: str, timeout: float = LLM_TIMEOUT_S):
+    """Yield answer text fragments as the LLM produces them, within an overall time budget."""
+    start = time.perf_counter()
+    deadline = start + timeout
+    first_token = True
+    llm = llm_client_pool.get(api_key)
+    stream = llm.astream(build_messages(query, context))
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise StageTimeoutError("llm", timeout)
+            try:
+                chunk = await _run_stage("llm", stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            if chunk.content:
+                if first_token:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_first_token")
+                    first_token = False
+                yield chunk.content
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm")
+        # Release the client's concurrency slot even when we stop early
+        await stream.aclose()
+
+def _cache_key(user_query: str, corpus, api_key: str, query_emb=None):
+    """
+    Return (query_emb, corpus_version, namespace) used to key the answer cache.
+    The namespace keeps answers apart per LLM model/temperature and API key
+    (as the LLM client pool keys it), so one caller never gets an answer
+    generated under another caller's key.
+    """
+    if query_emb is None:
+        query_emb = embed_query(user_query)
+    namespace = f"{LLM_MODEL}@{LLM_TEMPERATURE}:{llm_client_pool.key(api_key)}"
+    return query_emb, corpus.version, namespace
+
+def _cached_result(user_query: str, query_emb, corpus_version, namespace):
+    cached = answer_cache.lookup(query_emb, corpus_version=corpus_version, namespace=namespace)
+    if cached is None:
+        return None
+    logger.debug("Answer cache hit (similarity %.3f)", cached['similarity'])
+    return {
+        "question": user_query,
+        "answer": cached["answer"],
+        "sources": cached["sources"],
+        "source_details": cached["source_details"]
+    }
+
+def select_context_chunks(user_query: str, candidates: list, store, top_n=RERANK_TOP_N,
+                          dup_threshold=DUPLICATE_SIM_THRESHOLD, max_tokens=FINAL_MAX_TOKENS, reranker=RERANKER):
+    """Rerank, deduplicate and pack retrieval candidates into the LLM context budget."""
+    with timed("rerank"):
+        reranked = rerank(user_query, candidates, store, top_n=top_n, reranker=reranker)
+    observe_candidates("reranked", len(reranked))
+
+    with timed("dedup"):
+        filtered = deduplicate_candidates(reranked, store, threshold=dup_threshold)
+    observe_candidates("deduplicated", len(filtered))
+
+    with timed("pack_context"):
+        packed = pack_context(filtered, store, max_tokens=max_tokens)
+    observe_candidates("packed", len(packed))
+    CONTEXT_TOKENS.observe(packed.tokens_used)
+    logger.debug("Context: %d candidates -> %d reranked -> %d deduplicated -> %d packed "
+                 "(%d truncated, %d/%d tokens)", len(candidates), len(reranked), len(filtered),
+                 len(packed), packed.truncated, packed.tokens_used, packed.max_tokens)
+    return packed
+
+def prepare_context(packed, store) -> str:
+    context = build_context(packed, store)
+    logger.debug("Context length (chars): %d", len(context))
+    return context
+
+def attribute_sources(answer: str, candidates: list, store) -> list:
+    """Ranked [{'url', 'title', 'chunk_id', 'confidence'}] for the context chunks supporting the answer."""
+    with timed("attribution"):
+        return get_source_attributor(store).attribute(answer, candidates)
+
+def _finish(user_query: str, answer: str, packed, store, llm_seconds: float, cache_key) -> dict:
+    logger.debug("Answer from LLM (%.2fs, %d chars)", llm_seconds, len(answer))
+    source_details = attribute_sources(answer, packed.candidates, store)
+    sources = [s['url'] for s in source_details]
+
+    if cache_key is not None and answer:
+        query_emb, corpus_version, namespace = cache_key
+        answer_cache.store(query_emb, answer, sources, llm_seconds=llm_seconds, corpus_version=corpus_version,
+                           source_details=source_details, namespace=namespace)
+
+    return {
+        "question": user_query,
+        "answer": answer,
+        "sources": sources,
+        "source_details": source_details
+    }
 
 def rag_pipeline(user_query: str, api_key: str) -> dict:
     if not user_query or not api_key:
         raise ValueError("Missing user_query or api_key")
-    os.environ["GOOGLE_API_KEY"] = api_key
-    llm.google_api_key = api_key
 
-    candidates = hybrid_retrieve(user_query)
-    print(f"[DEBUG] Candidates count before rerank: {len(candidates)}")
+    # One corpus version for the whole request, even if a reload swaps it meanwhile
+    corpus = get_corpus()
+    store = corpus.store
 
-    reranked = rerank(user_query, candidates)
-    print(f"[DEBUG] Reranked count: {len(reranked)}")
+    cache_key = None
+    if ANSWER_CACHE_ENABLED:
+        cache_key = _cache_key(user_query, corpus, api_key)
+        cached = _cached_result(user_query, *cache_key)
+        if cached is not None:
+            return cached
 
-    filtered = deduplicate_by_embedding(reranked, threshold=DUPLICATE_SIM_THRESHOLD)
-    print(f"[DEBUG] Filtered (dedup) count: {len(filtered)}")
+    packed = select_context_chunks(user_query, hybrid_retrieve(user_query, store), store)
+    context = prepare_context(packed, store)
 
-    top_chunks = trim_to_token_limit(filtered, max_tokens=FINAL_MAX_TOKENS)
-    print(f"[DEBUG] Top chunks after token trim: {len(top_chunks)}")
-    if top_chunks:
-        print(f"[DEBUG] Sample top chunk metadata: {top_chunks[0].get('metadata')}")
+    llm_start = time.perf_counter()
+    answer = ask_llm(user_query, context, api_key)
+    llm_seconds = time.perf_counter() - llm_start
 
-    context = build_context(top_chunks)
-    print(f"[DEBUG] Context length (chars): {len(context)}")
-    if len(context) > 300:
-        print(f"[DEBUG] Context preview:\n{context[:300]}")
+    return _finish(user_query, answer, packed, store, llm_seconds, cache_key)
 
-    answer = ask_llm(user_query, context)
-    print(f"[DEBUG] Answer from LLM: {answer}")
-
-    sources, seen_urls = [], set()
-    answer_words = set(answer.lower().split())
+async def rag_pipeline_async(user_query: str, api_key: str) -> dict:
+    """
+    Async variant of rag_pipeline for the event loop: blocking retrieval calls
+    run in worker threads (dense and sparse concurrently), the LLM is called with
+    ainvoke, and every stage has a timeout (StageTimeoutError on expiry).
+    """
+    if not user_query or not api_key:
+        raise ValueError("Missing user_query or api_key")
 
-    for chunk in top_chunks:
-        url = chunk['metadata'].get('url', '')
-        chunk_words = set(chunk['metadata']['text'].lower().split())
-        if url and url not in seen_urls and answer_words & chunk_words:
-            sources.append(url)
-            seen_urls.add(url)
+    corpus = get_corpus()
+    store = corpus.store
+
+    cache_key = None
+    if ANSWER_CACHE_ENABLED:
+        query_emb = await _run_stage("embed_query", asyncio.to_thread(embed_query, user_query), EMBED_TIMEOUT_S)
+        cache_key = _cache_key(user_query, corpus, api_key, query_emb)
+        cached = _cached_result(user_query, *cache_key)
+        if cached is not None:
+            return cached
+
+    candidates = await hybrid_retrieve_async(user_query, store)
+    # Reranking may embed the query or run a model, so keep it off the event loop
+    packed = await asyncio.to_thread(select_context_chunks, user_query, candidates, store)
+    context = prepare_context(packed, store)
+
+    llm_start = time.perf_counter()
+    answer = await _run_stage("llm", ask_llm_async(user_query, context, api_key), LLM_TIMEOUT_S)
+    llm_seconds = time.perf_counter() - llm_start
+
+    return _finish(user_query, answer, packed, store, llm_seconds, cache_key)
+
+async def rag_pipeline_stream(user_query: str, api_key: str):
+    """
+    Streaming variant of rag_pipeline_async. Yields (event, data) pairs:
+    ("token", text) for each answer fragment, then ("sources", [urls]) and
+    ("done", {"question": ..., "answer": ..., "source_details": [...]}). A cached answer is sent as a single token.
+    """
+    if not user_query or not api_key:
+        raise ValueError("Missing user_query or api_key")
 
-    return {
-        "question": user_query,
-        "answer": answer,
-        "sources": sources[:2]
-    }
+    corpus = get_corpus()
+    store = corpus.store
+
+    cache_key = None
+    if ANSWER_CACHE_ENABLED:
+        query_emb = await _run_stage("embed_query", asyncio.to_thread(embed_query, user_query), EMBED_TIMEOUT_S)
+        cache_key = _cache_key(user_query, corpus, api_key, query_emb)
+        cached = _cached_result(user_query, *cache_key)
+        if cached is not None:
+            yield "token", cached["answer"]
+            yield "sources", cached["sources"]
+            yield "done", {"question": user_query, "answer": cached["answer"],
+                           "source_details": cached["source_details"]}
+            return
+
+    candidates = await hybrid_retrieve_async(user_query, store)
+    # Reranking may embed the query or run a model, so keep it off the event loop
+    packed = await asyncio.to_thread(select_context_chunks, user_query, candidates, store)
+    context = prepare_context(packed, store)
+
+    llm_start = time.perf_counter()
+    parts = []
+    async for text in stream_llm(user_query, context, api_key):
+        parts.append(text)
+        yield "token", text
+    llm_seconds = time.perf_counter() - llm_start
+
+    result = _finish(user_query, "".join(parts).strip(), packed, store, llm_seconds, cache_key)
+    yield "sources", result["sources"]
+    yield "done", {"question": user_query, "answer": result["answer"],
+                   "source_details": result["source_details"]}
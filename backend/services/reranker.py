@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    RERANKER,
+    RERANK_BUDGET_MS,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+    RERANK_FUSION_WEIGHT,
+    CROSS_ENCODER_MODEL,
+)
+from services.query_cache import normalize_query
+from services.vectorstore import embed_query
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceeded(Exception):
+    """The reranker ran past its latency budget."""
+
+
+def _check_deadline(deadline):
+    if deadline is not None and time.perf_counter() > deadline:
+        raise BudgetExceeded()
+
+
+class BiEncoderReranker:
+    """
+    Scores candidates by cosine similarity between the query embedding and the
+    chunk embeddings held in the ChunkStore. Only the query is encoded (and
+    that goes through the query-embedding cache). Rows without a stored
+    embedding score -inf; rerank_candidates ranks those by their fused score.
+    """
+
+    name = "bi"
+
+    def score(self, query: str, candidates: list, store, deadline=None) -> np.ndarray:
+        q = np.asarray(embed_query(query), dtype=np.float32)
+        _check_deadline(deadline)
+        q /= np.linalg.norm(q) or 1.0
+
+        scores = np.full(len(candidates), -np.inf, dtype=np.float32)
+        if len(q) != store.dim:
+            return scores
+        position = {c.row: i for i, c in enumerate(candidates)}
+        rows, matrix = store.embedding_matrix([c.row for c in candidates])
+        if rows:
+            rows = [position[row] for row in rows]
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1.0
+            scores[rows] = (matrix @ q) / norms
+        return scores
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk text) pairs with a sentence-transformers CrossEncoder.
+    The model is loaded on first use, pairs are scored in batches, and scores
+    are cached per (normalized query, chunk_id).
+    """
+
+    name = "cross"
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL, batch_size=RERANK_BATCH_SIZE, cache_size=RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def score(self, query: str, candidates: list, store, deadline=None) -> np.ndarray:
+        query_key = normalize_query(query)
+        scores = np.empty(len(candidates), dtype=np.float32)
+        pending = []
+        with self._cache_lock:
+            for i, c in enumerate(candidates):
+                key = (query_key, store.chunk_ids[c.row])
+                cached = self._cache.get(key)
+                if cached is None:
+                    pending.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+
+        model = self.model if pending else None
+        for start in range(0, len(pending), self.batch_size):
+            _check_deadline(deadline)
+            batch = pending[start:start + self.batch_size]
+            pairs = [(query, store.text[candidates[i].row]) for i in batch]
+            batch_scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._cache_lock:
+                for i, value in zip(batch, batch_scores):
+                    scores[i] = value
+                    self._cache[(query_key, store.chunk_ids[candidates[i].row])] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+
+_RERANKERS = {"bi": BiEncoderReranker, "cross": CrossEncoderReranker}
+_instances = {}
+
+def get_reranker(name: str = RERANKER):
+    """Return the (process-wide) reranker for `name`, or None for plain truncation."""
+    if name in ("none", "truncate"):
+        return None
+    if name not in _RERANKERS:
+        raise ValueError(f"Unknown RERANKER: {name}")
+    if name not in _instances:
+        _instances[name] = _RERANKERS[name]()
+    return _instances[name]
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    """Scale the finite entries of `scores` to [0, 1]; non-finite entries are left as they are."""
+    scaled = scores.astype(np.float64)
+    finite = np.isfinite(scaled)
+    if finite.any():
+        low, high = scaled[finite].min(), scaled[finite].max()
+        scaled[finite] = (scaled[finite] - low) / (high - low) if high > low else 1.0
+    return scaled
+
+def blend_scores(scores: np.ndarray, candidates: list, fusion_weight: float = RERANK_FUSION_WEIGHT) -> np.ndarray:
+    """
+    Mix reranker scores with the candidates' fused retrieval scores:
+    (1 - w) * reranker + w * fused, each min-max scaled over the candidate set.
+
+    Without this a bi-encoder rerank is just a dense cosine sort and throws
+    away the sparse half of the RRF/weighted fusion. A candidate the reranker
+    could not score (-inf, e.g. a sparse-only chunk with no stored embedding)
+    takes its scaled fused score in place of the reranker score instead of
+    sinking to the bottom. Candidates that never went through fusion
+    (fused_score is None) fall back to their retrieval score.
+    """
+    prior = _min_max(np.array([c.score if c.fused_score is None else c.fused_score for c in candidates],
+                              dtype=np.float64))
+    scaled = _min_max(scores)
+    missing = ~np.isfinite(scaled)
+    scaled[missing] = prior[missing]
+    if fusion_weight <= 0 or any(c.fused_score is None for c in candidates):
+        return scaled
+    return (1.0 - fusion_weight) * scaled + fusion_weight * prior
+
+def rerank_candidates(query: str, candidates: list, store, top_n: int, name: str = RERANKER,
+                      budget_ms: float = RERANK_BUDGET_MS, fusion_weight: float = RERANK_FUSION_WEIGHT) -> list:
+    """
+    Reorder Candidate handles by reranker score blended with their fused
+    retrieval score (see blend_scores) and keep the top_n, storing the raw
+    reranker score in .rerank_score and the blended one in .score. Falls back
+    to truncating the incoming order when the reranker is disabled, fails, or
+    exceeds `budget_ms`.
+    """
+    reranker = get_reranker(name)
+    if reranker is None or not candidates:
+        return candidates[:top_n]
+
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000 if budget_ms else None
+    try:
+        scores = reranker.score(query, candidates, store, deadline=deadline)
+    except BudgetExceeded:
+        logger.warning("%s reranker exceeded %sms budget, falling back to truncation", reranker.name, budget_ms)
+        return candidates[:top_n]
+    except Exception as e:
+        logger.warning("%s reranker failed, falling back to truncation: %r", reranker.name, e)
+        return candidates[:top_n]
+
+    blended = blend_scores(scores, candidates, fusion_weight)
+    # Stable sort keeps retrieval order among equal scores
+    order = np.argsort(-blended, kind="stable")[:top_n]
+    reranked = []
+    for i in order:
+        candidate = candidates[i]
+        candidate.rerank_score = float(scores[i])
+        candidate.score = float(blended[i])
+        reranked.append(candidate)
+    logger.debug("%s reranked %d -> %d in %.1fms", reranker.name, len(candidates), len(reranked),
+                 (time.perf_counter() - start) * 1000)
+    return reranked
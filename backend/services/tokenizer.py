@@ -0,0 +1,100 @@
+import logging
+import math
+import re
+import threading
+
+import numpy as np
+
+from config import TOKENIZER, TOKENIZER_MODEL
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def heuristic_count_tokens(text: str) -> int:
+    """
+    Offline estimate of Gemini's SentencePiece token count: about one token
+    per four characters of each word, plus one per punctuation mark.
+    """
+    words = sum(math.ceil(len(w) / 4) for w in WORD_RE.findall(text))
+    return words + len(PUNCT_RE.findall(text))
+
+
+class GeminiTokenCounter:
+    """Exact counts from the local (no network) Gemini tokenizer shipped with vertexai."""
+
+    def __init__(self, model_name=TOKENIZER_MODEL):
+        from vertexai.preview import tokenization
+        self._tokenizer = tokenization.get_tokenizer_for_model(model_name)
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._tokenizer.count_tokens(text).total_tokens
+
+
+_counter = None
+_counter_name = None
+_counter_lock = threading.Lock()
+
+def get_token_counter(name: str = TOKENIZER):
+    """Return (counter, resolved_name); 'auto' uses Gemini when vertexai is installed."""
+    global _counter, _counter_name
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                if name not in ("auto", "gemini", "heuristic"):
+                    raise ValueError(f"Unknown TOKENIZER: {name}")
+                counter, resolved = heuristic_count_tokens, "heuristic"
+                if name in ("auto", "gemini"):
+                    try:
+                        counter, resolved = GeminiTokenCounter(), "gemini"
+                    except Exception as e:
+                        if name == "gemini":
+                            raise
+                        logger.warning("Gemini tokenizer unavailable, using heuristic token counts: %r", e)
+                _counter, _counter_name = counter, resolved
+    return _counter, _counter_name
+
+def token_counter_name() -> str:
+    """Identifies the active counter; token counts persisted with a store are reused only under the same one."""
+    resolved = get_token_counter()[1]
+    return f"gemini:{TOKENIZER_MODEL}" if resolved == "gemini" else resolved
+
+def count_tokens(text: str) -> int:
+    return get_token_counter()[0](text)
+
+def count_tokens_batch(texts) -> np.ndarray:
+    counter = get_token_counter()[0]
+    return np.fromiter((counter(t) for t in texts), dtype=np.int32, count=len(texts))
+
+def split_sentences(text: str) -> list:
+    return [s for s in SENTENCE_RE.split(text) if s]
+
+def truncate_to_tokens(text: str, max_tokens: int):
+    """
+    Longest prefix of whole sentences that fits in max_tokens.
+
+    Returns:
+        tuple: (prefix_text, token_count); ('', 0) if not even the first sentence fits.
+    """
+    sentences = split_sentences(text)
+    kept, used = [], 0
+    for sentence in sentences:
+        # +1 for the joining whitespace; the final prefix is recounted exactly below
+        cost = count_tokens(sentence) + (1 if kept else 0)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+
+    while kept:
+        prefix = " ".join(kept)
+        tokens = count_tokens(prefix)
+        if tokens <= max_tokens:
+            return prefix, tokens
+        kept.pop()
+    return "", 0
@@ -1,60 +1,167 @@
-import os
-from dotenv import load_dotenv
-from pinecone import Pinecone
-import google.generativeai as genai
+import logging
+import threading
+import weakref
 
-# Load environment variables from .env file
-load_dotenv()
+import google.generativeai as genai
 
-# Google and Pinecone credentials
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not set in .env file")
+from config import (
+    GOOGLE_API_KEY,
+    PINECONE_API_KEY,
+    PINECONE_INDEX_NAME,
+    DENSE_BACKEND,
+    QUERY_EMBEDDER,
+    LOCAL_INDEX_MODE,
+    LOCAL_INDEX_EXACT_MAX,
+    IVF_NLIST,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL_S,
+    QUERY_CACHE_STRIP_PUNCT,
+    QUERY_CACHE_PATH,
+)
+from services.chunk_store import Candidate
+from services.embeddings import stub_embed_query
+from services.local_index import build_local_index
+from services.metrics import timed, observe_candidates
+from services.query_cache import QueryEmbeddingCache
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+logger = logging.getLogger(__name__)
 
-if not PINECONE_API_KEY or not PINECONE_INDEX_NAME:
-    raise ValueError("Missing PINECONE_API_KEY or PINECONE_INDEX_NAME in .env file.")
+if QUERY_EMBEDDER == "google":
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY not set in .env file")
+    # Configure Google Generative AI
+    genai.configure(api_key=GOOGLE_API_KEY)
+elif QUERY_EMBEDDER != "stub":
+    raise ValueError(f"Unknown QUERY_EMBEDDER: {QUERY_EMBEDDER}")
 
-# Configure Google Generative AI
-genai.configure(api_key=GOOGLE_API_KEY)
+def _embed_query_uncached(query: str) -> list:
+    """Embed user query using Google Generative AI embedding API (768-dim)."""
+    with timed("embed_query"):
+        if QUERY_EMBEDDER == "stub":
+            return stub_embed_query(query)
+        response = genai.embed_content(model="embedding-001", content=query)
+        return response['embedding']
 
-# Initialize Pinecone client and index
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
+query_embedding_cache = QueryEmbeddingCache(
+    max_size=QUERY_CACHE_SIZE,
+    ttl_seconds=QUERY_CACHE_TTL_S,
+    strip_punctuation=QUERY_CACHE_STRIP_PUNCT,
+    persist_path=QUERY_CACHE_PATH or None,
+    namespace=f"{QUERY_EMBEDDER}/embedding-001",
+)
 
 def embed_query(query: str) -> list:
-    """Embed user query using Google Generative AI embedding API (768-dim)."""
-    response = genai.embed_content(model="embedding-001", content=query)
-    return response['embedding']
+    """
+    Embed user query, served from the normalized-query cache when possible.
+    The returned list is shared with the cache and must not be mutated.
+    """
+    return query_embedding_cache.get_or_compute(query, _embed_query_uncached)
+
+
+class PineconeBackend:
+    """Dense retrieval against the hosted Pinecone index."""
+
+    def __init__(self):
+        if not PINECONE_API_KEY or not PINECONE_INDEX_NAME:
+            raise ValueError("Missing PINECONE_API_KEY or PINECONE_INDEX_NAME in .env file.")
+        from pinecone import Pinecone
+
+        # Initialize Pinecone client and index
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+        self.index = pc.Index(PINECONE_INDEX_NAME)
+
+    def search_candidates(self, query_emb: list, store, top_k=50) -> list:
+        """
+        Candidate handles for the matches; ids the ChunkStore hasn't seen are interned once.
+
+        Vectors are not requested (include_values=False): the embedding store
+        already holds them, and shipping top_k x dim floats per query only
+        adds payload and latency. Matches missing from the store have no
+        embedding, which the reranker handles.
+        """
+        results = self.index.query(vector=query_emb, top_k=top_k, include_metadata=True, include_values=False)
+        candidates = []
+        for match in results['matches']:
+            row = store.intern(match['id'], match.get('metadata', {}) or {})
+            candidates.append(Candidate(row, match.get('score')))
+        return candidates
 
-def vector_search(query: str, top_k=50):
-    query_emb = embed_query(query)
-    results = index.query(
-        vector=query_emb,
-        top_k=top_k,
-        include_metadata=True,
-        include_values=True  # <--- Add this line to get vectors returned!
-    )
-
-    chunks = []
-    for match in results['matches']:
-        metadata = match.get('metadata', {}) or {}
-        # Attach the vector returned by Pinecone as 'embedding' to metadata
-        metadata['embedding'] = match.get('values') or match.get('vector') or []
-        chunk = {
-            'chunk_id': match['id'],
-            'metadata': metadata,
-            'embedding': metadata['embedding'],
-        }
-        chunks.append(chunk)
-
-    # Debug print
-    print(f"[DEBUG] Pinecone returned {len(chunks)} chunks with embeddings attached.")
-    for i, chunk in enumerate(chunks[:len(chunks)+1]):
-        emb = chunk.get('embedding') or chunk.get('metadata', {}).get('embedding')
-        print(f" Chunk {i}: embedding present? {'Yes' if emb else 'No'}, length: {len(emb) if emb else 'N/A'}")
-
-    return chunks
 
+class LocalBackend:
+    """
+    In-process dense retrieval over a ChunkStore's stored embeddings (no network
+    round trip, vectors never leave the process). One per corpus version.
+    """
+
+    def __init__(self, store, mode=LOCAL_INDEX_MODE):
+        # No reference to store is kept: it keys _local_backends weakly
+        self.index = build_local_index(
+            store.vectors,
+            mode=mode,
+            exact_max=LOCAL_INDEX_EXACT_MAX,
+            nlist=IVF_NLIST,
+            nprobe=IVF_NPROBE,
+            m=HNSW_M,
+            ef_construction=HNSW_EF_CONSTRUCTION,
+            ef_search=HNSW_EF_SEARCH,
+        )
+
+    def search_candidates(self, query_emb: list, store, top_k=50) -> list:
+        """Candidate handles for the nearest rows (embedding store rows are ChunkStore rows)."""
+        rows, scores = self.index.search(query_emb, top_k=top_k)
+        return [Candidate(int(row), float(score)) for row, score in zip(rows, scores)]
+
+
+# Pinecone is shared by every corpus version; local indexes are built per ChunkStore
+# and dropped with it once no request references that version any more
+_pinecone_backend = None
+_local_backends = weakref.WeakKeyDictionary()
+_backend_lock = threading.Lock()
+
+def get_dense_backend(store):
+    """Dense backend serving `store`'s rows (built on first use for local indexes)."""
+    global _pinecone_backend
+    if DENSE_BACKEND not in ("pinecone", "local"):
+        raise ValueError(f"Unknown DENSE_BACKEND: {DENSE_BACKEND}")
+    if DENSE_BACKEND == "pinecone":
+        with _backend_lock:
+            if _pinecone_backend is None:
+                _pinecone_backend = PineconeBackend()
+            return _pinecone_backend
+
+    backend = _local_backends.get(store)
+    if backend is None:
+        # Built outside the lock so indexing a new version never stalls searches on the old one
+        built = LocalBackend(store)
+        with _backend_lock:
+            backend = _local_backends.setdefault(store, built)
+    return backend
+
+def vector_search(query: str, store=None, top_k=50):
+    """
+    Dense retrieval returning chunk dicts ({'chunk_id', 'metadata', 'embedding', 'score'}).
+
+    `store` is the ChunkStore to search (default: the live corpus). The older
+    vector_search(query, top_k) form is still accepted.
+    """
+    if isinstance(store, int):
+        store, top_k = None, store
+    if store is None:
+        # Imported here: services.corpus imports this module
+        from services.corpus import get_corpus
+        store = get_corpus().store
+    candidates = dense_search(query, store, top_k=top_k)
+    return [{**store.materialize(c.row), 'score': c.score} for c in candidates]
+
+def dense_search(query: str, store, top_k=50) -> list:
+    """Dense retrieval returning ChunkStore Candidate handles instead of chunk dicts."""
+    query_emb = embed_query(query)
+    with timed("dense_search"):
+        candidates = get_dense_backend(store).search_candidates(query_emb, store, top_k=top_k)
+    observe_candidates("dense", len(candidates))
+    logger.debug("%s returned %d candidates", DENSE_BACKEND, len(candidates))
+    return candidates
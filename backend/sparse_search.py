@@ -1,26 +1,238 @@
 import json
-import math
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import logging
+import os
+import re
+
+import numpy as np
+
+from config import RAW_CHUNK_FILES, SPARSE_INDEX_DIR, BM25_K1, BM25_B, BM25_DELTA
+from services.data_loader import hash_files, write_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+# Arrays persisted as individual .npy files (memory-mapped on load)
+INDEX_ARRAYS = ("offsets", "doc_ids", "term_freqs", "doc_lengths", "idf", "weights")
+
+# Same token pattern as sklearn's TfidfVectorizer default (lowercased words of 2+ chars)
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
 
 class SparseSearchIndex:
-    def __init__(self, file_paths):
-        self.chunks = []
-        for path in file_paths:
+    """
+    Inverted-index BM25 (or BM25+ with delta > 0) keyword search over raw chunks.
+
+    Postings are stored per term as contiguous (doc_ids, term_weights) arrays
+    where each weight already folds in IDF, k1/b saturation and doc-length
+    normalization, so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, file_paths=None, k1=1.5, b=0.75, delta=0.0, chunks=None):
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        self.chunks = list(chunks) if chunks is not None else []
+        for path in file_paths or []:
             with open(path, 'r', encoding='utf-8') as f:
                 for line in f:
-                    self.chunks.append(json.loads(line.strip()))
-        self.texts = [c['text'] for c in self.chunks]
-        self.vectorizer = TfidfVectorizer()
-        self.doc_vectors = self.vectorizer.fit_transform(self.texts)
+                    if line.strip():
+                        self.chunks.append(json.loads(line.strip()))
+        self._build([c['text'] for c in self.chunks])
+
+    def _build(self, texts):
+        n_docs = len(texts)
+        vocabulary = {}
+        doc_term_counts = []
+        doc_lengths = np.zeros(n_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            doc_lengths[doc_id] = len(tokens)
+            doc_term_counts.append(counts)
+            for token in counts:
+                vocabulary.setdefault(token, len(vocabulary))
+
+        postings_docs = [[] for _ in vocabulary]
+        postings_tfs = [[] for _ in vocabulary]
+        for doc_id, counts in enumerate(doc_term_counts):
+            for token, tf in counts.items():
+                term_id = vocabulary[token]
+                postings_docs[term_id].append(doc_id)
+                postings_tfs[term_id].append(tf)
+
+        self.vocabulary = vocabulary
+        self.doc_lengths = doc_lengths
+        # CSR-style layout: postings of term t live in [offsets[t], offsets[t + 1])
+        lengths = [len(p) for p in postings_docs]
+        self.offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.doc_ids = np.fromiter((d for p in postings_docs for d in p), dtype=np.int32, count=int(self.offsets[-1]))
+        self.term_freqs = np.fromiter((tf for p in postings_tfs for tf in p), dtype=np.float32, count=int(self.offsets[-1]))
+        self._compute_weights()
+
+    def _compute_weights(self):
+        """Precompute IDF and per-posting BM25 weights for the current k1/b/delta."""
+        n_docs = len(self.doc_lengths)
+        doc_freqs = np.diff(self.offsets).astype(np.float32)
+        # Lucene-style IDF, always positive
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        avg_len = float(self.doc_lengths.mean()) if n_docs else 0.0
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / (avg_len or 1.0))
+        tf = self.term_freqs
+        saturated = tf * (self.k1 + 1) / (tf + norms[self.doc_ids]) + self.delta
+        term_of_posting = np.repeat(np.arange(len(self.idf)), np.diff(self.offsets))
+        self.weights = (saturated * self.idf[term_of_posting]).astype(np.float32)
+
+    def set_params(self, k1=None, b=None, delta=None):
+        """Retune BM25 parameters without re-tokenizing the corpus."""
+        self.k1 = self.k1 if k1 is None else k1
+        self.b = self.b if b is None else b
+        self.delta = self.delta if delta is None else delta
+        self._compute_weights()
+
+    def score(self, query):
+        """Return (doc_ids, scores) for every document containing a query term."""
+        term_ids = {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary}
+        if not term_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def search(self, query, top_k=50):
+        """Return (doc_ids, scores) of the top_k documents, best first."""
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        docs, scores = self.score(query)
+        if len(docs) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return docs[top], scores[top]
 
     def sparse_search(self, query, top_k=50):
-        query_vector = self.vectorizer.transform([query])
-        scores = cosine_similarity(query_vector, self.doc_vectors).flatten()
-        top_indices = scores.argsort()[::-1][:top_k]
+        docs, scores = self.search(query, top_k=top_k)
         results = []
-        for i in top_indices:
-            chunk = self.chunks[i]
-            chunk['sparse_score'] = float(scores[i])
+        for doc, score in zip(docs, scores):
+            # Copy so concurrent requests never mutate the shared chunk dicts
+            chunk = dict(self.chunks[doc])
+            chunk['sparse_score'] = float(score)
             results.append(chunk)
         return results
+
+    def save(self, index_dir, source_hash=None):
+        """
+        Serialize the fitted index to `index_dir`: one .npy file per array (so
+        load() can memory-map them), the vocabulary, the chunks, and a manifest
+        stamped with the BM25 params and the source files' content hash.
+
+        Every file is written to a temp file and renamed into place: other
+        workers may have the old arrays memory-mapped, and truncating those in
+        place would corrupt their scores (or SIGBUS them).
+        """
+        os.makedirs(index_dir, exist_ok=True)
+
+        def write_array(name):
+            def write(tmp_path):
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, getattr(self, name))
+            return write
+
+        def write_terms(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(sorted(self.vocabulary, key=self.vocabulary.get), f, ensure_ascii=False)
+
+        def write_chunks(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for chunk in self.chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+
+        for name in INDEX_ARRAYS:
+            write_atomic(os.path.join(index_dir, f"{name}.npy"), write_array(name))
+        write_atomic(os.path.join(index_dir, "terms.json"), write_terms)
+        write_atomic(os.path.join(index_dir, "chunks.jsonl"), write_chunks)
+
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "delta": self.delta,
+            "n_docs": len(self.chunks),
+            "n_terms": len(self.vocabulary),
+            "source_hash": source_hash,
+        }
+        def write_manifest(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+
+        # Manifest goes last: its presence marks the artifact as complete
+        write_atomic(os.path.join(index_dir, MANIFEST_FILE), write_manifest)
+        return manifest
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        """Load an index written by save() without re-tokenizing the corpus."""
+        with open(os.path.join(index_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported sparse index format in {index_dir}: {manifest.get('format_version')}")
+
+        index = cls.__new__(cls)
+        index.manifest = manifest
+        index.k1, index.b, index.delta = manifest["k1"], manifest["b"], manifest["delta"]
+        for name in INDEX_ARRAYS:
+            setattr(index, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r" if mmap else None))
+        with open(os.path.join(index_dir, "terms.json"), 'r', encoding='utf-8') as f:
+            index.vocabulary = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(index_dir, "chunks.jsonl"), 'r', encoding='utf-8') as f:
+            index.chunks = [json.loads(line) for line in f]
+        return index
+
+
+def build_sparse_index(file_paths=RAW_CHUNK_FILES, index_dir=SPARSE_INDEX_DIR,
+                       k1=BM25_K1, b=BM25_B, delta=BM25_DELTA):
+    """Fit the BM25 index over the raw chunk files that exist and save it to index_dir."""
+    existing = [p for p in file_paths if os.path.exists(p)]
+    for missing in sorted(set(file_paths) - set(existing)):
+        logger.warning("Raw chunk file not found, skipping: %s", missing)
+    if not existing:
+        raise FileNotFoundError(f"None of the raw chunk files exist: {file_paths}")
+
+    index = SparseSearchIndex(existing, k1=k1, b=b, delta=delta)
+    index.manifest = index.save(index_dir, source_hash=hash_files(existing))
+    logger.info("Built sparse index over %d chunks (%d terms) in %s", len(index.chunks), len(index.vocabulary), index_dir)
+    return index
+
+def load_or_build_sparse_index(file_paths=RAW_CHUNK_FILES, index_dir=SPARSE_INDEX_DIR,
+                               k1=BM25_K1, b=BM25_B, delta=BM25_DELTA):
+    """
+    Load the persisted sparse index, refitting only when the source files'
+    content hash (or the BM25 params) no longer match its manifest.
+    """
+    existing = [p for p in file_paths if os.path.exists(p)]
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if existing and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        current = {"format_version": INDEX_FORMAT_VERSION, "k1": k1, "b": b, "delta": delta,
+                   "source_hash": hash_files(existing)}
+        if all(manifest.get(key) == value for key, value in current.items()):
+            return SparseSearchIndex.load(index_dir)
+        logger.info("Sparse index in %s is stale, rebuilding", index_dir)
+    return build_sparse_index(file_paths, index_dir, k1=k1, b=b, delta=delta)
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m sparse_search
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    build_sparse_index()
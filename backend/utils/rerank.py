@@ -1,7 +1,13 @@
 from sentence_transformers import SentenceTransformer, util
 
-# Load the same model used for embeddings
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Loaded on first use rather than at import time
+_model = None
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = SentenceTransformer("all-MiniLM-L6-v2")
+    return _model
 
 def rerank(query: str, chunks: list, top_n: int = 6) -> list:
     """
@@ -15,6 +21,7 @@ def rerank(query: str, chunks: list, top_n: int = 6) -> list:
     Returns:
         list: Re-ranked list of chunks.
     """
+    model = get_model()
     query_emb = model.encode(query, convert_to_tensor=True)
     chunk_texts = [chunk["text"] for chunk in chunks]
     chunk_embs = model.encode(chunk_texts, convert_to_tensor=True)
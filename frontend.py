@@ -1,5 +1,6 @@
 # streamlit_app.py
 import os
+import json
 import requests
 import streamlit as st
 from dotenv import load_dotenv
@@ -8,6 +9,7 @@ from dotenv import load_dotenv
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 API_ENDPOINT = os.getenv("BACKEND_API_URL", "http://localhost:8000/api/qa")
+STREAM_ENDPOINT = os.getenv("BACKEND_STREAM_URL", API_ENDPOINT.rstrip("/") + "/stream")
 
 st.set_page_config(page_title="🛫 Changi & Jewel Chatbot", layout="wide")
 st.title("🛫 Changi & Jewel Airport RAG Chatbot")
@@ -20,35 +22,62 @@ user_api_key = API_KEY
 user_query = st.text_input("💬 What would you like to know?")
 ask_button = st.button("Ask")
 
-# --- Query the RAG API ---
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def render_sources(sources):
+    if sources:
+        st.markdown("### 📎 Sources:")
+        for url in sources:
+            st.markdown(f"- [{url}]({url})")
+    else:
+        st.info("ℹ️ No sources provided.")
+
+# --- Query the RAG API (streamed token by token) ---
 if ask_button:
     if not user_query.strip():
         st.warning("❗ Please enter a question.")
     else:
-        with st.spinner("🤖 Generating answer..."):
-            try:
+        try:
+            with st.spinner("🤖 Generating answer..."):
                 res = requests.post(
-                    API_ENDPOINT,
+                    STREAM_ENDPOINT,
                     json={"user_query": user_query, "api_key": user_api_key},
-                    timeout=45
+                    stream=True,
+                    timeout=(10, 45)  # (connect, time between streamed bytes)
                 )
 
-                if res.status_code == 200:
-                    result = res.json()
-                    st.success("✅ Answer:")
-                    st.write(result.get("answer", "No answer returned."))
-
-                    sources = result.get("sources", [])
-                    if sources:
-                        st.markdown("### 📎 Sources:")
-                        for url in sources:
-                            st.markdown(f"- [{url}]({url})")
-                    else:
-                        st.info("ℹ️ No sources provided.")
-                else:
-                    st.error(f"❌ {res.status_code} - {res.text}")
-
-            except requests.exceptions.Timeout:
-                st.error("⏱️ Request timed out. Try again later.")
-            except Exception as e:
-                st.error(f"🚨 Unexpected error: {str(e)}")
+            if res.status_code == 200:
+                st.success("✅ Answer:")
+                answer_box = st.empty()
+                answer, sources = "", []
+                for event, data in iter_sse_events(res):
+                    if event == "token":
+                        answer += data
+                        answer_box.markdown(answer + "▌")
+                    elif event == "sources":
+                        sources = data
+                    elif event == "error":
+                        st.error(f"❌ {data.get('status')} - {data.get('detail')}")
+                        break
+                answer_box.markdown(answer or "No answer returned.")
+                render_sources(sources)
+            else:
+                st.error(f"❌ {res.status_code} - {res.text}")
+
+        except requests.exceptions.Timeout:
+            st.error("⏱️ Request timed out. Try again later.")
+        except Exception as e:
+            st.error(f"🚨 Unexpected error: {str(e)}")
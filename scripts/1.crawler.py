@@ -1,43 +1,282 @@
+"""
+Concurrent, resumable same-site crawler.
+
+Writes every URL that returned 200 to a text file (one per line), the input
+for 2.Filter.py. Pages are fetched by a thread pool with a per-host
+concurrency cap and minimum delay (robots.txt Crawl-delay wins if larger).
+The frontier is seeded from the start URL plus the site's sitemaps, URLs are
+canonicalized before they are enqueued, and progress is checkpointed so an
+interrupted crawl picks up where it stopped.
+
+Usage:
+    python 1.crawler.py [--start https://www.changiairport.com/] [--out changai_crawled_urls.txt]
+        [--workers 8] [--per-host 4] [--delay 0.5] [--max-pages 0] [--fresh]
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-import time
 
-base_url = "https://www.changiairport.com/"
-visited = set()
-to_visit = [base_url]
+USER_AGENT = "ChangiRAGCrawler/1.0 (+https://github.com/Arnav-Kumar1/Changi_chatbot)"
+SKIP_EXTS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.css', '.js', '.zip', '.xls', '.xlsx',
+             '.mp4', '.webp', '.ico', '.woff', '.woff2')
+TRACKING_PARAM_RE = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid)$", re.IGNORECASE)
+CHECKPOINT_EVERY = 25   # pages between checkpoint writes
+
+
+# ----- URL canonicalization (applied before anything is enqueued) ----- #
+def canonicalize_url(url, base=None):
+    """
+    Absolute, fragment-free URL with lowercased scheme/host, no default port,
+    no tracking parameters and sorted query parameters. Returns None for
+    non-http(s) and malformed links (bad IPv6 host, non-numeric port, ...).
+    """
+    try:
+        if base:
+            url = urljoin(base, url)
+        parsed = urlparse(url.strip())
+        port = parsed.port
+    except ValueError:
+        return None
+    scheme = parsed.scheme.lower()
+    if scheme not in ("http", "https"):
+        return None
+    host = (parsed.hostname or "").lower()
+    if not host:
+        return None
+    netloc = host if port is None or (scheme, port) in (("http", 80), ("https", 443)) else f"{host}:{port}"
+    path = re.sub(r"/{2,}", "/", parsed.path or "/")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                             if not TRACKING_PARAM_RE.match(k)))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+def is_crawlable(url, allowed_hosts):
+    parsed = urlparse(url)
+    return parsed.netloc in allowed_hosts and not parsed.path.lower().endswith(SKIP_EXTS)
+
+
+# ----- Per-host politeness ----- #
+class HostPoliteness:
+    """Caps concurrent requests per host and spaces request starts by at least `delay` seconds."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+        self._delays = {}
+
+    def set_delay(self, host, delay):
+        with self._lock:
+            self._delays[host] = max(self.delay, delay)
+
+    def acquire(self, host):
+        with self._lock:
+            slots = self._slots.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self._delays.get(host, self.delay)
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self._slots[host].release()
+
+
+_thread_local = threading.local()
+
+def get_session():
+    """One requests.Session (connection pool) per worker thread."""
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = requests.Session()
+        _thread_local.session.headers["User-Agent"] = USER_AGENT
+    return _thread_local.session
+
 
-# Open a text file to save visited URLs
-with open("changai_crawled_urls.txt", "w", encoding="utf-8") as file:
-    while to_visit:
-        url = to_visit.pop(0)
-        if url in visited:
-            continue
+# ----- robots.txt and sitemap seeding ----- #
+def load_robots(start_url):
+    parsed = urlparse(start_url)
+    robots = RobotFileParser(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+    try:
+        resp = get_session().get(robots.url, timeout=10)
+        robots.parse(resp.text.splitlines() if resp.status_code == 200 else [])
+    except requests.RequestException:
+        robots.parse([])
+    return robots
+
+def sitemap_urls(sitemap_url, limit=50000, _depth=0):
+    """<loc> entries of a sitemap, following sitemap indexes (up to 3 levels)."""
+    try:
+        resp = get_session().get(sitemap_url, timeout=15)
+        if resp.status_code != 200:
+            return []
+        root = ET.fromstring(resp.content)
+    except (requests.RequestException, ET.ParseError):
+        return []
+    locs = [el.text.strip() for el in root.iter() if el.tag.endswith("loc") and el.text]
+    if root.tag.endswith("sitemapindex"):
+        urls = []
+        for loc in locs:
+            if _depth < 3 and len(urls) < limit:
+                urls.extend(sitemap_urls(loc, limit - len(urls), _depth + 1))
+        return urls
+    return locs[:limit]
+
+
+# ----- Fetching (runs in worker threads) ----- #
+def fetch(url, politeness):
+    """Return (url, status, links); links are canonicalized against the final URL, malformed ones dropped."""
+    host = urlparse(url).netloc
+    politeness.acquire(host)
+    try:
+        resp = get_session().get(url, timeout=10)
+    except requests.RequestException:
+        return url, None, []
+    finally:
+        politeness.release(host)
+
+    if resp.status_code != 200 or "html" not in resp.headers.get("Content-Type", "text/html"):
+        return url, resp.status_code, []
+    soup = BeautifulSoup(resp.text, "html.parser")
+    links = [link for link in (canonicalize_url(a["href"], base=resp.url) for a in soup.find_all("a", href=True))
+             if link]
+    return url, resp.status_code, links
+
+
+# ----- Checkpointing ----- #
+def save_checkpoint(path, frontier, seen, pages_done):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"frontier": list(frontier), "seen": sorted(seen), "pages_done": pages_done}, f)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return deque(state["frontier"]), set(state["seen"]), state["pages_done"]
+
+def load_emitted(output_file):
+    """
+    URLs already written to the output. Pages fetched after the last checkpoint
+    are in the output but still queued in the checkpoint, so a resumed crawl
+    refetches them (for their links) without writing them twice. A torn final
+    line is truncated away.
+    """
+    if not os.path.exists(output_file):
+        return set()
+    with open(output_file, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    return set(data[:end].decode("utf-8").split())
+
+
+def crawl(start_url, output_file, checkpoint_file, workers=8, per_host=4, delay=0.5, max_pages=0, fresh=False):
+    start_url = canonicalize_url(start_url)
+    allowed_hosts = {urlparse(start_url).netloc}
+    robots = load_robots(start_url)
+    politeness = HostPoliteness(per_host, delay)
+    politeness.set_delay(urlparse(start_url).netloc, robots.crawl_delay(USER_AGENT) or 0)
+
+    def allowed(url):
+        return url and is_crawlable(url, allowed_hosts) and robots.can_fetch(USER_AGENT, url)
+
+    if not fresh and os.path.exists(checkpoint_file):
+        frontier, seen, _ = load_checkpoint(checkpoint_file)
+        emitted = load_emitted(output_file)
+        pages_done = len(emitted)
+        print(f"Resuming: {pages_done} pages done, {len(frontier)} queued")
+        mode = "a"
+    else:
+        frontier, seen, pages_done, emitted = deque(), set(), 0, set()
+        seeds = [start_url] + [u for sm in (robots.site_maps() or [urljoin(start_url, "/sitemap.xml")])
+                               for u in sitemap_urls(sm)]
+        for seed in seeds:
+            url = canonicalize_url(seed)
+            if allowed(url) and url not in seen:
+                seen.add(url)
+                frontier.append(url)
+        print(f"Seeded frontier with {len(frontier)} URLs")
+        mode = "w"
+
+    in_flight = {}
+    with open(output_file, mode, encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
         try:
-            response = requests.get(url, timeout=10)
-            if response.status_code != 200:
-                continue
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Write visited URL to the file
-            file.write(url + "\n")
-            file.flush()  # Ensure immediate write to disk
-
-            # Extract internal links on the page
-            for a_tag in soup.find_all("a", href=True):
-                href = a_tag['href']
-                full_url = urljoin(base_url, href)
-                parsed_url = urlparse(full_url)
-                if parsed_url.netloc == urlparse(base_url).netloc:
-                    if full_url not in visited and full_url not in to_visit:
-                        to_visit.append(full_url)
-
-            visited.add(url)
-
-            # Respectful crawling delay
-            time.sleep(1)
-        except Exception as e:
-            # Handle errors (network issues, timeouts, etc.) silently or log if needed
-            pass
-
-print(f"Crawling finished. URLs saved to 'changai_crawled_urls.txt'.")
+            while frontier or in_flight:
+                while frontier and len(in_flight) < workers * 2 and not (max_pages and pages_done + len(in_flight) >= max_pages):
+                    url = frontier.popleft()
+                    in_flight[pool.submit(fetch, url, politeness)] = url
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    try:
+                        url, status, links = future.result()
+                    except Exception as e:
+                        # Counted as done: retrying on resume would only fail the same way
+                        print(f"Failed to crawl {url}: {e!r}")
+                        continue
+                    if status != 200:
+                        continue
+                    new_page = url not in emitted
+                    if new_page:
+                        emitted.add(url)
+                        out.write(url + "\n")
+                        pages_done += 1
+                    for link in links:
+                        if link not in seen and allowed(link):
+                            seen.add(link)
+                            frontier.append(link)
+                    if new_page and pages_done % CHECKPOINT_EVERY == 0:
+                        out.flush()
+                        # Requeue in-flight URLs so a crash never loses them
+                        save_checkpoint(checkpoint_file, list(in_flight.values()) + list(frontier), seen, pages_done)
+                        print(f"Crawled {pages_done} pages, {len(frontier)} queued")
+        except KeyboardInterrupt:
+            print("Interrupted, saving checkpoint")
+            for future in in_flight:
+                future.cancel()
+            frontier.extendleft(reversed(list(in_flight.values())))
+            out.flush()
+            save_checkpoint(checkpoint_file, frontier, seen, pages_done)
+            raise
+
+    if frontier:
+        save_checkpoint(checkpoint_file, frontier, seen, pages_done)
+    elif os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return pages_done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", default="https://www.changiairport.com/")
+    parser.add_argument("--out", default="changai_crawled_urls.txt")
+    parser.add_argument("--checkpoint", help="defaults to <out>.checkpoint.json")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=4, help="max concurrent requests per host")
+    parser.add_argument("--delay", type=float, default=0.5, help="min seconds between request starts per host")
+    parser.add_argument("--max-pages", type=int, default=0, help="stop after this many pages (0 = no limit)")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    pages = crawl(args.start, args.out, args.checkpoint or args.out + ".checkpoint.json",
+                  workers=args.workers, per_host=args.per_host, delay=args.delay,
+                  max_pages=args.max_pages, fresh=args.fresh)
+    print(f"Crawling finished: {pages} pages. URLs saved to '{args.out}'.")
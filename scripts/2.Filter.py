@@ -1,11 +1,20 @@
+import argparse
+import hashlib
+import os
 import re
 import requests
+from concurrent.futures import Future, ProcessPoolExecutor
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import json
 import time
 
+# html.parser is the reference tree builder: lxml repairs malformed markup
+# differently ("&copy2024" becomes "©2024", CDATA is dropped, NUL becomes
+# U+FFFD), which would change records that were byte-identical before
+DEFAULT_PARSER = "html.parser"
+
 # ----- Step 0: URL Language Normalization ----- #
 def to_english_url(url):
     url = re.sub(r"/cn/zh/", "/en/", url)
@@ -68,74 +77,147 @@ headers = {
 }
 
 # ----- Refined HTML Cleanup (header/footer/nav tag removal) ----- #
+# One selector group = one tree walk instead of seven. Tags nested inside an
+# already-removed tag come back too; decomposing them again is a no-op.
+BOILERPLATE_SELECTOR = "header, footer, nav, .footer, .nav, #footer, #header"
+
 def clean_html_soup(soup):
-    for selector in ["header", "footer", "nav", ".footer", ".nav", "#footer", "#header"]:
-        for tag in soup.select(selector):
-            tag.decompose()
+    for tag in soup.select(BOILERPLATE_SELECTOR):
+        tag.decompose()
     return soup
 
 # ----- Improved Text Cleaning: Remove Common Navigation/Footer Phrases ----- #
-def remove_navigation_phrases(text):
-    common_phrases = [
-        "Changi Airport", "Flight Information", "Arrival Guide", "Departure Guide",
-        "Lounges", "Map", "Terminal Guides", "Transport & Directions",
-        "Special Assistance", "Facilities & Services", "Hotels", "Jewel Changi Airport",
-        "Plan Your Events", "Dine & Shop", "Dining", "Shopping", "Changi Pay", "Rewards",
-        "Shop Online", "Attractions", "Free Tours", "Events", "Promotions",
-        "Changi Rewards", "Benefits & Privileges", "Changi Monarch", "Help", "App & Help",
-        "Assistance", "Changi App", "Contact Information", "Download Changi App",
-        "Sign Up", "Corporate", "Careers", "Facebook", "Instagram", "LinkedIn",
-        "TikTok", "YouTube", "WeChat", "changiairport.com", "jewelchangiairport.com",
-        "Sign up for a Changi Account"
-    ]
+NAV_PHRASES = [
+    "Changi Airport", "Flight Information", "Arrival Guide", "Departure Guide",
+    "Lounges", "Map", "Terminal Guides", "Transport & Directions",
+    "Special Assistance", "Facilities & Services", "Hotels", "Jewel Changi Airport",
+    "Plan Your Events", "Dine & Shop", "Dining", "Shopping", "Changi Pay", "Rewards",
+    "Shop Online", "Attractions", "Free Tours", "Events", "Promotions",
+    "Changi Rewards", "Benefits & Privileges", "Changi Monarch", "Help", "App & Help",
+    "Assistance", "Changi App", "Contact Information", "Download Changi App",
+    "Sign Up", "Corporate", "Careers", "Facebook", "Instagram", "LinkedIn",
+    "TikTok", "YouTube", "WeChat", "changiairport.com", "jewelchangiairport.com",
+    "Sign up for a Changi Account"
+]
+
+def _phrase_trie_pattern(phrases):
+    """
+    One regex for all phrases, factored by common prefix ("changi (?:airport|app|pay|...)")
+    so a start position costs one branch per character rather than one per phrase.
+    Where phrases share a start, the longest one that fits is matched.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
 
+    return re.compile(build(trie))
+
+NAV_PHRASES_LOWER = sorted({phrase.lower() for phrase in NAV_PHRASES})
+NAV_PHRASE_RE = _phrase_trie_pattern(NAV_PHRASES_LOWER)
+# Every phrase starting where a match starts is a prefix of that (longest) match
+NAV_PHRASE_PREFIXES = {p: frozenset(q for q in NAV_PHRASES_LOWER if p.startswith(q)) for p in NAV_PHRASES_LOWER}
+
+def count_nav_phrases(line_lower, limit=2):
+    """
+    Number of distinct nav phrases occurring in the line, counting overlapping
+    ones ("changi airport" inside "jewel changi airport"), capped at `limit`.
+    """
+    found = set()
+    match = NAV_PHRASE_RE.search(line_lower)
+    while match:
+        found |= NAV_PHRASE_PREFIXES[match.group()]
+        if len(found) >= limit:
+            return limit
+        match = NAV_PHRASE_RE.search(line_lower, match.start() + 1)
+    return len(found)
+
+def remove_navigation_phrases(text):
     lines = text.split('\n')
     filtered_lines = []
     for line in lines:
         line_clean = line.strip()
         if not line_clean:
             continue
-        phrase_hits = sum(1 for phrase in common_phrases if phrase.lower() in line_clean.lower())
+        phrase_hits = count_nav_phrases(line_clean.lower())
         if phrase_hits >= 2 or (phrase_hits == 1 and len(line_clean) < 80):
             continue
         filtered_lines.append(line_clean)
     return '\n'.join(filtered_lines)
 
 # ----- Step 4: Robust Content Extraction with HTML Cleanup and Phrase Filtering ----- #
-def extract_content(url):
-    try:
-        resp = session.get(url, headers=headers, timeout=10)
-        if resp.status_code != 200:
-            reason = f"Non-200 status code {resp.status_code}"
-            print(f"{reason} for {url}")
-            return None, None, reason
+def extract_from_html(html, parser=DEFAULT_PARSER):
+    """
+    Return (title, text, skip_reason) for one fetched page.
+
+    CPU-bound and side-effect free, so it runs in worker processes. The
+    optional lxml tree builder is faster but repairs broken markup
+    differently from html.parser, so a few records can differ between the two.
+    """
+    soup = BeautifulSoup(html, parser)
+    soup = clean_html_soup(soup)
+
+    title = soup.title.text.strip() if soup.title else "No Title"
+    main_content = soup.find('main') or soup.body
+    if not main_content:
+        reason = "No main or body content found"
+        return title, None, reason
 
-        soup = BeautifulSoup(resp.text, "html.parser")
-        soup = clean_html_soup(soup)
+    text = main_content.get_text(separator="\n", strip=True)
+    text = '\n'.join([line.strip() for line in text.splitlines() if line.strip()])
+    text = remove_navigation_phrases(text)
 
-        title = soup.title.text.strip() if soup.title else "No Title"
-        main_content = soup.find('main') or soup.body
-        if not main_content:
-            reason = "No main or body content found"
-            return title, None, reason
+    word_count = len(text.split())
+    if word_count < 100:
+        reason = f"Content too short ({word_count} words)"
+        return title, None, reason
 
-        text = main_content.get_text(separator="\n", strip=True)
-        text = '\n'.join([line.strip() for line in text.splitlines() if line.strip()])
-        text = remove_navigation_phrases(text)
+    return title, text, None
 
-        word_count = len(text.split())
-        if word_count < 100:
-            reason = f"Content too short ({word_count} words)"
-            return title, None, reason
+def fetch_page(url, validators=None):
+    """
+    GET a page, sending If-None-Match / If-Modified-Since when we have validators.
 
-        return title, text, None
+    Returns:
+        tuple: (status_code, html, new_validators); status is None on network errors.
+    """
+    request_headers = dict(headers)
+    if validators:
+        if validators.get("etag"):
+            request_headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            request_headers["If-Modified-Since"] = validators["last_modified"]
+    resp = session.get(url, headers=request_headers, timeout=10)
+    new_validators = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+    return resp.status_code, resp.text if resp.status_code == 200 else None, new_validators
+
+def extract_content(url):
+    try:
+        status, html, _ = fetch_page(url)
+        if status != 200:
+            reason = f"Non-200 status code {status}"
+            print(f"{reason} for {url}")
+            return None, None, reason
+        return extract_from_html(html)
     except Exception as e:
         reason = f"Exception during fetch/parse: {str(e)}"
         print(f"{reason} for {url}")
         return None, None, reason
 
 # ----- Step 5: Process URLs and Incrementally Save Content (JSONL) ----- #
-def process_and_save_content(categorized_urls, output_file):
+def process_and_save_content(categorized_urls, output_file, delay=1.0):
     with open(output_file, 'w', encoding='utf-8') as f:
         for idx, (url, section) in enumerate(categorized_urls):
             title, content, skip_reason = extract_content(url)
@@ -152,18 +234,163 @@ def process_and_save_content(categorized_urls, output_file):
                 print(f"Skipping URL: {url} — Reason: {skip_reason}")
             if (idx + 1) % 20 == 0 or idx == len(categorized_urls) - 1:
                 print(f"Processed {idx + 1} / {len(categorized_urls)} pages")
-            time.sleep(1)
+            time.sleep(delay)
 
-# ----- MAIN SCRIPT EXECUTION (Example Usage) ----- #
-if __name__ == "__main__":
-    changia_urls = load_and_normalize_urls('changai_crawled_urls.txt')
-    jewel_changia_urls = load_and_normalize_urls('Jewel_changai_crawled_urls.txt')
+# ----- Step 5b: Incremental Re-ingestion (conditional GETs + content hashes) ----- #
+def record_hash(record):
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+def state_path_for(output_file):
+    return output_file + ".state.json"
+
+def delta_path_for(output_file):
+    root, ext = os.path.splitext(output_file)
+    return f"{root}_delta{ext}"
+
+def load_previous_records(output_file):
+    records = {}
+    if os.path.exists(output_file):
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["url"]] = record
+    return records
+
+def _write_jsonl_atomic(path, records):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
 
-    filtered_changia_urls = filter_urls(changia_urls)
-    filtered_jewel_urls = filter_urls(jewel_changia_urls)
+def submit_extraction(pool, html, parser=DEFAULT_PARSER):
+    """Queue extract_from_html on the process pool (or run it inline when pool is None)."""
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(extract_from_html(html, parser))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return pool.submit(extract_from_html, html, parser)
 
-    categorized_changia_urls = [(url, categorize_url(url)) for url in filtered_changia_urls]
-    categorized_jewel_urls = [(url, categorize_url(url)) for url in filtered_jewel_urls]
+def incremental_process_and_save_content(categorized_urls, output_file, delay=1.0, full=False,
+                                         workers=1, parser=DEFAULT_PARSER):
+    """
+    Re-ingest only what changed since the last run.
 
-    process_and_save_content(categorized_changia_urls, 'changia_content.jsonl')
-    process_and_save_content(categorized_jewel_urls, 'jewel_content.jsonl')
+    Per URL the state file keeps the ETag / Last-Modified validators and the
+    sha256 of the extracted record. Pages answering 304, or whose extracted
+    record hashes the same, are reused from the previous output. The full
+    output file is rewritten atomically (same format as process_and_save_content)
+    and `<output>_delta.jsonl` lists {"op": "added"|"changed"|"removed", ...}
+    so chunking/embedding can reprocess just the delta. With full=True no
+    conditional headers are sent, so every page is refetched and re-hashed.
+    HTML parsing runs on `workers` processes while fetching continues.
+
+    Returns:
+        dict: Counts per op plus "unchanged".
+    """
+    state_path = state_path_for(output_file)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    previous = load_previous_records(output_file)
+
+    # Fetching stays sequential (politeness); extraction is queued on the pool as
+    # pages arrive and results are collected in URL order, so output order and
+    # bytes do not depend on the number of workers.
+    pending = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for idx, (url, section) in enumerate(categorized_urls):
+            old = state.get(url, {})
+            old_record = previous.get(url)
+            try:
+                status, html, validators = fetch_page(url, old if old_record and not full else None)
+            except Exception as e:
+                # Transient failure: keep the previous version rather than reporting a removal
+                print(f"Exception during fetch for {url}: {e}")
+                status, html, validators = None, None, {}
+            extraction = submit_extraction(pool, html, parser) if status == 200 else None
+            pending.append((url, section, old, old_record, status, validators, extraction))
+            if (idx + 1) % 20 == 0 or idx == len(categorized_urls) - 1:
+                print(f"Fetched {idx + 1} / {len(categorized_urls)} pages")
+            if status is not None and delay:
+                time.sleep(delay)
+
+        records, delta, new_state = [], [], {}
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        for url, section, old, old_record, status, validators, extraction in pending:
+            if (status == 304 or status is None) and old_record:
+                records.append(old_record)
+                new_state[url] = old
+                counts["unchanged"] += 1
+            elif status == 200:
+                try:
+                    title, content, skip_reason = extraction.result()
+                except Exception as e:
+                    title, content, skip_reason = None, None, f"Exception during parse: {str(e)}"
+                if content:
+                    record = {"url": url, "section": section, "title": title, "text": content}
+                    digest = record_hash(record)
+                    records.append(record)
+                    new_state[url] = {**validators, "hash": digest}
+                    if old_record is None:
+                        delta.append({"op": "added", **record})
+                        counts["added"] += 1
+                    elif digest != old.get("hash"):
+                        delta.append({"op": "changed", **record})
+                        counts["changed"] += 1
+                    else:
+                        counts["unchanged"] += 1
+                else:
+                    print(f"Skipping URL: {url} — Reason: {skip_reason}")
+            else:
+                print(f"Skipping URL: {url} — Reason: Non-200 status code {status}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    kept = {r["url"] for r in records}
+    for url in previous:
+        if url not in kept:
+            delta.append({"op": "removed", "url": url})
+            counts["removed"] += 1
+
+    _write_jsonl_atomic(output_file, records)
+    _write_jsonl_atomic(delta_path_for(output_file), delta)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(new_state, f)
+    os.replace(tmp_path, state_path)
+    print(f"{output_file}: {counts}")
+    return counts
+
+def categorized_urls_from(url_file):
+    urls = filter_urls(load_and_normalize_urls(url_file))
+    return [(url, categorize_url(url)) for url in urls]
+
+# ----- MAIN SCRIPT EXECUTION (Example Usage) ----- #
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch crawled URLs and extract page content to JSONL.")
+    parser.add_argument("--full", action="store_true",
+                        help="refetch every page instead of sending conditional GETs")
+    parser.add_argument("--delay", type=float, default=1.0, help="seconds between requests")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for HTML extraction (1 = inline)")
+    parser.add_argument("--parser", choices=["html.parser", "lxml"], default=DEFAULT_PARSER,
+                        help="BeautifulSoup tree builder; lxml is faster but can differ from "
+                             "html.parser on malformed markup")
+    args = parser.parse_args()
+
+    datasets = [
+        ('changai_crawled_urls.txt', 'changia_content.jsonl'),
+        ('Jewel_changai_crawled_urls.txt', 'jewel_content.jsonl'),
+    ]
+    for url_file, output_file in datasets:
+        incremental_process_and_save_content(categorized_urls_from(url_file), output_file,
+                                             delay=args.delay, full=args.full,
+                                             workers=args.workers, parser=args.parser)
@@ -7,8 +7,9 @@ def clean_text(text):
     # cleaning function here (e.g., for removing accented chars, Chinese chars, unwanted symbols)
     text = unicodedata.normalize('NFKD', text)
     text = re.sub(r'[^\x00-\x7F]+', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+    # Whitespace is collapsed within lines; line breaks are kept (the chunker uses them for headings)
+    lines = (re.sub(r'\s+', ' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
 
 def sanitize_url(url: str) -> str:
     """
@@ -53,23 +54,31 @@ def should_exclude_url(url):
         return True
     return False
 
+def sanitize_record(record, min_words=50):
+    """
+    Apply the URL exclusion, URL encoding and text cleaning to one content record.
+
+    Returns:
+        tuple: (sanitized_record, None) or (None, reason) when the record is dropped.
+    """
+    url = record.get('url', '')
+    if should_exclude_url(url):
+        return None, "Excluded URL by pattern"
+    record = dict(record, url=sanitize_url(url), text=clean_text(record.get('text', '')))
+    if len(record['text'].split()) < min_words:  # optional minimum length filter
+        return None, "Excluded short content at URL"
+    return record, None
+
 def sanitize_content_file(input_path, output_path):
     filtered_count = 0
     total_count = 0
     with open(input_path, 'r', encoding='utf-8') as fin, open(output_path, 'w', encoding='utf-8') as fout:
         for line in fin:
             total_count += 1
-            record = json.loads(line)
-            url = record.get('url', '')
-            if should_exclude_url(url):
-                print(f"Excluded URL by pattern: {url}")
-                filtered_count += 1
-                continue
-            record['url'] = sanitize_url(url)
-            # Clean text here
-            record['text'] = clean_text(record.get('text', ''))
-            if len(record['text'].split()) < 50:  # optional minimum length filter
-                print(f"Excluded short content at URL: {url}")
+            raw = json.loads(line)
+            record, reason = sanitize_record(raw)
+            if record is None:
+                print(f"{reason}: {raw.get('url', '')}")
                 filtered_count += 1
                 continue
             fout.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -1,29 +1,207 @@
+"""
+Split sanitized page records into token-sized, overlapping chunks.
+
+A page is broken into units: heading lines, and sentences of the other lines.
+Units are packed greedily until the next one would exceed --max-tokens,
+counted with the backend's LLM tokenizer (services.tokenizer). Chunk
+boundaries prefer headings (short lines directly followed by body text):
+once a chunk is at least half full, a heading starts a new chunk, and up to
+half a chunk of trailing headings is carried into the next chunk rather than
+ending this one. Consecutive chunks
+within a section share up to --overlap-tokens of whole trailing sentences.
+Sentences longer than half a chunk are split on words, so a chunk is only cut
+short by a heading once it is half full, or at the end of a page.
+
+chunk_ids are `<url>_chunk-<hash>` where the hash is over the chunk text. An
+unchanged passage keeps its id (and its embedding, see 5.embed.py) when the
+page is re-chunked. Records are processed one line at a time.
+
+Usage:
+    python 4.chunk.py [--max-tokens 256] [--overlap-tokens 40]
+"""
+import argparse
+import hashlib
 import json
+import os
+import re
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.tokenizer import count_tokens, split_sentences
+
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_OVERLAP_TOKENS = 40
+HEADING_MAX_WORDS = 10
+# Two or more ALL-CAPS words ("OPENING HOURS"); pages sanitized before line
+# breaks were kept have their headings inline, so these also mark boundaries
+CAPS_RUN_RE = re.compile(r"\b[A-Z][A-Z0-9&'-]+(?:\s+[A-Z][A-Z0-9&'-]+)+\b")
+
+
+def is_heading(line):
+    """Short line without sentence-ending punctuation, e.g. 'Opening Hours' or 'LOCATION'."""
+    words = line.split()
+    return 0 < len(words) <= HEADING_MAX_WORDS and line[-1] not in ".!?,;:"
+
+def _split_word(word, max_tokens):
+    """Character windows of a single word too long for a chunk (e.g. a long URL)."""
+    size = max(1, len(word) * max_tokens // count_tokens(word))
+    while size > 1 and any(count_tokens(word[i:i + size]) > max_tokens for i in range(0, len(word), size)):
+        size = size * 3 // 4
+    return [word[i:i + size] for i in range(0, len(word), size)]
+
+def _split_long(sentence, max_tokens):
+    """Split an overlong sentence into word windows of at most max_tokens."""
+    pieces, words, used = [], [], 0
+    for word in sentence.split():
+        cost = count_tokens(word)
+        if cost > max_tokens:
+            if words:
+                pieces.append(" ".join(words))
+                words, used = [], 0
+            pieces.extend(_split_word(word, max_tokens))
+            continue
+        if words and used + cost > max_tokens:
+            pieces.append(" ".join(words))
+            words, used = [], 0
+        words.append(word)
+        used += cost
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+def split_units(text, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Every unit is at most max_tokens / 2. A heading or ALL-CAPS run longer than
+    that is not really a heading and is split into body units like a sentence;
+    so is one not directly followed by body text.
 
-def chunk_text(text, max_words=300):
-    words = text.split()
-    return [' '.join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+    Returns:
+        list: (unit_text, token_count, is_heading, line_no) in reading order.
+    """
+    unit_max = max(1, max_tokens // 2)
+    units = []
 
-def chunk_content_only(input_file, output_file, max_words=300):
+    def add(part, heading, line_no):
+        tokens = count_tokens(part)
+        if tokens <= unit_max:
+            units.append((part, tokens, heading, line_no))
+        else:
+            units.extend((piece, count_tokens(piece), False, line_no) for piece in _split_long(part, unit_max))
+
+    for line_no, line in enumerate(l.strip() for l in text.split("\n")):
+        if not line:
+            continue
+        if is_heading(line):
+            add(line, True, line_no)
+            continue
+        # Inline ALL-CAPS runs become their own heading units
+        parts, pos = [], 0
+        for match in CAPS_RUN_RE.finditer(line):
+            parts.append((line[pos:match.start()], False))
+            parts.append((match.group(), True))
+            pos = match.end()
+        parts.append((line[pos:], False))
+        for part, heading in parts:
+            part = part.strip()
+            if not part:
+                continue
+            if heading:
+                add(part, True, line_no)
+                continue
+            for sentence in split_sentences(part):
+                add(sentence, False, line_no)
+
+    # A heading introduces body text. Short lines followed by another short line
+    # (store lists, opening hours, "Level 5", "#02-21") are body text themselves.
+    for i, (part, tokens, heading, line_no) in enumerate(units):
+        if heading and (i + 1 == len(units) or units[i + 1][2]):
+            units[i] = (part, tokens, False, line_no)
+    return units
+
+def _join(units):
+    """Units on the same source line are joined with spaces, lines with newlines."""
+    out = []
+    for i, (text, _, _, line_no) in enumerate(units):
+        if i:
+            out.append(" " if units[i - 1][3] == line_no else "\n")
+        out.append(text)
+    return "".join(out)
+
+def chunk_text(text, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    units = split_units(text, max_tokens)
+    chunks = []
+    current, used = [], 0
+
+    for unit in units:
+        _, tokens, heading, _ = unit
+        full = used + tokens > max_tokens
+        if current and (full or (heading and used >= max_tokens / 2)):
+            # Never end a chunk on a heading: carry trailing headings forward,
+            # as long as they leave room for the unit that follows them
+            carried, carried_used = [], 0
+            while current and current[-1][2] and carried_used + current[-1][1] <= max_tokens / 2:
+                carried_used += current[-1][1]
+                carried.insert(0, current.pop())
+            if current:
+                chunks.append(_join(current))
+            # Overlap only within a section, and only if it still fits
+            overlap, overlap_used = [], 0
+            if not heading and not carried:
+                for prev in reversed(current):
+                    if prev[2] or overlap_used + prev[1] > overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_used += prev[1]
+                if overlap_used + tokens > max_tokens:
+                    overlap, overlap_used = [], 0
+            current = overlap + carried
+            used = sum(u[1] for u in current)
+        current.append(unit)
+        used += tokens
+
+    if current:
+        chunks.append(_join(current))
+    return chunks
+
+def chunk_id_for(url, text, seen):
+    """Content-hash id; repeated identical text on one page gets a -2, -3, ... suffix."""
+    chunk_id = f"{url}_chunk-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+    seen[chunk_id] = seen.get(chunk_id, 0) + 1
+    return chunk_id if seen[chunk_id] == 1 else f"{chunk_id}-{seen[chunk_id]}"
+
+def chunk_record(record, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+    """Split one sanitized content record into chunk records (text kept verbatim)."""
+    seen = {}
+    return [
+        {
+            "chunk_id": chunk_id_for(record['url'], chunk, seen),
+            "url": record['url'],
+            "section": record.get('section', ''),
+            "title": record.get('title', ''),
+            "text": chunk
+        }
+        for chunk in chunk_text(record['text'], max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    ]
+
+def chunk_content_only(input_file, output_file, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
     chunk_count = 0
     with open(input_file, 'r', encoding='utf-8') as fin, open(output_file, 'w', encoding='utf-8') as fout:
         for line in fin:
-            record = json.loads(line)
-            chunks = chunk_text(record['text'], max_words=max_words)
-            for i, chunk in enumerate(chunks):
-                # No cleaning/sanitization here, just chunk and save verbatim
-                chunk_record = {
-                    "chunk_id": f"{record['url']}_chunk{i}",
-                    "url": record['url'],
-                    "section": record.get('section', ''),
-                    "title": record.get('title', ''),
-                    "text": chunk
-                }
-                fout.write(json.dumps(chunk_record, ensure_ascii=False) + '\n')
+            # No cleaning/sanitization here, just chunk and save verbatim
+            for chunk in chunk_record(json.loads(line), max_tokens=max_tokens, overlap_tokens=overlap_tokens):
+                fout.write(json.dumps(chunk, ensure_ascii=False) + '\n')
                 chunk_count += 1
     print(f"Total chunks prepared and saved (no cleaning): {chunk_count}")
 
 if __name__ == "__main__":
-    # Change filenames and chunk size as needed
-    chunk_content_only('changia_content_sanitized.jsonl', 'changia_embedding_ready_raw_chunks.jsonl', max_words=300)
-    chunk_content_only('jewel_content_sanitized.jsonl', 'jewel_embedding_ready_raw_chunks.jsonl', max_words=300)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    chunk_content_only('changia_content_sanitized.jsonl', 'changia_embedding_ready_raw_chunks.jsonl',
+                       max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    chunk_content_only('jewel_content_sanitized.jsonl', 'jewel_embedding_ready_raw_chunks.jsonl',
+                       max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
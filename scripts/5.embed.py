@@ -0,0 +1,203 @@
+"""
+Embed chunk files into the backend's binary embedding store.
+
+Reads the *_embedding_ready_raw_chunks.jsonl files and embeds only chunks
+whose text has no vector yet. Vectors are keyed by sha256(embedder + text), so
+existing ones are reused from the current store no matter which chunk_id they
+now sit under. New texts are sent in batches through a token-bucket rate
+limiter, failed batches are retried with exponential backoff, and each
+finished batch is appended to a checkpoint file. An interrupted or
+quota-limited run therefore resumes without paying for the same texts twice.
+The store (embeddings.npy, chunk_ids.json, metadata.jsonl, manifest.json and
+the token-count / attribution-term sidecars) is written at the end via
+services.data_loader, and the checkpoint is removed.
+
+Usage:
+    python 5.embed.py [raw_chunk_files ...] [--store-dir ../backend/data/embedding_store]
+        [--embedder google|stub] [--batch-size 32] [--rpm 60] [--retries 5]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, "..", "backend"))
+# Backend config resolves its data paths at import time
+os.environ.setdefault("DATA_DIR", os.path.join(BACKEND_DIR, "data"))
+sys.path.insert(0, BACKEND_DIR)
+
+from config import RAW_CHUNK_FILES, EMBEDDING_STORE_DIR, EMBEDDING_STORE_DTYPE
+from services.data_loader import EmbeddingStore, hash_files, source_stats, write_embedding_store, STORE_MANIFEST_FILE
+from ingest_pipeline import EMBEDDERS
+
+# Stores compiled from the hand-made Google_*_embs.jsonl files carry no embedder field
+DEFAULT_STORE_EMBEDDER = "google/embedding-001"
+CHECKPOINT_FILE = "embed_checkpoint.jsonl"
+
+
+def text_key(embedder_name, text):
+    return hashlib.sha256(f"{embedder_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+# ----- Rate limiting and retries ----- #
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+def embed_with_retry(embedder, texts, bucket=None, retries=5, base_delay=1.0, max_delay=60.0):
+    """
+    Call the embedder, retrying failures with exponential backoff and full jitter.
+    Every attempt, retries included, takes a token from `bucket`.
+
+    Returns:
+        tuple: (vectors, attempts_used)
+    """
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            vectors = embedder(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedder returned {len(vectors)} vectors for {len(texts)} texts")
+            return vectors, attempt + 1
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"Embedding batch failed ({e!r}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+# ----- Inputs, known vectors and checkpoint ----- #
+def load_chunks(file_paths):
+    """Chunk records from the raw chunk files; the first occurrence of a chunk_id wins."""
+    chunks, seen = [], set()
+    for path in file_paths:
+        if not os.path.exists(path):
+            print(f"Raw chunk file not found, skipping: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["chunk_id"] not in seen:
+                    seen.add(record["chunk_id"])
+                    chunks.append(record)
+    return chunks
+
+def load_store_vectors(store_dir, embedder_name):
+    """{text_key: vector} for the existing store, if it was built with the same embedder."""
+    if not os.path.exists(os.path.join(store_dir, STORE_MANIFEST_FILE)):
+        return {}
+    store = EmbeddingStore(store_dir)
+    if store.manifest.get("embedder", DEFAULT_STORE_EMBEDDER) != embedder_name:
+        print(f"Existing store was embedded with {store.manifest.get('embedder', DEFAULT_STORE_EMBEDDER)}, "
+              f"not {embedder_name}; re-embedding everything")
+        return {}
+    return {text_key(embedder_name, meta.get("text", "")): np.array(store.vectors[row], dtype=np.float32)
+            for row, meta in enumerate(store.metadata)}
+
+def load_checkpoint(path):
+    """Vectors from a previous run; a torn final line (interrupted write) is truncated away."""
+    vectors = {}
+    if os.path.exists(path):
+        with open(path, 'rb+') as f:
+            good = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                vectors[entry["key"]] = np.asarray(entry["embedding"], dtype=np.float32)
+                good += len(line)
+            f.truncate(good)
+    return vectors
+
+
+def embed_chunks(file_paths, store_dir, embedder, batch_size=32, rpm=60, retries=5, dtype=EMBEDDING_STORE_DTYPE):
+    chunks = load_chunks(file_paths)
+    if not chunks:
+        raise FileNotFoundError(f"No chunks found in {file_paths}")
+    keys = [text_key(embedder.name, chunk["text"]) for chunk in chunks]
+
+    checkpoint_path = os.path.join(store_dir, CHECKPOINT_FILE)
+    known = load_store_vectors(store_dir, embedder.name)
+    reused = sum(1 for key in set(keys) if key in known)
+    known.update(load_checkpoint(checkpoint_path))
+    resumed = sum(1 for key in set(keys) if key in known) - reused
+
+    # Identical texts are embedded once
+    todo = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in known:
+            todo.setdefault(key, chunk["text"])
+    todo = list(todo.items())
+    print(f"{len(chunks)} chunks: {reused} reused from store, {resumed} from checkpoint, {len(todo)} to embed")
+
+    os.makedirs(store_dir, exist_ok=True)
+    bucket = TokenBucket(rate=rpm / 60.0)
+    calls = 0
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            vectors, attempts = embed_with_retry(embedder, [text for _, text in batch], bucket=bucket, retries=retries)
+            calls += attempts
+            for (key, _), vector in zip(batch, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                known[key] = vector
+                checkpoint.write(json.dumps({"key": key, "embedding": vector.tolist()}) + '\n')
+            checkpoint.flush()
+            done = min(start + batch_size, len(todo))
+            print(f"Embedded {done} / {len(todo)} texts")
+
+    matrix = np.vstack([known[key] for key in keys]).astype(dtype)
+    existing = [p for p in file_paths if os.path.exists(p)]
+    manifest = write_embedding_store(
+        [chunk["chunk_id"] for chunk in chunks], chunks, matrix, store_dir,
+        {"source_files": [os.path.basename(p) for p in existing], "source_hash": hash_files(existing),
+         "source_stats": source_stats(existing), "embedder": embedder.name},
+    )
+    os.remove(checkpoint_path)
+    print(f"Wrote {matrix.shape[0]} x {matrix.shape[1]} store to {store_dir} ({calls} embedding calls)")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=RAW_CHUNK_FILES, help="raw chunk JSONL files")
+    parser.add_argument("--store-dir", default=EMBEDDING_STORE_DIR)
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default="google")
+    parser.add_argument("--batch-size", type=int, default=32, help="texts per embedding request")
+    parser.add_argument("--rpm", type=float, default=60, help="max embedding requests per minute")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDING_STORE_DTYPE)
+    args = parser.parse_args()
+
+    embed_chunks(args.inputs, args.store_dir, EMBEDDERS[args.embedder](), batch_size=args.batch_size,
+                 rpm=args.rpm, retries=args.retries, dtype=args.dtype)
@@ -0,0 +1,312 @@
+"""
+Single-pass ingestion: content JSONL (from 2.Filter.py) -> sanitize -> chunk -> embed
+-> the binary embedding store and BM25 index the backend loads.
+
+Records stream through generator stages, and no intermediate *_sanitized files
+are written between stages. The sanitize and chunk logic is reused from
+3.sanitize.py and 4.chunk.py. Vectors are appended to a spool file as each
+batch comes back and written into the store from there. They are never
+serialized as JSON, and memory holds one batch plus the chunk text. The BM25
+index is fitted on the chunks in memory. Into --out-dir it writes:
+
+    embedding_store/                          vectors + chunk metadata (services.data_loader)
+    sparse_index/                             fitted BM25 index (sparse_search)
+    <name>_embedding_ready_raw_chunks.jsonl   chunk text for each input; both artifacts are
+                                              stamped with these files' hash, which the
+                                              backend checks for staleness
+
+--jsonl also writes the older Google_<name>_embs.jsonl / Google_<name>_sparse_embs.jsonl
+files (chunks with their vectors) for tools that still read them. Every file
+is written to a temp path and swapped in on success. Use --embedder stub for an
+offline run (same hashed bag-of-words vectors as QUERY_EMBEDDER=stub).
+
+Usage:
+    python ingest_pipeline.py [changia_content.jsonl jewel_content.jsonl] [--out-dir ../backend/data]
+        [--embedder google|stub] [--batch-size 32] [--max-tokens 256] [--overlap-tokens 40] [--jsonl]
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, "..", "backend"))
+DEFAULT_INPUTS = ["changia_content.jsonl", "jewel_content.jsonl"]
+sys.path.insert(0, BACKEND_DIR)
+
+
+def load_script(filename, module_name):
+    """Import a numbered script (not a valid module name) from this folder."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+sanitize = load_script("3.sanitize.py", "sanitize_step")
+chunker = load_script("4.chunk.py", "chunk_step")
+
+
+# ----- Per-stage throughput counters ----- #
+class StageStats:
+    """Items in/out and time spent inside each stage (upstream time excluded)."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, n_in=0, n_out=0, seconds=0.0):
+        row = self.stages.setdefault(stage, {"in": 0, "out": 0, "seconds": 0.0})
+        row["in"] += n_in
+        row["out"] += n_out
+        row["seconds"] += seconds
+
+    def report(self):
+        print(f"{'stage':<10} {'in':>8} {'out':>8} {'seconds':>9} {'out/s':>9}")
+        for stage, row in self.stages.items():
+            rate = row["out"] / row["seconds"] if row["seconds"] else 0.0
+            print(f"{stage:<10} {row['in']:>8} {row['out']:>8} {row['seconds']:>9.3f} {rate:>9.1f}")
+
+
+# ----- Embedders: callables mapping a list of texts to a list of vectors ----- #
+class StubEmbedder:
+    """Offline, deterministic vectors matching the backend's QUERY_EMBEDDER=stub."""
+
+    name = "stub"
+
+    def __init__(self):
+        from services.embeddings import stub_embed_query
+        self._embed = stub_embed_query
+
+    def __call__(self, texts):
+        return [self._embed(text) for text in texts]
+
+class GoogleEmbedder:
+    """Batch document embeddings from the same model the backend embeds queries with."""
+
+    def __init__(self, model="embedding-001"):
+        import google.generativeai as genai
+        from config import GOOGLE_API_KEY
+        if not GOOGLE_API_KEY:
+            raise ValueError("GOOGLE_API_KEY not set in .env file")
+        genai.configure(api_key=GOOGLE_API_KEY)
+        self._genai = genai
+        self.model = model
+        self.name = f"google/{model}"
+
+    def __call__(self, texts):
+        return self._genai.embed_content(model=self.model, content=list(texts))["embedding"]
+
+EMBEDDERS = {"stub": StubEmbedder, "google": GoogleEmbedder}
+
+
+# ----- Stages ----- #
+def read_records(path, stats):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            record = json.loads(line)
+            stats.add("read", 1, 1, time.perf_counter() - start)
+            yield record
+
+def sanitize_stage(records, stats, min_words=50):
+    for record in records:
+        start = time.perf_counter()
+        record, _ = sanitize.sanitize_record(record, min_words=min_words)
+        stats.add("sanitize", 1, int(record is not None), time.perf_counter() - start)
+        if record is not None:
+            yield record
+
+def chunk_stage(records, stats, max_tokens=chunker.DEFAULT_MAX_TOKENS, overlap_tokens=chunker.DEFAULT_OVERLAP_TOKENS):
+    for record in records:
+        start = time.perf_counter()
+        chunks = chunker.chunk_record(record, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        stats.add("chunk", 1, len(chunks), time.perf_counter() - start)
+        yield from chunks
+
+def embed_stage(chunks, embedder, stats, batch_size=32):
+    batch = []
+
+    def flush():
+        start = time.perf_counter()
+        vectors = np.asarray(embedder([chunk["text"] for chunk in batch]), dtype=np.float32)
+        stats.add("embed", len(batch), len(vectors), time.perf_counter() - start)
+        yield from zip(batch, vectors)
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield from flush()
+            batch = []
+    if batch:
+        yield from flush()
+
+
+# ----- Sink ----- #
+class VectorSpool:
+    """Append-only file of rows in `dtype`; matrix() maps it for write_embedding_store."""
+
+    def __init__(self, directory, dtype="float32"):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".vectors.tmp")
+        self._file = os.fdopen(fd, "wb")
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.dim = None
+
+    def append(self, vector):
+        vector = np.asarray(vector, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError(f"Embedding has {len(vector)} dims, expected {self.dim}")
+        self._file.write(vector.tobytes())
+        self.rows += 1
+
+    def matrix(self):
+        self._file.close()
+        if not self.rows:
+            raise ValueError("No chunks were embedded")
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+
+    def remove(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def artifact_paths(name, out_dir):
+    return {
+        "raw": os.path.join(out_dir, f"{name}_embedding_ready_raw_chunks.jsonl"),
+        "dense": os.path.join(out_dir, f"Google_{name}_embs.jsonl"),
+        "sparse": os.path.join(out_dir, f"Google_{name}_sparse_embs.jsonl"),
+    }
+
+def write_artifacts(embedded, paths, spool, store_rows, stats, write_jsonl=False):
+    """
+    Append new chunk_ids' vectors to the spool and their metadata to store_rows
+    (first occurrence wins, as when compiling a store). Write the raw chunk file,
+    plus the dense/sparse JSONL with write_jsonl. Files are swapped in only on
+    success.
+
+    Returns:
+        list: This input's chunks in order (the BM25 index input).
+    """
+    kinds = ("raw", "dense", "sparse") if write_jsonl else ("raw",)
+    files = {kind: open(paths[kind] + ".tmp", 'w', encoding='utf-8') for kind in kinds}
+    chunks = []
+    try:
+        for chunk, vector in embedded:
+            start = time.perf_counter()
+            if chunk["chunk_id"] not in store_rows:
+                store_rows[chunk["chunk_id"]] = chunk
+                spool.append(vector)
+            chunks.append(chunk)
+            files["raw"].write(json.dumps(chunk, ensure_ascii=False) + '\n')
+            if write_jsonl:
+                embedding = vector.tolist()
+                files["dense"].write(json.dumps({**chunk, "embedding": embedding}, ensure_ascii=False) + '\n')
+                files["sparse"].write(json.dumps({**chunk, "metadata": {"embedding": embedding}}, ensure_ascii=False) + '\n')
+            stats.add("write", 1, 1, time.perf_counter() - start)
+    finally:
+        for f in files.values():
+            f.close()
+    for kind in kinds:
+        os.replace(paths[kind] + ".tmp", paths[kind])
+    return chunks
+
+def dataset_name(input_path):
+    name = os.path.basename(input_path)
+    for suffix in (".jsonl", "_content"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+def run_pipeline(input_paths, out_dir, embedder, stats, batch_size=32, max_tokens=chunker.DEFAULT_MAX_TOKENS,
+                 overlap_tokens=chunker.DEFAULT_OVERLAP_TOKENS, min_words=50, write_jsonl=False, dtype=None):
+    """
+    Run every input through the stages, then write the embedding store and
+    the BM25 index into out_dir.
+
+    Returns:
+        dict: Chunk counts per input path.
+    """
+    from config import EMBEDDING_STORE_DTYPE, BM25_K1, BM25_B, BM25_DELTA
+    from services.data_loader import hash_files, source_stats, write_embedding_store
+    from sparse_search import SparseSearchIndex
+
+    store_dir = os.path.join(out_dir, "embedding_store")
+    os.makedirs(store_dir, exist_ok=True)
+    spool = VectorSpool(store_dir, dtype or EMBEDDING_STORE_DTYPE)
+    store_rows, all_chunks, counts, raw_paths = {}, [], {}, []
+    try:
+        for input_path in input_paths:
+            records = read_records(input_path, stats)
+            records = sanitize_stage(records, stats, min_words=min_words)
+            chunks = chunk_stage(records, stats, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+            embedded = embed_stage(chunks, embedder, stats, batch_size=batch_size)
+            paths = artifact_paths(dataset_name(input_path), out_dir)
+            written = write_artifacts(embedded, paths, spool, store_rows, stats, write_jsonl=write_jsonl)
+            all_chunks.extend(written)
+            counts[input_path] = len(written)
+            raw_paths.append(paths["raw"])
+
+        # Stamped like a scripts/5.embed.py store, so the backend checks it against the raw chunk files
+        source_hash = hash_files(raw_paths)
+        start = time.perf_counter()
+        write_embedding_store(list(store_rows), list(store_rows.values()), spool.matrix(), store_dir,
+                              {"source_files": [os.path.basename(p) for p in raw_paths],
+                               "source_hash": source_hash, "source_stats": source_stats(raw_paths),
+                               "embedder": embedder.name})
+        stats.add("store", spool.rows, spool.rows, time.perf_counter() - start)
+    finally:
+        spool.remove()
+
+    start = time.perf_counter()
+    index = SparseSearchIndex(chunks=all_chunks, k1=BM25_K1, b=BM25_B, delta=BM25_DELTA)
+    index.save(os.path.join(out_dir, "sparse_index"), source_hash=source_hash)
+    stats.add("bm25", len(all_chunks), len(all_chunks), time.perf_counter() - start)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=DEFAULT_INPUTS, help="content JSONL files from 2.Filter.py")
+    parser.add_argument("--out-dir", default=os.path.join(BACKEND_DIR, "data"))
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default="google")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=chunker.DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=chunker.DEFAULT_OVERLAP_TOKENS)
+    parser.add_argument("--min-words", type=int, default=50)
+    parser.add_argument("--dtype", choices=["float32", "float16"], help="store dtype (default: EMBEDDING_STORE_DTYPE)")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="also write the Google_*_embs.jsonl / Google_*_sparse_embs.jsonl files")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    inputs = []
+    for input_path in args.inputs:
+        if os.path.exists(input_path):
+            inputs.append(input_path)
+        else:
+            print(f"Input not found, skipping: {input_path}")
+    if not inputs:
+        sys.exit("No inputs to ingest")
+
+    embedder = EMBEDDERS[args.embedder]()
+    stats = StageStats()
+    counts = run_pipeline(inputs, args.out_dir, embedder, stats,
+                          batch_size=args.batch_size, max_tokens=args.max_tokens,
+                          overlap_tokens=args.overlap_tokens, min_words=args.min_words,
+                          write_jsonl=args.jsonl, dtype=args.dtype)
+    for input_path, count in counts.items():
+        print(f"{input_path}: {count} chunks -> {args.out_dir}")
+    stats.report()
@@ -0,0 +1,49 @@
+import functools
+import importlib.util
+import os
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+SCRIPTS_DIR = os.path.join(ROOT_DIR, "scripts")
+
+# Backend config reads the environment at import time; never reach Google/Pinecone from tests
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("QUERY_EMBEDDER", "stub")
+os.environ.setdefault("DENSE_BACKEND", "local")
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def load_script(filename, module_name):
+    """Import a numbered script from scripts/ (not a valid module name)."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Serve tmp_path/site over HTTP on a random port; yields (root_dir, base_url)."""
+    root = tmp_path / "site"
+    root.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield str(root), f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
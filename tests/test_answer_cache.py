@@ -0,0 +1,61 @@
+import numpy as np
+
+from services import answer_cache
+from services.answer_cache import SemanticAnswerCache
+from services.llm_pool import LLMClientPool
+
+QUERY = np.array([1.0, 0.0, 0.0])
+PARAPHRASE = np.array([0.99, 0.1, 0.0])
+
+
+def test_answers_are_kept_apart_per_namespace():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=4)
+    namespace_a = "gemini@0.3:" + LLMClientPool.key("key-a")
+    namespace_b = "gemini@0.3:" + LLMClientPool.key("key-b")
+    cache.store(QUERY, "Answer for A", ["https://example.com/a"], corpus_version="v1", namespace=namespace_a)
+
+    assert cache.lookup(PARAPHRASE, corpus_version="v1", namespace=namespace_b) is None
+    assert cache.lookup(PARAPHRASE, corpus_version="v1", namespace=namespace_a)["answer"] == "Answer for A"
+
+    cache.store(QUERY, "Answer for B", ["https://example.com/b"], corpus_version="v1", namespace=namespace_b)
+    assert cache.lookup(QUERY, corpus_version="v1", namespace=namespace_a)["answer"] == "Answer for A"
+    assert cache.lookup(QUERY, corpus_version="v1", namespace=namespace_b)["answer"] == "Answer for B"
+
+
+def test_workers_on_different_corpus_versions_keep_their_entries():
+    cache = SemanticAnswerCache(threshold=0.95, max_size=2)
+    cache.store(QUERY, "Old answer", [], corpus_version="v1", namespace="ns")
+    assert cache.lookup(QUERY, corpus_version="v2", namespace="ns") is None
+
+    # Mid-swap a v2 worker stores too; the v1 worker's entry survives
+    cache.store(QUERY, "New answer", [], corpus_version="v2", namespace="ns")
+    assert cache.lookup(QUERY, corpus_version="v2", namespace="ns")["answer"] == "New answer"
+    assert cache.lookup(QUERY, corpus_version="v1", namespace="ns")["answer"] == "Old answer"
+    assert cache.stats()["invalidations"] == 0
+
+    # Once full, the other version's entries go first, even if recently used
+    cache.store(PARAPHRASE, "Another new answer", [], corpus_version="v2", namespace="ns")
+    assert cache.lookup(QUERY, corpus_version="v1", namespace="ns") is None
+    assert cache.lookup(QUERY, corpus_version="v2", namespace="ns")["answer"] == "New answer"
+    assert cache.stats()["invalidations"] == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def test_expired_best_match_falls_back_to_the_next_one(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(answer_cache, "time", clock)
+    cache = SemanticAnswerCache(threshold=0.95, max_size=4, ttl_seconds=60)
+    cache.store(PARAPHRASE, "Close answer", [], corpus_version="v1")
+    clock.now += 30
+    cache.store(QUERY, "Exact answer", [], corpus_version="v1")
+
+    clock.now += 40   # the exact match is still fresh, the paraphrase has expired
+    assert cache.lookup(PARAPHRASE, corpus_version="v1")["answer"] == "Exact answer"
+    assert cache.stats()["size"] == 1
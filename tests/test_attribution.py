@@ -0,0 +1,40 @@
+import numpy as np
+
+from services.attribution import SourceAttributor
+from services.chunk_store import ChunkStore
+from services.data_loader import EmbeddingStore, write_embedding_store
+
+CHUNKS = [
+    {"chunk_id": "jewel_chunk-a", "url": "https://example.com/vortex", "title": "Rain Vortex",
+     "text": "The Rain Vortex is the world's tallest indoor waterfall, with a light show every evening."},
+    {"chunk_id": "jewel_chunk-b", "url": "https://example.com/canopy", "title": "Canopy Park",
+     "text": "Canopy Park opens at 10am. Tickets for the hedge maze are sold on level 5."},
+    {"chunk_id": "changi_chunk-c", "url": "https://example.com/transport", "title": "Transport",
+     "text": "Take the MRT to Changi Airport station, or a taxi from the arrival hall."},
+]
+ANSWER = "The light show at the Rain Vortex waterfall runs every evening; Canopy Park tickets are on level 5."
+
+
+def chunk_store(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((len(CHUNKS), 8)).astype(np.float32)
+    write_embedding_store([c["chunk_id"] for c in CHUNKS], CHUNKS, vectors, str(tmp_path),
+                          {"source_files": [], "source_hash": "0" * 64})
+    return ChunkStore(EmbeddingStore(str(tmp_path)))
+
+
+def test_stored_term_sets_match_tokenizing_at_startup(tmp_path):
+    store = chunk_store(tmp_path)
+    store.intern("sparse-only", {"url": "https://example.com/maze", "text": "The hedge maze is in Canopy Park."})
+    candidates = [type("C", (), {"row": row}) for row in range(len(store))]
+
+    stored = SourceAttributor(store)
+    assert stored._n_stored == len(CHUNKS)
+    assert isinstance(stored._stored_ids, np.memmap)
+
+    store.attribution_terms = None
+    computed = SourceAttributor(store)
+    assert computed._n_stored == 0
+
+    np.testing.assert_allclose(stored.idf, computed.idf)
+    assert stored.attribute(ANSWER, candidates, max_sources=4, min_confidence=0) == \
+        computed.attribute(ANSWER, candidates, max_sources=4, min_confidence=0)
@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import load_script
+from services.tokenizer import count_tokens
+
+chunker = load_script("4.chunk.py", "chunk_step")
+
+
+@pytest.mark.parametrize("text", [
+    "WORD " * 600,
+    "Canopy Park is open daily. " + "OPENING HOURS AND TICKETS " * 150 + "Book online.",
+    "See https://example.com/" + "a" * 3000 + " for details.",
+])
+def test_chunks_never_exceed_max_tokens(text):
+    chunks = chunker.chunk_text(text, max_tokens=256, overlap_tokens=40)
+    assert chunks
+    assert max(count_tokens(chunk) for chunk in chunks) <= 256
+
+
+def test_oversized_caps_run_keeps_all_words():
+    chunks = chunker.chunk_text("WORD " * 600, max_tokens=256, overlap_tokens=0)
+    assert " ".join(chunks).split() == ["WORD"] * 600
+
+
+def test_short_headings_still_start_chunks():
+    body = "The Rain Vortex is the world's tallest indoor waterfall. " * 12
+    text = f"RAIN VORTEX\n{body}\nCanopy Park\n{body}"
+    chunks = chunker.chunk_text(text, max_tokens=256, overlap_tokens=0)
+    assert any(chunk.startswith("Canopy Park") for chunk in chunks)
+    assert not any(chunk.rstrip().endswith(("RAIN VORTEX", "Canopy Park")) for chunk in chunks)
+
+
+def test_long_run_of_short_lines_stays_within_budget():
+    lines = [f"Shop {i} Level {i % 5} Unit 0{i % 9}-12" for i in range(300)]
+    chunks = chunker.chunk_text("\n".join(lines), max_tokens=256, overlap_tokens=40)
+    assert len(chunks) > 1
+    assert max(count_tokens(chunk) for chunk in chunks) <= 256
+    assert set("\n".join(chunks).split("\n")) == set(lines)
+
+
+def test_directory_page_from_extraction_stays_within_budget():
+    filter_step = load_script("2.Filter.py", "filter_step")
+    shops = "".join(f"<li><h3>Restaurant {i}</h3><p>#02-{i:02d}</p><p>Level {i % 5}</p><p>10am - 10pm</p></li>"
+                    for i in range(120))
+    html = f"<html><body><main><h1>Dining Directory</h1><p>{'Find a place to eat. ' * 10}</p><ul>{shops}</ul></main></body></html>"
+    _, text, _ = filter_step.extract_from_html(html, "html.parser")
+
+    chunks = chunker.chunk_text(text, max_tokens=256, overlap_tokens=40)
+    assert max(count_tokens(chunk) for chunk in chunks) <= 256
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from services import chunk_store
+from services.chunk_store import ChunkStore, context_header
+from services.data_loader import EmbeddingStore, write_embedding_store
+from services.tokenizer import count_tokens
+
+CHUNKS = [
+    {"chunk_id": "jewel_chunk-a", "url": "https://example.com/jewel", "title": "Jewel",
+     "text": "The Rain Vortex light show runs every evening."},
+    {"chunk_id": "jewel_chunk-b", "url": "https://example.com/canopy", "title": "Canopy Park",
+     "text": "Canopy Park opens at 10am. Tickets are sold on level 5."},
+]
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((len(CHUNKS), 8)).astype(np.float32)
+    write_embedding_store([c["chunk_id"] for c in CHUNKS], CHUNKS, vectors, str(tmp_path),
+                          {"source_files": [], "source_hash": "0" * 64})
+    return str(tmp_path)
+
+
+def expected_counts():
+    return ([count_tokens(c["text"]) for c in CHUNKS],
+            [count_tokens(context_header(c["title"], c["url"])) for c in CHUNKS])
+
+
+def test_token_counts_are_mapped_from_the_store(store_dir, monkeypatch):
+    def no_tokenizing(texts):
+        raise AssertionError("token counts should come from the store")
+    monkeypatch.setattr(chunk_store, "count_tokens_batch", no_tokenizing)
+
+    store = ChunkStore(EmbeddingStore(store_dir))
+
+    assert isinstance(store.token_counts._base, np.memmap)
+    texts, headers = expected_counts()
+    assert [store.token_counts[row] for row in range(len(CHUNKS))] == texts
+    assert [store.header_tokens[row] for row in range(len(CHUNKS))] == headers
+
+
+def test_counts_from_another_tokenizer_are_recomputed(store_dir):
+    manifest_path = f"{store_dir}/manifest.json"
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["tokenizer"] = "gemini:some-other-model"
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    embedding_store = EmbeddingStore(store_dir)
+    assert embedding_store.token_counts() is None
+    store = ChunkStore(embedding_store)
+
+    texts, _ = expected_counts()
+    assert [store.token_counts[row] for row in range(len(CHUNKS))] == texts
+    row = store.intern("extra", {"text": "Free Wi-Fi across all terminals."})
+    assert store.token_counts[row] == count_tokens("Free Wi-Fi across all terminals.")
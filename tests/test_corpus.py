@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from services.corpus import CorpusManager, load_corpus, publish_snapshot, read_current_snapshot
+from services.data_loader import write_embedding_store
+
+CHUNKS = [
+    {"chunk_id": "jewel_chunk-a", "url": "https://example.com/jewel", "text": "Rain Vortex light show at night"},
+    {"chunk_id": "jewel_chunk-b", "url": "https://example.com/jewel", "text": "Canopy Park opens at 10am"},
+    {"chunk_id": "jewel_chunk-c", "url": "https://example.com/dine", "text": "Dining options in Jewel"},
+]
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Raw chunk file plus a compiled store holding the same chunks."""
+    raw = tmp_path / "jewel_embedding_ready_raw_chunks.jsonl"
+    raw.write_text("".join(json.dumps(c) + "\n" for c in CHUNKS), encoding="utf-8")
+    vectors = np.random.default_rng(0).standard_normal((len(CHUNKS), 8)).astype(np.float32)
+    write_embedding_store([c["chunk_id"] for c in CHUNKS], CHUNKS, vectors, str(tmp_path / "embedding_store"),
+                          {"source_files": ["Google_jewel_embs.jsonl"], "source_hash": "0" * 64})
+    return tmp_path
+
+
+def publish(data_dir, **kwargs):
+    return publish_snapshot(str(data_dir / "corpus"), store_dir=str(data_dir / "embedding_store"),
+                            raw_chunk_files=[str(data_dir / "jewel_embedding_ready_raw_chunks.jsonl")], **kwargs)
+
+
+def test_publish_snapshots_the_compiled_store(data_dir):
+    name = publish(data_dir)
+    assert read_current_snapshot(str(data_dir / "corpus")) == name
+
+    corpus = load_corpus(name, str(data_dir / "corpus"))
+    assert corpus.embedding_store.chunk_ids == [c["chunk_id"] for c in CHUNKS]
+    assert [c["chunk_id"] for c in corpus.sparse_index.chunks] == [c["chunk_id"] for c in CHUNKS]
+    # Every sparse document maps onto a stored vector, so no sparse-only rows were added
+    assert len(corpus.store) == len(CHUNKS)
+
+
+def test_publish_refuses_a_store_that_does_not_match_the_chunks(data_dir):
+    name = publish(data_dir)
+    raw = data_dir / "jewel_embedding_ready_raw_chunks.jsonl"
+    changed = [dict(CHUNKS[0], text="Rain Vortex is closed for maintenance")] + CHUNKS[1:]
+    raw.write_text("".join(json.dumps(c) + "\n" for c in changed), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="1 with different text"):
+        publish(data_dir)
+    assert read_current_snapshot(str(data_dir / "corpus")) == name
+    assert sorted(os.listdir(data_dir / "corpus")) == sorted(["CURRENT", name])
+
+
+def test_manager_swaps_to_the_published_snapshot(data_dir):
+    manager = CorpusManager(str(data_dir / "corpus"))
+    first = publish(data_dir)
+    assert manager.reload()["version"] == first
+    assert manager.reload()["changed"] is False
+
+    second = publish(data_dir, keep=1)
+    old = manager.current()
+    result = manager.reload()
+    assert result["changed"] and result["version"] == second != first
+    # Requests still holding the old corpus keep a working store
+    assert len(old.store) == len(CHUNKS)
+    assert sorted(d for d in os.listdir(data_dir / "corpus") if d.startswith("v")) == [second]
@@ -0,0 +1,131 @@
+import os
+
+from conftest import load_script
+
+crawler = load_script("1.crawler.py", "crawler")
+
+
+def write_site(root, pages, robots="", sitemap=None):
+    for path, body in pages.items():
+        full = os.path.join(root, path.lstrip("/"))
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w", encoding="utf-8") as f:
+            f.write(f"<html><body>{body}</body></html>")
+    with open(os.path.join(root, "robots.txt"), "w", encoding="utf-8") as f:
+        f.write(robots)
+    if sitemap is not None:
+        with open(os.path.join(root, "sitemap.xml"), "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                    + "".join(f"<url><loc>{loc}</loc></url>" for loc in sitemap) + "</urlset>")
+
+
+def run_crawl(tmp_path, base, **kwargs):
+    out = str(tmp_path / "urls.txt")
+    kwargs.setdefault("delay", 0)
+    kwargs.setdefault("workers", 4)
+    pages = crawler.crawl(base + "/", out, out + ".checkpoint.json", **kwargs)
+    with open(out, encoding="utf-8") as f:
+        return pages, f.read().splitlines()
+
+
+def test_canonicalize_url():
+    assert crawler.canonicalize_url("HTTP://Example.COM:80//a//b?utm_source=x&b=2&a=1#frag") == \
+        "http://example.com/a/b?a=1&b=2"
+    assert crawler.canonicalize_url("../c.html", base="https://example.com:443/a/b.html") == \
+        "https://example.com/c.html"
+    assert crawler.canonicalize_url("mailto:info@example.com") is None
+    assert crawler.canonicalize_url("http://[bad") is None
+    assert crawler.canonicalize_url("http://example.com:abc/") is None
+
+
+def test_robots_disallow(site, tmp_path):
+    root, base = site
+    write_site(root, {
+        "/index.html": '<a href="/public.html">p</a> <a href="/private/secret.html">s</a>',
+        "/public.html": "public",
+        "/private/secret.html": "secret",
+    }, robots="User-agent: *\nDisallow: /private/\n")
+
+    _, urls = run_crawl(tmp_path, base)
+    assert sorted(urls) == [base + "/", base + "/public.html"]
+
+
+def test_canonicalization_dedups_links(site, tmp_path):
+    root, base = site
+    write_site(root, {
+        "/index.html": (
+            '<a href="/a.html#top">1</a> <a href="a.html?utm_source=news">2</a>'
+            f' <a href="{base}//a.html">3</a> <a href="{base.replace("http", "HTTP")}/a.html">4</a>'
+            ' <a href="/b.html?y=2&x=1">5</a> <a href="/b.html?x=1&y=2">6</a>'
+            ' <a href="https://elsewhere.example/">external</a> <a href="/doc.pdf">pdf</a>'
+        ),
+        "/a.html": '<a href="/">home</a>',
+        "/b.html": "b",
+    })
+
+    pages, urls = run_crawl(tmp_path, base)
+    assert len(urls) == len(set(urls)) == pages
+    assert sorted(urls) == sorted([base + "/", base + "/a.html", base + "/b.html?x=1&y=2"])
+
+
+def test_malformed_links_are_skipped(site, tmp_path):
+    root, base = site
+    write_site(root, {
+        "/index.html": ('<a href="http://[bad">1</a> <a href="http://localhost:abc/">2</a>'
+                        ' <a href="/good.html">3</a>'),
+        "/good.html": "good",
+    })
+
+    _, urls = run_crawl(tmp_path, base)
+    assert sorted(urls) == [base + "/", base + "/good.html"]
+
+
+def test_sitemap_seeding(site, tmp_path):
+    root, base = site
+    write_site(root, {"/index.html": "no links", "/orphan.html": "only in the sitemap"},
+               sitemap=[base + "/orphan.html"])
+
+    _, urls = run_crawl(tmp_path, base)
+    assert sorted(urls) == [base + "/", base + "/orphan.html"]
+
+
+def chain_site(root, n):
+    """index -> p1 -> p2 -> ... so the crawl order is deterministic."""
+    pages = {"/index.html": '<a href="/p1.html">next</a>'}
+    for i in range(1, n):
+        pages[f"/p{i}.html"] = f'<a href="/p{i + 1}.html">next</a>'
+    pages[f"/p{n}.html"] = "end"
+    write_site(root, pages)
+    return pages
+
+
+def test_resume_from_checkpoint(site, tmp_path):
+    root, base = site
+    chain_site(root, 6)
+
+    pages, urls = run_crawl(tmp_path, base, max_pages=3)
+    assert pages == 3
+    assert os.path.exists(str(tmp_path / "urls.txt.checkpoint.json"))
+
+    pages, urls = run_crawl(tmp_path, base)
+    assert pages == 7
+    assert len(urls) == len(set(urls)) == 7
+    assert not os.path.exists(str(tmp_path / "urls.txt.checkpoint.json"))
+
+
+def test_resume_after_crash_between_checkpoints(site, tmp_path):
+    root, base = site
+    chain_site(root, 6)
+    out = str(tmp_path / "urls.txt")
+    checkpoint = out + ".checkpoint.json"
+
+    # Crash state: the checkpoint still queues the start page, but the output
+    # already holds it and p1 (plus a torn, half-written line)
+    start = base + "/"
+    crawler.save_checkpoint(checkpoint, [start], {start}, 0)
+    with open(out, "w", encoding="utf-8") as f:
+        f.write(f"{start}\n{base}/p1.html\n{base}/p2.ht")
+
+    pages, urls = run_crawl(tmp_path, base)
+    assert pages == 7
+    assert sorted(urls) == sorted([start] + [f"{base}/p{i}.html" for i in range(1, 7)])
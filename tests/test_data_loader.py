@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from services import data_loader
+from services.data_loader import EmbeddingStore, compile_embedding_store, load_embedding_store, write_atomic
+
+
+def write_embedding_file(path, n, dim=8, offset=0):
+    rng = np.random.default_rng(offset)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(offset, offset + n):
+            f.write(json.dumps({"chunk_id": f"chunk-{i}", "text": f"text {i}",
+                                "embedding": rng.standard_normal(dim).tolist()}) + "\n")
+
+
+def test_stale_store_is_recompiled(tmp_path):
+    source = str(tmp_path / "embs.jsonl")
+    store_dir = str(tmp_path / "store")
+    write_embedding_file(source, 3)
+    assert len(load_embedding_store(store_dir, file_paths=[source])) == 3
+
+    version = EmbeddingStore(store_dir).version
+    assert load_embedding_store(store_dir, file_paths=[source]).version == version
+
+    write_embedding_file(source, 5)
+    store = load_embedding_store(store_dir, file_paths=[source])
+    assert len(store) == 5
+    assert store.version != version
+
+
+def test_unchanged_sources_are_not_rehashed(tmp_path, monkeypatch):
+    source = str(tmp_path / "embs.jsonl")
+    store_dir = str(tmp_path / "store")
+    write_embedding_file(source, 3)
+    version = load_embedding_store(store_dir, file_paths=[source]).version
+
+    hashed = []
+    real_hash_files = data_loader.hash_files
+    monkeypatch.setattr(data_loader, "hash_files", lambda paths: hashed.append(paths) or real_hash_files(paths))
+    assert load_embedding_store(store_dir, file_paths=[source]).version == version
+    assert hashed == []
+
+    # Touched but identical: hashed once, then restamped
+    os.utime(source, ns=(0, 0))
+    assert load_embedding_store(store_dir, file_paths=[source]).version == version
+    assert load_embedding_store(store_dir, file_paths=[source]).version == version
+    assert len(hashed) == 1
+
+
+def test_recompile_swaps_in_a_whole_new_version(tmp_path):
+    source = str(tmp_path / "embs.jsonl")
+    store_dir = str(tmp_path / "store")
+    write_embedding_file(source, 3)
+    old = load_embedding_store(store_dir, file_paths=[source])
+
+    write_embedding_file(source, 5)
+    new = load_embedding_store(store_dir, file_paths=[source])
+
+    assert os.path.islink(store_dir) and new.store_dir != old.store_dir
+    # A reader of the old version still sees its own metadata, not the new rows
+    assert len(old.metadata) == len(old) == 3 and len(new.metadata) == 5
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_legacy_store_directory_is_replaced(tmp_path):
+    source = str(tmp_path / "embs.jsonl")
+    store_dir = str(tmp_path / "store")
+    write_embedding_file(source, 3)
+    data_loader.write_embedding_store(["stale"], [{"text": "stale"}], np.zeros((1, 8), np.float32), store_dir,
+                                      {"source_files": [], "source_hash": "0" * 64})
+
+    assert EmbeddingStore(store_dir).chunk_ids == ["stale"]
+    assert len(load_embedding_store(store_dir, file_paths=[source])) == 3
+    assert os.path.islink(store_dir)
+
+
+def test_source_without_embeddings_is_an_error(tmp_path):
+    source = str(tmp_path / "embs.jsonl")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"chunk_id": "chunk-0", "text": "no vector"}) + "\n")
+
+    with pytest.raises(ValueError, match="No chunks with a chunk_id and an embedding"):
+        compile_embedding_store([source], store_dir=str(tmp_path / "store"))
+    assert not os.path.exists(tmp_path / "store")
+
+
+def test_concurrent_compiles_do_not_clobber_temp_files(tmp_path):
+    source = str(tmp_path / "embs.jsonl")
+    store_dir = str(tmp_path / "store")
+    write_embedding_file(source, 200, dim=64)
+
+    errors = []
+    def compile_store():
+        try:
+            compile_embedding_store([source], store_dir=store_dir)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=compile_store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(EmbeddingStore(store_dir)) == 200
+    assert not [name for name in os.listdir(store_dir) if name.endswith(".tmp")]
+
+
+def test_write_atomic_keeps_old_file_on_failure(tmp_path):
+    path = str(tmp_path / "data.txt")
+    write_atomic(path, lambda tmp: open(tmp, "w").write("old"))
+
+    def fail(tmp):
+        with open(tmp, "w") as f:
+            f.write("partial")
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        write_atomic(path, fail)
+    assert open(path).read() == "old"
+    assert os.listdir(tmp_path) == ["data.txt"]
@@ -0,0 +1,80 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import load_script
+from services.data_loader import EmbeddingStore
+
+embed_step = load_script("5.embed.py", "embed_step")
+
+
+class Interrupted(Exception):
+    pass
+
+
+class RecordingEmbedder:
+    """Stub vectors; records every text embedded and fails once `fail_after` batches succeeded."""
+
+    name = "stub"
+
+    def __init__(self, fail_after=None):
+        self._stub = embed_step.EMBEDDERS["stub"]()
+        self.fail_after = fail_after
+        self.texts = []
+
+    def __call__(self, texts):
+        if self.fail_after is not None and len(self.texts) >= self.fail_after * 4:
+            raise Interrupted()
+        self.texts.extend(texts)
+        return self._stub(texts)
+
+
+@pytest.fixture
+def raw_chunks(tmp_path):
+    path = tmp_path / "jewel_embedding_ready_raw_chunks.jsonl"
+    chunks = [{"chunk_id": f"jewel_chunk-{i}", "url": "https://example.com", "text": f"Jewel passage {i % 17}"}
+              for i in range(20)]   # the last three repeat earlier texts
+    path.write_text("".join(json.dumps(c) + "\n" for c in chunks), encoding="utf-8")
+    return [str(path)], chunks
+
+
+def run(raw_files, store_dir, embedder):
+    return embed_step.embed_chunks(raw_files, store_dir, embedder, batch_size=4, rpm=60000, retries=0)
+
+
+def test_resume_from_partial_checkpoint(raw_chunks, tmp_path):
+    raw_files, chunks = raw_chunks
+    store_dir = str(tmp_path / "store")
+
+    first = RecordingEmbedder(fail_after=2)
+    with pytest.raises(Interrupted):
+        run(raw_files, store_dir, first)
+    checkpoint = os.path.join(store_dir, embed_step.CHECKPOINT_FILE)
+    with open(checkpoint, "a", encoding="utf-8") as f:
+        f.write('{"key": "torn-by-a-crash", "embedding": [0.1, ')
+
+    second = RecordingEmbedder()
+    run(raw_files, store_dir, second)
+
+    texts = sorted({c["text"] for c in chunks})
+    assert len(first.texts) == 8
+    assert sorted(first.texts + second.texts) == texts      # every distinct text embedded exactly once
+    assert not os.path.exists(checkpoint)
+
+    store = EmbeddingStore(store_dir)
+    assert store.chunk_ids == [c["chunk_id"] for c in chunks]
+    assert [m["text"] for m in store.metadata] == [c["text"] for c in chunks]
+    expected = np.asarray(embed_step.EMBEDDERS["stub"]()([c["text"] for c in chunks]), dtype=np.float32)
+    np.testing.assert_array_equal(np.asarray(store.vectors), expected)
+
+
+def test_rerun_reuses_the_store(raw_chunks, tmp_path):
+    raw_files, _ = raw_chunks
+    store_dir = str(tmp_path / "store")
+    run(raw_files, store_dir, RecordingEmbedder())
+
+    again = RecordingEmbedder()
+    run(raw_files, store_dir, again)
+    assert again.texts == []
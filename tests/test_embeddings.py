@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_dedup import legacy_deduplicate, make_chunks
+from services.embeddings import deduplicate_by_embedding, deduplicate_rows
+
+
+@pytest.mark.parametrize("n, threshold", [(1, 0.9), (50, 0.9), (700, 0.9), (700, 0.5)])
+def test_vectorized_dedup_keeps_the_same_chunks_as_the_pairwise_scan(n, threshold):
+    chunks = make_chunks(n, dim=32, seed=n)
+    expected = [c["chunk_id"] for c in legacy_deduplicate(chunks, threshold)]
+
+    # Small blocks so the greedy scan crosses block boundaries
+    kept = deduplicate_rows([c["embedding"] for c in chunks], threshold=threshold, block_size=64)
+    assert [chunks[row]["chunk_id"] for row in kept] == expected
+    assert [c["chunk_id"] for c in deduplicate_by_embedding(chunks, threshold=threshold)] == expected
+
+
+def test_chunks_without_embeddings_are_skipped():
+    vector = np.ones(4).tolist()
+    chunks = [{"chunk_id": "a", "embedding": vector}, {"chunk_id": "b"},
+              {"chunk_id": "c", "metadata": {"embedding": vector}}, {"chunk_id": "d", "embedding": [0, 0, 0, 1]}]
+    assert [c["chunk_id"] for c in deduplicate_by_embedding(chunks)] == ["a", "d"]
@@ -0,0 +1,120 @@
+import json
+import os
+
+from bs4 import BeautifulSoup
+
+from conftest import load_script
+
+filter_step = load_script("2.Filter.py", "filter_step")
+
+NAV = "<nav><a href='/'>Changi Airport</a><a href='/dine'>Dine &amp; Shop</a></nav>"
+BODY = " ".join(f"Jewel attraction number {i} is open from 10am to 10pm daily." for i in range(20))
+
+
+def write_pages(root, n):
+    for i in range(n):
+        with open(os.path.join(root, f"page{i}.html"), "w", encoding="utf-8") as f:
+            f.write(f"<html><head><title>Page {i}</title></head><body>{NAV}<main>"
+                    f"<p>Jewel Changi Airport | Changi Rewards</p><p>Page {i}. {BODY}</p>"
+                    f"<p>Download Changi App<p>Unclosed paragraph {i} with <b>bold text</main></body></html>")
+
+
+def run_filter(tmp_path, base, n, name, **kwargs):
+    output = str(tmp_path / f"{name}.jsonl")
+    urls = [(f"{base}/page{i}.html", "General") for i in range(n)]
+    counts = filter_step.incremental_process_and_save_content(urls, output, delay=0, **kwargs)
+    with open(output, "rb") as f:
+        return counts, f.read()
+
+
+def test_pool_output_matches_serial(site, tmp_path):
+    root, base = site
+    write_pages(root, 12)
+
+    serial_counts, serial = run_filter(tmp_path, base, 12, "serial", workers=1)
+    pooled_counts, pooled = run_filter(tmp_path, base, 12, "pooled", workers=3)
+
+    assert serial_counts["added"] == 12
+    assert pooled_counts == serial_counts
+    assert pooled == serial
+    assert b"Changi Rewards" not in serial and b"Download Changi App" not in serial
+
+
+def test_navigation_lines_are_dropped():
+    text = "\n".join([
+        "Jewel Changi Airport",                      # overlapping phrases, counted separately
+        "Dine & Shop Online",                        # "shop online" starts inside "dine & shop"
+        "Sign up for a Changi Account",
+        "Jewel Changi Airport is home to the Rain Vortex",  # two phrases: dropped even though it reads as content
+        "The Rain Vortex at Jewel is the world's tallest indoor waterfall, with a light show in the evenings.",
+        "Canopy Park opens at 10am.",
+    ])
+    assert filter_step.remove_navigation_phrases(text).splitlines() == [
+        "The Rain Vortex at Jewel is the world's tallest indoor waterfall, with a light show in the evenings.",
+        "Canopy Park opens at 10am.",
+    ]
+
+
+def baseline_extract(html):
+    """Extraction as the script did it before the process pool (html.parser, per-selector cleanup)."""
+    soup = BeautifulSoup(html, "html.parser")
+    for selector in ["header", "footer", "nav", ".footer", ".nav", "#footer", "#header"]:
+        for tag in soup.select(selector):
+            tag.decompose()
+    title = soup.title.text.strip() if soup.title else "No Title"
+    text = (soup.find('main') or soup.body).get_text(separator="\n", strip=True)
+    text = '\n'.join([line.strip() for line in text.splitlines() if line.strip()])
+    return title, filter_step.remove_navigation_phrases(text)
+
+
+def test_default_parser_matches_baseline_on_malformed_markup():
+    html = (f"<html><head><title>Malformed</title></head><body>{NAV}<main><p>{BODY}</p>"
+            "<p>Prices &copy2024 &amp co</p><![CDATA[raw cdata]]><p>nul\x00byte</p>"
+            "<div id='footer'>Contact <p>Unclosed <b>bold</main></body></html>")
+
+    title, text, reason = filter_step.extract_from_html(html)
+    assert reason is None
+    assert (title, text) == baseline_extract(html)
+    assert "&copy2024" in text and "raw cdata" in text and "\x00" in text
+
+
+def test_rerun_only_reports_the_delta(site, tmp_path, monkeypatch):
+    root, base = site
+    write_pages(root, 4)
+    statuses = []
+    fetch_page = filter_step.fetch_page
+
+    def recording_fetch_page(url, validators=None):
+        result = fetch_page(url, validators)
+        statuses.append(result[0])
+        return result
+
+    monkeypatch.setattr(filter_step, "fetch_page", recording_fetch_page)
+
+    first_counts, first = run_filter(tmp_path, base, 4, "content")
+    assert first_counts["added"] == 4
+
+    # Nothing changed: every page answers 304 and the output is rewritten as it was
+    statuses.clear()
+    counts, output = run_filter(tmp_path, base, 4, "content")
+    assert statuses == [304] * 4
+    assert counts == {"added": 0, "changed": 0, "removed": 0, "unchanged": 4}
+    assert output == first
+    assert open(filter_step.delta_path_for(str(tmp_path / "content.jsonl")), "rb").read() == b""
+
+    page1 = os.path.join(root, "page1.html")
+    with open(page1, "r+", encoding="utf-8") as f:
+        html = f.read().replace("Page 1.", "Page 1 has new opening hours.")
+        f.seek(0)
+        f.write(html)
+    # Last-Modified has one-second resolution
+    stat = os.stat(page1)
+    os.utime(page1, (stat.st_atime + 10, stat.st_mtime + 10))
+    os.remove(os.path.join(root, "page2.html"))
+
+    counts, _ = run_filter(tmp_path, base, 4, "content")
+    assert counts == {"added": 0, "changed": 1, "removed": 1, "unchanged": 2}
+    with open(filter_step.delta_path_for(str(tmp_path / "content.jsonl")), encoding="utf-8") as f:
+        delta = [json.loads(line) for line in f]
+    assert [(d["op"], d["url"]) for d in delta] == [("changed", f"{base}/page1.html"), ("removed", f"{base}/page2.html")]
+    assert "new opening hours" in delta[0]["text"]
@@ -0,0 +1,59 @@
+import json
+import logging
+
+import pytest
+
+import ingest_pipeline
+import sparse_search
+from services import data_loader
+from services.corpus import check_store_matches_chunks
+from services.data_loader import EmbeddingStore, hash_files, load_embedding_store
+from sparse_search import SparseSearchIndex, load_or_build_sparse_index
+
+PAGES = [
+    {"url": "https://www.jewelchangiairport.com/en/attractions/rain-vortex.html", "section": "Attractions",
+     "title": "Rain Vortex",
+     "text": "Rain Vortex\n" + " ".join(f"The Rain Vortex show number {i} starts every hour from 11am." for i in range(40))},
+    {"url": "https://www.jewelchangiairport.com/en/attractions/canopy-park.html", "section": "Attractions",
+     "title": "Canopy Park",
+     "text": "Opening Hours\n" + " ".join(f"Canopy Park garden {i} opens daily at 10am for all visitors." for i in range(30))},
+]
+
+
+@pytest.fixture
+def pipeline_output(tmp_path):
+    content = tmp_path / "jewel_content.jsonl"
+    with open(content, "w", encoding="utf-8") as f:
+        # The repeated page yields repeated chunk_ids; the store keeps the first
+        for page in PAGES + PAGES[:1]:
+            f.write(json.dumps(page) + "\n")
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    counts = ingest_pipeline.run_pipeline([str(content)], str(out_dir), ingest_pipeline.StubEmbedder(),
+                                          ingest_pipeline.StageStats(), batch_size=4, max_tokens=128,
+                                          overlap_tokens=20)
+    return out_dir, counts[str(content)], [str(out_dir / "jewel_embedding_ready_raw_chunks.jsonl")]
+
+
+def test_pipeline_output_matches_backend_staleness_checks(pipeline_output, monkeypatch, caplog):
+    out_dir, n_chunks, raw_files = pipeline_output
+    with open(raw_files[0], encoding="utf-8") as f:
+        raw_ids = [json.loads(line)["chunk_id"] for line in f]
+    unique_ids = list(dict.fromkeys(raw_ids))
+    assert len(raw_ids) == n_chunks > len(unique_ids) > 2
+
+    store = EmbeddingStore(str(out_dir / "embedding_store"))
+    index = SparseSearchIndex.load(str(out_dir / "sparse_index"))
+    assert store.chunk_ids == unique_ids
+    assert store.vectors.shape[0] == len(store) == len(store.metadata)
+    assert [chunk["chunk_id"] for chunk in index.chunks] == raw_ids
+    assert store.version == index.manifest["source_hash"] == hash_files(raw_files)
+    check_store_matches_chunks(store, raw_files)
+
+    # The backend serves both as they are instead of warning or refitting
+    monkeypatch.setattr(data_loader, "RAW_CHUNK_FILES", raw_files)
+    monkeypatch.setattr(sparse_search, "build_sparse_index", lambda *args, **kwargs: pytest.fail("index refitted"))
+    with caplog.at_level(logging.WARNING):
+        assert load_embedding_store(str(out_dir / "embedding_store")).chunk_ids == unique_ids
+        assert len(load_or_build_sparse_index(raw_files, str(out_dir / "sparse_index")).chunks) == n_chunks
+    assert caplog.records == []
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+from services.llm_pool import PooledLLMClient
+
+
+class FakeClient:
+    """Records how many calls overlap."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def invoke(self, messages):
+        self._enter()
+        time.sleep(0.02)
+        self._exit()
+        return "sync"
+
+    async def ainvoke(self, messages):
+        self._enter()
+        await asyncio.sleep(0.02)
+        self._exit()
+        return "async"
+
+
+def test_sync_and_async_calls_share_one_limit():
+    client = FakeClient()
+    pooled = PooledLLMClient(client, max_concurrency=2)
+
+    threads = [threading.Thread(target=pooled.invoke, args=([],)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+
+    async def run_async():
+        return await asyncio.gather(*(pooled.ainvoke([]) for _ in range(6)))
+
+    assert asyncio.run(run_async()) == ["async"] * 6
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == 12
+    assert client.max_in_flight == 2
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    client = FakeClient()
+    pooled = PooledLLMClient(client, max_concurrency=1)
+
+    async def run():
+        first = asyncio.create_task(pooled.ainvoke([]))
+        waiting = asyncio.create_task(pooled.ainvoke([]))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await first
+        return await asyncio.wait_for(pooled.ainvoke([]), timeout=1)
+
+    assert asyncio.run(run()) == "async"
+    assert pooled.invoke([]) == "sync"
+    assert client.calls == 3
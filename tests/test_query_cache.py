@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services import query_cache
+from services.query_cache import QueryEmbeddingCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryEmbeddingCache(max_size=8, ttl_seconds=60)
+    calls = []
+    compute = lambda query: calls.append(query) or [float(len(calls))]
+
+    assert cache.get_or_compute("Where is the Rain Vortex?", compute) == [1.0]
+    clock.now += 59
+    assert cache.get_or_compute("where is the rain vortex", compute) == [1.0]
+
+    clock.now += 2
+    assert cache.get("Where is the Rain Vortex?") is None
+    assert cache.get_or_compute("Where is the Rain Vortex?", compute) == [2.0]
+    assert len(calls) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = QueryEmbeddingCache(max_size=2, ttl_seconds=60)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]      # "b" is now the least recently used
+
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0] and cache.get("c") == [3.0]
+    assert cache.stats() == {**cache.stats(), "size": 2, "evictions": 1}
+
+
+def test_concurrent_misses_share_one_computation(clock):
+    cache = QueryEmbeddingCache(max_size=8, ttl_seconds=60)
+    release = threading.Event()
+    calls = []
+
+    def slow_compute(query):
+        calls.append(query)
+        release.wait(5)
+        return [1.0]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("Jewel hours", slow_compute)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["misses"] + cache.stats()["inflight_waits"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [[1.0]] * 4
+    assert len(calls) == 1
+
+
+def test_periodic_save_runs_in_background_and_reloads(tmp_path):
+    path = str(tmp_path / "query_cache.npz")
+    cache = QueryEmbeddingCache(ttl_seconds=60, persist_path=path, namespace="stub", save_every=2)
+    cache.get_or_compute("rain vortex", lambda q: [1.0, 2.0])
+    cache.get_or_compute("canopy park", lambda q: [3.0, 4.0])
+    cache._saver.join()
+
+    assert os.listdir(tmp_path) == ["query_cache.npz"]
+    reloaded = QueryEmbeddingCache(ttl_seconds=60, persist_path=path, namespace="stub")
+    assert reloaded.get("Canopy Park") == [3.0, 4.0]
+    assert QueryEmbeddingCache(persist_path=path, namespace="google").get("canopy park") is None
+
+
+def test_failed_save_is_logged_not_raised(tmp_path, caplog):
+    cache = QueryEmbeddingCache(persist_path=str(tmp_path / "missing" / "query_cache.npz"), save_every=1)
+    assert cache.get_or_compute("rain vortex", lambda q: [1.0]) == [1.0]
+    cache._saver.join()
+    cache.save()
+    assert "Could not save query cache" in caplog.text
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from services import reranker
+from services.chunk_store import Candidate
+
+
+class VectorStore:
+    """The slice of ChunkStore the bi-encoder reranker reads."""
+
+    def __init__(self, vectors, n_embedded=None):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.dim = self.vectors.shape[1]
+        self.n_embedded = len(self.vectors) if n_embedded is None else n_embedded
+
+    def embedding_matrix(self, rows):
+        kept = [row for row in rows if row < self.n_embedded]
+        return kept, self.vectors[kept]
+
+
+@pytest.fixture(autouse=True)
+def query_vector(monkeypatch):
+    monkeypatch.setattr(reranker, "embed_query", lambda query: [1.0, 0.0])
+
+
+def fused(rows_and_scores):
+    candidates = []
+    for row, score in rows_and_scores:
+        candidate = Candidate(row, score)
+        candidate.fused_score = score
+        candidates.append(candidate)
+    return candidates
+
+
+def test_fused_order_survives_bi_encoder_rerank():
+    # Row 0 tops fusion (dense and sparse agree) but is only second by cosine
+    store = VectorStore([[0.8, 0.6], [1.0, 0.0], [0.0, 1.0]])
+    candidates = fused([(0, 0.033), (1, 0.016), (2, 0.015)])
+
+    reranked = reranker.rerank_candidates("q", candidates, store, top_n=3, name="bi", budget_ms=0)
+
+    assert [c.row for c in reranked] == [0, 1, 2]
+    assert reranked[1].rerank_score == pytest.approx(1.0)
+
+
+def test_zero_fusion_weight_is_a_pure_rerank():
+    store = VectorStore([[0.8, 0.6], [1.0, 0.0], [0.0, 1.0]])
+    candidates = fused([(0, 0.033), (1, 0.016), (2, 0.015)])
+
+    reranked = reranker.rerank_candidates("q", candidates, store, top_n=3, name="bi", budget_ms=0, fusion_weight=0)
+
+    assert [c.row for c in reranked] == [1, 0, 2]
+
+
+@pytest.mark.parametrize("fusion_weight", [0.5, 0])
+def test_sparse_only_candidate_ranks_by_fused_score(fusion_weight):
+    # Row 2 has no stored embedding; it was the best BM25 hit and fused first
+    store = VectorStore([[1.0, 0.0], [0.0, 1.0], [0.0, 0.0]], n_embedded=2)
+    candidates = fused([(2, 0.033), (0, 0.016), (1, 0.010)])
+
+    reranked = reranker.rerank_candidates("q", candidates, store, top_n=3, name="bi", budget_ms=0,
+                                          fusion_weight=fusion_weight)
+
+    assert [c.row for c in reranked][:2] == [2, 0]
+    assert np.isfinite(reranked[0].score)
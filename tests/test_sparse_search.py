@@ -0,0 +1,78 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from sparse_search import SparseSearchIndex, build_sparse_index
+
+
+def write_chunks(path, texts):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, text in enumerate(texts):
+            f.write(json.dumps({"chunk_id": f"chunk-{i}", "text": text}) + "\n")
+
+
+def test_rebuild_does_not_touch_a_memory_mapped_index(tmp_path):
+    source = str(tmp_path / "raw.jsonl")
+    index_dir = str(tmp_path / "index")
+    write_chunks(source, [f"jewel rain vortex {i} " + "canopy park " * (1 + i % 5) for i in range(2000)])
+    build_sparse_index([source], index_dir=index_dir)
+
+    mapped = SparseSearchIndex.load(index_dir)
+    docs, scores = mapped.search("rain canopy", top_k=10)
+
+    # Another worker refits the index in place (e.g. the raw chunks changed)
+    write_chunks(source, ["something else entirely"] * 10)
+    rebuilt = build_sparse_index([source], index_dir=index_dir)
+
+    after_docs, after_scores = mapped.search("rain canopy", top_k=10)
+    assert np.array_equal(docs, after_docs)
+    assert np.allclose(scores, after_scores)
+    assert len(SparseSearchIndex.load(index_dir).chunks) == len(rebuilt.chunks) == 10
+
+
+# avgdl = 10 / 3
+CORPUS = ["Rain vortex, rain!", "Canopy Park rain", "Canopy Park hedge maze"]
+
+
+def bm25(tf, doc_len, df, n_docs=3, avg_len=10 / 3, k1=1.5, b=0.75, delta=0.0):
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    return idf * (tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len)) + delta)
+
+
+def make_index(**params):
+    return SparseSearchIndex(chunks=[{"chunk_id": f"chunk-{i}", "text": t} for i, t in enumerate(CORPUS)], **params)
+
+
+def test_bm25_scores_match_hand_computed_values():
+    index = make_index(k1=1.5, b=0.75)
+
+    docs, scores = index.search("rain maze", top_k=10)
+    # maze is rarer than rain, so the single maze hit outranks the double rain hit
+    assert docs.tolist() == [2, 0, 1]
+    assert scores == pytest.approx([bm25(1, 4, df=1), bm25(2, 3, df=2), bm25(1, 3, df=2)], rel=1e-5)
+    # By hand: ln(8/3) * 2.5 / 2.725, ln(1.6) * 5 / 3.3875, ln(1.6) * 2.5 / 2.3875
+    assert scores == pytest.approx([0.89984, 0.69373, 0.49215], abs=1e-5)
+
+    docs, scores = index.search("canopy rain", top_k=2)
+    assert docs.tolist() == [1, 0]
+    assert scores == pytest.approx([bm25(1, 3, df=2) * 2, bm25(2, 3, df=2)], rel=1e-5)
+
+    index.set_params(delta=1.0)
+    _, scores = index.search("maze", top_k=1)
+    assert scores == pytest.approx([bm25(1, 4, df=1, delta=1.0)], rel=1e-5)
+
+
+def test_query_terms_outside_the_vocabulary():
+    index = make_index()
+
+    docs, scores = index.search("zeppelin a", top_k=5)
+    assert len(docs) == len(scores) == 0
+    assert index.sparse_search("zeppelin") == []
+
+    # Unknown terms add nothing to known ones
+    known_docs, known_scores = index.search("maze", top_k=5)
+    docs, scores = index.search("zeppelin maze", top_k=5)
+    assert docs.tolist() == known_docs.tolist() == [2]
+    assert np.array_equal(scores, known_scores)
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from services import vectorstore
+from services.chunk_store import ChunkStore
+from services.data_loader import EmbeddingStore, write_embedding_store
+from services.embeddings import stub_embed_query
+
+CHUNKS = [
+    {"chunk_id": "jewel_chunk-a", "url": "https://example.com/jewel", "title": "Jewel",
+     "text": "The Rain Vortex light show runs every evening."},
+    {"chunk_id": "jewel_chunk-b", "url": "https://example.com/canopy", "title": "Canopy Park",
+     "text": "Canopy Park opens at 10am. Tickets are sold on level 5."},
+]
+
+
+def make_store(tmp_path):
+    vectors = np.array([stub_embed_query(c["text"]) for c in CHUNKS], dtype=np.float32)
+    write_embedding_store([c["chunk_id"] for c in CHUNKS], CHUNKS, vectors, str(tmp_path),
+                          {"source_files": [], "source_hash": "0" * 64})
+    return ChunkStore(EmbeddingStore(str(tmp_path)))
+
+
+class FakePineconeIndex:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"matches": [
+            {"id": "jewel_chunk-b", "score": 0.9, "metadata": {"text": "ignored, already stored"}},
+            {"id": "jewel_chunk-new", "score": 0.5, "metadata": {"text": "Only in Pinecone."}},
+        ]}
+
+
+def test_pinecone_matches_use_stored_vectors(tmp_path):
+    store = make_store(tmp_path)
+    backend = vectorstore.PineconeBackend.__new__(vectorstore.PineconeBackend)
+    backend.index = FakePineconeIndex()
+
+    candidates = backend.search_candidates([0.1] * store.dim, store, top_k=2)
+
+    assert backend.index.calls[0]["include_values"] is False
+    assert [store.chunk_ids[c.row] for c in candidates] == ["jewel_chunk-b", "jewel_chunk-new"]
+    assert np.array_equal(store.embedding(candidates[0].row), store.vectors[1])
+    assert store.embedding(candidates[1].row) is None
+
+
+def test_vector_search_accepts_the_old_signature(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    monkeypatch.setattr(vectorstore, "DENSE_BACKEND", "local")
+    query = "When does Canopy Park open?"
+
+    chunks = vectorstore.vector_search(query, store, top_k=1)
+    assert chunks[0]["chunk_id"] == "jewel_chunk-b" and chunks[0]["metadata"]["embedding"] is not None
+
+    monkeypatch.setattr("services.corpus.get_corpus", lambda: SimpleNamespace(store=store))
+    assert [c["chunk_id"] for c in vectorstore.vector_search(query, 1)] == ["jewel_chunk-b"]
+    assert [c["chunk_id"] for c in vectorstore.vector_search(query, top_k=1)] == ["jewel_chunk-b"]